@@ -0,0 +1,216 @@
+
+import numpy as np
+
+from connectivity import SOLVABILITY_MODES, GenerationStats, component_cells, generate_solvable
+from distance_engine import UNREACHABLE, bfs_batched
+from game_random import GameRandom, active_region, obstacle_count_for, spawn_seeds
+from legal_moves import legal_move_table
+
+
+class BatchedNavigateGame:
+    """
+    N 个 NavigateGame 棋盘的向量化实现。
+    所有棋盘的 Navigator、终点、障碍物和距离场都保存在连续的 NumPy 数组中，
+    step() 一次调用即可推进全部棋盘。
+    """
+
+    def __init__(self, num_boards, seed=0, board_size=12, solvability="reject"):
+        self.num_boards = num_boards
+        self.board_size = board_size
+        self.grid_size = self.board_size ** 2
+
+        # 0:None 1: UP, 2: DOWN, 3: LEFT, 4: RIGHT
+        self.next_row = np.array((0, -1, 1, 0, 0), dtype=np.int64)
+        self.next_col = np.array((0, 0, 0, -1, 1), dtype=np.int64)
+
+        # 每个棋盘一个独立的随机数流，第 i 个棋盘与用 spawn_seeds(seed, num_boards)[i] 创建的 NavigateGame 完全一致
+        self.rngs = [GameRandom(s) for s in spawn_seeds(seed, num_boards)]
+        self.board_index = np.arange(num_boards)
+
+        self.navigator = np.zeros((num_boards, 2), dtype=np.int64)
+        self.prev_navigator = np.zeros((num_boards, 2), dtype=np.int64)
+        self.start_pos = np.zeros((num_boards, 2), dtype=np.int64)
+        self.destination = np.zeros((num_boards, 2), dtype=np.int64)
+        self.obstacles = np.zeros((num_boards, board_size, board_size), dtype=bool)
+        self.distance = np.full((num_boards, board_size, board_size), UNREACHABLE, dtype=np.int32)
+        self.legal_moves = np.zeros((num_boards, board_size, board_size, 4), dtype=bool)
+        self.score = np.zeros(num_boards, dtype=np.int64)
+        # 每个棋盘当前回合的整数种子，与 NavigateGame.episode_seed 相同
+        self.episode_seed = np.zeros(num_boards, dtype=np.int64)
+        # 所有棋盘合计的 reset 次数和 BFS 次数，见 counters()
+        self.resets = 0
+        self.bfs_calls = 0
+
+        # 每个棋盘的难度（见 NavigateGame.set_difficulty）：出题区域大小、偏移和障碍物占比（NaN 表示默认的 1/7），
+        # pending_* 在该棋盘下一次 reset 时生效
+        self.active_size = np.full(num_boards, board_size, dtype=np.int64)
+        self.active_offset = np.zeros(num_boards, dtype=np.int64)
+        self.obstacle_density = np.full(num_boards, np.nan)
+        self.pending_size = self.active_size.copy()
+        self.pending_offset = self.active_offset.copy()
+        self.pending_density = self.obstacle_density.copy()
+
+        # 连通性保证与 NavigateGame 相同；reachable_cells[i] 为第 i 个棋盘 Navigator 所在连通区域的一维下标
+        if solvability not in SOLVABILITY_MODES:
+            raise ValueError(f"solvability must be one of {SOLVABILITY_MODES}, got {solvability!r}")
+        self.solvability = solvability
+        self.reachable_cells = [None] * num_boards
+        self.generation_stats = GenerationStats()
+
+        self.reset()
+
+    def seed(self, sed):
+        # sed 为根种子，或者每个棋盘一个种子的列表
+        seeds = sed if isinstance(sed, (list, tuple)) else spawn_seeds(sed, self.num_boards)
+        for rng, s in zip(self.rngs, seeds):
+            rng.seed(s)
+
+    def set_difficulty(self, board_size=None, density=None, boards=None):
+        # boards 为要修改的棋盘下标（默认全部），下一次 reset 时生效
+        boards = self.board_index if boards is None else np.asarray(boards)
+        board_size = self.board_size if board_size is None else int(board_size)
+        self.pending_size[boards] = board_size
+        self.pending_offset[boards] = active_region(self.board_size, board_size, density)
+        self.pending_density[boards] = np.nan if density is None else density
+
+    def reset(self, mask=None):
+        """
+        重置 mask 选中的棋盘（默认全部），返回被重置的棋盘下标。
+        """
+        if mask is None:
+            boards = self.board_index
+        else:
+            boards = np.flatnonzero(mask)
+        if len(boards) == 0:
+            return boards
+
+        self.resets += len(boards)
+        self.active_size[boards] = self.pending_size[boards]
+        self.active_offset[boards] = self.pending_offset[boards]
+        self.obstacle_density[boards] = self.pending_density[boards]
+
+        center = self.board_size // 2
+        self.navigator[boards] = center
+        self.prev_navigator[boards] = center
+        self.start_pos[boards] = center
+        self.score[boards] = 0
+
+        # 与 NavigateGame.reset 相同的采样顺序：先终点，再障碍物
+        for board in boards.tolist():
+            self.reachable_cells[board] = None
+            self.episode_seed[board] = self.rngs[board].new_episode()
+        self.destination[boards] = self._generate_destination(boards)
+        self.obstacles[boards] = self._generate_solvable_obstacles(boards)
+        self.legal_moves[boards] = legal_move_table(self.obstacles[boards])
+        self.distance[boards] = self.calculate_distance(boards)
+        return boards
+
+    def step(self, actions):
+        """
+        对所有棋盘同时执行一步动作（取值 0-4，与 NavigateGame.step 相同）。
+        返回 (done, destination_arrived) 两个布尔数组；结束的棋盘需调用 reset(done) 重新开始。
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        self.prev_navigator[:] = self.navigator
+        row = self.navigator[:, 0] + self.next_row[actions]
+        col = self.navigator[:, 1] + self.next_col[actions]
+
+        # 检查是否撞墙
+        out_of_board = (row < 0) | (row >= self.board_size) | (col < 0) | (col >= self.board_size)
+        done = out_of_board.copy()
+        inside = ~out_of_board
+        done[inside] = self.obstacles[self.board_index[inside], row[inside], col[inside]]
+
+        # 检查是否到达终点
+        destination_arrived = (row == self.destination[:, 0]) & (col == self.destination[:, 1])
+        self.score[destination_arrived] += 10
+
+        self.navigator[:, 0] = row
+        self.navigator[:, 1] = col
+
+        if destination_arrived.any():
+            boards = np.flatnonzero(destination_arrived)
+            # 新的一段路程从当前到达的位置开始
+            self.start_pos[boards] = self.navigator[boards]
+            self.destination[boards] = self._generate_destination(boards)
+            self.distance[boards] = self.calculate_distance(boards)
+
+        return done, destination_arrived
+
+    def _generate_destination(self, boards):
+        # 在除 Navigator 以外的格子中均匀采样，各棋盘从自己的随机数流中取，坐标相对于出题区域
+        navigator = self.navigator.tolist()
+        sizes = self.active_size.tolist()
+        offsets = self.active_offset.tolist()
+        destination = np.empty((len(boards), 2), dtype=np.int64)
+        for row, board in enumerate(boards):
+            cells = self.reachable_cells[board]
+            if cells is not None and len(cells) > 1:
+                # 与 NavigateGame 相同，只在 Navigator 所在的连通区域中采样
+                navigator_index = navigator[board][0] * self.board_size + navigator[board][1]
+                destination[row] = divmod(self.rngs[board].cell(cells, navigator_index), self.board_size)
+                continue
+            offset = offsets[board]
+            local = self.rngs[board].destination(sizes[board], (navigator[board][0] - offset,
+                                                                navigator[board][1] - offset))
+            destination[row] = local[0] + offset, local[1] + offset
+        return destination
+
+    def _generate_obstacles(self, boards, obstacle_count=None):
+        # 出题区域以外都是障碍物
+        obstacles = np.ones((len(boards), self.board_size, self.board_size), dtype=bool)
+        for row, board in enumerate(boards):
+            size, offset = int(self.active_size[board]), int(self.active_offset[board])
+            density = self.obstacle_density[board]
+            count = obstacle_count
+            if count is None:
+                count = obstacle_count_for(size, None if np.isnan(density) else float(density))  # 默认障碍物数量
+            navigator = (self.navigator[board] - offset).tolist()
+            destination = (self.destination[board] - offset).tolist()
+            cells = self.rngs[board].obstacle_cells(
+                size * size, (navigator[0] * size + navigator[1], destination[0] * size + destination[1]), count)
+            region = obstacles[row, offset:offset + size, offset:offset + size]
+            region[:] = False
+            region[np.divmod(cells, size)] = True
+        return obstacles
+
+    def _generate_solvable_obstacles(self, boards):
+        # 与 NavigateGame._generate_solvable_obstacles 相同，逐个棋盘生成，重新采样只消耗自己的随机数流
+        obstacles = np.empty((len(boards), self.board_size, self.board_size), dtype=bool)
+        for row, board in enumerate(boards.tolist()):
+            navigator = tuple(self.navigator[board].tolist())
+            destination = tuple(self.destination[board].tolist())
+            obstacles[row], labels = generate_solvable(lambda: self._generate_obstacles([board])[0], [navigator],
+                                                       [destination], self.solvability, self.generation_stats)
+            if labels is not None:
+                self.reachable_cells[board] = component_cells(labels, navigator)
+        return obstacles
+
+    def counters(self, reset=False):
+        counters = {"resets": self.resets, "bfs_calls": self.bfs_calls}
+        if reset:
+            self.resets = self.bfs_calls = 0
+        return counters
+
+    def calculate_distance(self, boards):
+        self.bfs_calls += len(boards)
+        return bfs_batched(self.obstacles[boards], self.destination[boards])
+
+    def get_action_masks(self) -> np.ndarray:
+        # (num_boards, 4)，对应动作 UP, DOWN, LEFT, RIGHT，一次索引取出所有棋盘当前格子的合法动作
+        row = self.navigator[:, 0]
+        col = self.navigator[:, 1]
+        inside = (row >= 0) & (row < self.board_size) & (col >= 0) & (col < self.board_size)
+        if inside.all():
+            return self.legal_moves[self.board_index, row, col]
+
+        # 撞墙后尚未 reset 的棋盘，逐个方向检查
+        masks = np.zeros((self.num_boards, 4), dtype=bool)
+        masks[inside] = self.legal_moves[self.board_index[inside], row[inside], col[inside]]
+        for board in np.flatnonzero(~inside):
+            for action in range(4):
+                r = row[board] + self.next_row[action + 1]
+                c = col[board] + self.next_col[action + 1]
+                if 0 <= r < self.board_size and 0 <= c < self.board_size:
+                    masks[board, action] = not self.obstacles[board, r, c]
+        return masks
@@ -0,0 +1,292 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from distance_engine import DISTANCE_BACKENDS, calculate_distance
+from navigate_game import NavigateGame
+
+SCHEMA_VERSION = 1
+
+GAME_BOARD_SIZES = (12, 24, 48)
+# 逐格 BFS 和波前 BFS 在这些尺寸上太慢，只跑稀疏波前 BFS 和与 board_size 无关的局部观测
+LARGE_BOARD_SIZES = (64, 256, 1024)
+ENV_BOARD_SIZES = (12,)
+WINDOW_VIEW_SIZE = 12
+DUMMY_NUM_ENVS = (1, 8)
+BATCHED_NUM_ENVS = (64, 256, 1024)
+
+
+def _legal_action(game, rng):
+    # 从预计算的合法动作表中随机选一个动作（0-3），没有合法动作时返回 0
+    row, col = game.navigator
+    legal = np.flatnonzero(game.legal_moves[row, col])
+    return int(rng.choice(legal)) if len(legal) > 0 else 0
+
+
+def bench_game_reset(board_size, num_envs):
+    game = NavigateGame(seed=0, board_size=board_size)
+    return game.reset
+
+
+def bench_game_step(board_size, num_envs):
+    game = NavigateGame(seed=0, board_size=board_size)
+    rng = np.random.default_rng(0)
+
+    def op():
+        done, _ = game.step(_legal_action(game, rng) + 1)
+        if done:
+            game.reset()
+
+    return op
+
+
+def bench_game_step_fast(board_size, num_envs):
+    game = NavigateGame(seed=0, board_size=board_size)
+    rng = np.random.default_rng(0)
+
+    def op():
+        if game.step_fast(_legal_action(game, rng) + 1).done:
+            game.reset_fast()
+
+    return op
+
+
+def bench_calculate_distance(backend):
+    def setup(board_size, num_envs):
+        game = NavigateGame(seed=0, board_size=board_size)
+        blocked = game.occupancy.view(bool)
+        return lambda: calculate_distance(blocked, game.destination, backend)
+
+    return setup
+
+
+def _make_single_env(policy_type, board_size=12, observation="full"):
+    from navigate_game_custom_wrapper_cnn import NavigateEnvCnn
+    from navigate_game_custom_wrapper_mlp import NavigateEnvMlp
+
+    env_class = NavigateEnvCnn if policy_type == "CnnPolicy" else NavigateEnvMlp
+    env = env_class(seed=0, board_size=board_size, observation=observation, view_size=WINDOW_VIEW_SIZE)
+    env.reset()
+    return env
+
+
+def bench_observation(policy_type, observation="full"):
+    def setup(board_size, num_envs):
+        env = _make_single_env(policy_type, board_size, observation)
+        game = env.game
+        # 在两个相邻的空格子之间来回移动 Navigator，只测观测生成本身
+        row, col = game.navigator
+        action = int(np.flatnonzero(game.legal_moves[row, col])[0])
+        cells = [(row, col), (row + game.next_row[action + 1], col + game.next_col[action + 1])]
+        state = [0]
+
+        def op():
+            state[0] ^= 1
+            game.navigator = cells[state[0]]
+            env._generate_observation()
+
+        return op
+
+    return setup
+
+
+def bench_action_mask(board_size, num_envs):
+    env = _make_single_env("MlpPolicy")
+    return env.get_action_mask
+
+
+def bench_env_stack(policy_type):
+    def setup(board_size, num_envs):
+        from train import make_env
+
+        env = make_env(policy_type, seed=0)()
+        env.reset()
+        action_masks = env.get_wrapper_attr("action_masks")
+        rng = np.random.default_rng(0)
+
+        def op():
+            masks = action_masks().reshape(-1)
+            action = int(rng.choice(np.flatnonzero(masks))) if masks.any() else 0
+            _, _, terminated, truncated, _ = env.step(action)
+            if terminated or truncated:
+                env.reset()
+
+        return op
+
+    return setup
+
+
+def _vec_op(vec_env, rng):
+    vec_env.reset()
+
+    def op():
+        masks = np.stack(vec_env.env_method("action_masks")).reshape(vec_env.num_envs, -1)
+        vec_env.step((rng.random(masks.shape) * masks).argmax(axis=1))
+
+    return op
+
+
+def bench_dummy_vec_env(policy_type):
+    def setup(board_size, num_envs):
+        from stable_baselines3.common.vec_env import DummyVecEnv
+        from train import make_env
+
+        vec_env = DummyVecEnv([make_env(policy_type, seed=i) for i in range(num_envs)])
+        return _vec_op(vec_env, np.random.default_rng(0))
+
+    return setup
+
+
+def bench_batched_vec_env(policy_type):
+    def setup(board_size, num_envs):
+        from navigate_vec_env import NavigateVecEnv
+
+        vec_env = NavigateVecEnv(num_envs, policy_type=policy_type, seed=0, board_size=board_size)
+        return _vec_op(vec_env, np.random.default_rng(0))
+
+    return setup
+
+
+# 名称 -> (setup(board_size, num_envs) 返回单次操作, 支持的棋盘大小, 支持的环境数量)
+# 每次操作推进的环境步数等于 num_envs
+BENCHMARKS = {
+    "game.reset": (bench_game_reset, GAME_BOARD_SIZES + LARGE_BOARD_SIZES, (1,)),
+    "game.step": (bench_game_step, GAME_BOARD_SIZES + LARGE_BOARD_SIZES, (1,)),
+    "game.step_fast": (bench_game_step_fast, GAME_BOARD_SIZES + LARGE_BOARD_SIZES, (1,)),
+    **{f"game.calculate_distance[{backend}]": (bench_calculate_distance(backend), GAME_BOARD_SIZES, (1,))
+       for backend in DISTANCE_BACKENDS if backend != "frontier"},
+    "game.calculate_distance[frontier]": (bench_calculate_distance("frontier"),
+                                          GAME_BOARD_SIZES + LARGE_BOARD_SIZES, (1,)),
+    "env.mlp_observation": (bench_observation("MlpPolicy"), ENV_BOARD_SIZES, (1,)),
+    "env.cnn_observation": (bench_observation("CnnPolicy"), ENV_BOARD_SIZES, (1,)),
+    **{f"env.{name}_{mode}": (bench_observation(policy_type, mode), ENV_BOARD_SIZES + LARGE_BOARD_SIZES, (1,))
+       for name, policy_type in (("mlp", "MlpPolicy"), ("cnn", "CnnPolicy"))
+       for mode in ("crop", "downsample")},
+    "env.get_action_mask": (bench_action_mask, ENV_BOARD_SIZES, (1,)),
+    "env.stack_mlp": (bench_env_stack("MlpPolicy"), ENV_BOARD_SIZES, (1,)),
+    "env.stack_cnn": (bench_env_stack("CnnPolicy"), ENV_BOARD_SIZES, (1,)),
+    "vec.dummy_mlp": (bench_dummy_vec_env("MlpPolicy"), ENV_BOARD_SIZES, DUMMY_NUM_ENVS),
+    "vec.dummy_cnn": (bench_dummy_vec_env("CnnPolicy"), ENV_BOARD_SIZES, DUMMY_NUM_ENVS),
+    "vec.batched_mlp": (bench_batched_vec_env("MlpPolicy"), GAME_BOARD_SIZES, BATCHED_NUM_ENVS),
+    "vec.batched_cnn": (bench_batched_vec_env("CnnPolicy"), ENV_BOARD_SIZES, BATCHED_NUM_ENVS),
+}
+
+
+def measure(op, num_envs, min_time=0.2, repeats=5):
+    """
+    先计时（取 repeats 次中最快的一次），再单独开 tracemalloc 跑一轮统计内存分配，避免追踪开销影响计时。
+    """
+    # 预热并估计每轮需要的次数
+    count = 1
+    while True:
+        start_time = time.perf_counter()
+        for _ in range(count):
+            op()
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_time / 10:
+            break
+        count *= 2
+    count = max(1, int(count * min_time / max(elapsed, 1e-9)))
+
+    best = float("inf")
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        for _ in range(count):
+            op()
+        best = min(best, time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    start_current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(count):
+        op()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ops": count,
+        "ns_per_op": 1e9 * best / count,
+        "ops_per_sec": count / best,
+        "steps_per_sec": count * num_envs / best,
+        "peak_alloc_bytes": peak - start_current,
+        "retained_alloc_bytes_per_op": (current - start_current) / count,
+    }
+
+
+def run(names=None, board_sizes=None, num_envs=None, min_time=0.2, repeats=5):
+    results = []
+    for name, (setup, supported_sizes, supported_envs) in BENCHMARKS.items():
+        if names and not any(name.startswith(prefix) for prefix in names):
+            continue
+        for board_size in supported_sizes:
+            if board_sizes and board_size not in board_sizes:
+                continue
+            for n in supported_envs:
+                if num_envs and n not in num_envs and n != 1:
+                    continue
+                result = {"name": name, "board_size": board_size, "num_envs": n}
+                result.update(measure(setup(board_size, n), n, min_time=min_time, repeats=repeats))
+                results.append(result)
+                print(f"{name:<40} board={board_size:<4} envs={n:<5} {result['steps_per_sec']:>14.0f} steps/s "
+                      f"{result['ns_per_op'] / 1000:>10.1f} us/op {result['peak_alloc_bytes']:>10d} B peak",
+                      file=sys.stderr)
+    return {
+        "schema_version": SCHEMA_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=0.1):
+    """
+    与基线对比 steps_per_sec，返回变慢超过 tolerance 的条目。
+    """
+    key = lambda r: (r["name"], r["board_size"], r["num_envs"])
+    baseline_results = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        base = baseline_results.get(key(result))
+        if base is None:
+            continue
+        ratio = result["steps_per_sec"] / base["steps_per_sec"]
+        print(f"{result['name']:<40} board={result['board_size']:<4} envs={result['num_envs']:<5} "
+              f"{ratio:>6.2f}x vs baseline", file=sys.stderr)
+        if ratio < 1 - tolerance:
+            regressions.append({"key": key(result), "ratio": ratio})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the game, env wrappers and vectorized backends.")
+    parser.add_argument("--only", nargs="*", help="run benchmarks whose name starts with one of these prefixes")
+    parser.add_argument("--board-sizes", type=int, nargs="*")
+    parser.add_argument("--num-envs", type=int, nargs="*")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed repeat")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against a stored JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    report = run(args.only, args.board_sizes, args.num_envs, min_time=args.min_time, repeats=args.repeats)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}", file=sys.stderr)
+            sys.exit(1)
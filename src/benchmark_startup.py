@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from stable_baselines3.common.vec_env import SubprocVecEnv
+
+from navigate_game_custom_wrapper_cnn import NavigateEnvCnn
+from navigate_game_custom_wrapper_mlp import NavigateEnvMlp
+from shared_memory_vec_env import SharedMemoryVecEnv, preload_worker_modules
+from train import make_env
+
+IMPORT_MODULES = ("navigate_game", "navigate_game_custom_wrapper_mlp", "navigate_game_custom_wrapper_cnn")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_python(*args):
+    # 在新的解释器中运行（src 目录下，与 train.py 相同的导入方式），返回最后一行输出的 JSON
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (ROOT_DIR, os.environ.get("PYTHONPATH")))))
+    output = subprocess.run([sys.executable, *args], cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_time(module):
+    """
+    新解释器中导入 module 的耗时，以及是否顺带导入了 pygame（静默训练不应该导入）。
+    """
+    code = ("import json, sys, time; start = time.perf_counter(); import {}; "
+            "print(json.dumps({{'sec': time.perf_counter() - start, 'pygame': 'pygame' in sys.modules}}))")
+    return _run_python("-c", code.format(module))
+
+
+def construct_time(env_class, repeat=100):
+    start_time = time.perf_counter()
+    for seed in range(repeat):
+        env_class(seed=seed)
+    return (time.perf_counter() - start_time) / repeat
+
+
+def worker_startup(backend, num_envs, preload):
+    """
+    在新进程中创建 backend 的 VecEnv 并 reset 一次，返回总耗时。
+    """
+    args = [os.path.abspath(__file__), "--worker-startup", backend, "--num-envs", str(num_envs)]
+    return _run_python(*(args + ["--preload"] if preload else args))
+
+
+def _measure_worker_startup(backend, num_envs, preload):
+    if preload:
+        preload_worker_modules()
+    env_fns = [make_env("CnnPolicy", seed=seed) for seed in range(num_envs)]
+    start_time = time.perf_counter()
+    env = SubprocVecEnv(env_fns) if backend == "subproc" else SharedMemoryVecEnv(env_fns)
+    env.reset()
+    elapsed = time.perf_counter() - start_time
+    env.close()
+    num_workers = num_envs if backend == "subproc" else len(env.shards)
+    print(json.dumps({"sec": elapsed, "num_workers": num_workers}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import, env construction and worker startup time.")
+    parser.add_argument("--num-envs", type=int, nargs="+", default=[8, 64])
+    parser.add_argument("--worker-startup", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--preload", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_startup:
+        _measure_worker_startup(args.worker_startup, args.num_envs[0], args.preload)
+        return
+
+    for module in IMPORT_MODULES:
+        result = import_time(module)
+        print(f"import {module:34s} {1e3 * result['sec']:8.1f} ms   pygame imported: {result['pygame']}")
+    for env_class in (NavigateEnvMlp, NavigateEnvCnn):
+        print(f"construct {env_class.__name__:31s} {1e3 * construct_time(env_class):8.2f} ms")
+
+    # preload=True 的耗时包含 forkserver 一次性导入 torch / SB3 的时间，worker 越多摊得越薄
+    for backend in ("subproc", "shared_memory"):
+        for num_envs in args.num_envs:
+            for preload in (False, True):
+                result = worker_startup(backend, num_envs, preload)
+                print(f"{backend:14s} num_envs={num_envs:4d} preload={str(preload):5s} "
+                      f"{result['sec']:8.2f} s  {1e3 * result['sec'] / result['num_workers']:8.1f} ms/worker")
+
+
+if __name__ == "__main__":
+    main()
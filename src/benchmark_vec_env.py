@@ -0,0 +1,50 @@
+import argparse
+import time
+
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+from shared_memory_vec_env import SharedMemoryVecEnv
+from train import make_env
+
+
+def benchmark(vec_env, num_steps):
+    """
+    模拟 MaskablePPO 的 rollout：每一步先取动作掩码，再按掩码随机选动作并 step。
+    返回每秒环境步数。
+    """
+    vec_env.reset()
+    rng = np.random.default_rng(0)
+    start_time = time.perf_counter()
+    for _ in range(num_steps):
+        masks = np.stack(vec_env.env_method("action_masks")).reshape(vec_env.num_envs, -1)
+        logits = rng.random(masks.shape) * masks
+        vec_env.step(logits.argmax(axis=1))
+    elapsed = time.perf_counter() - start_time
+    return num_steps * vec_env.num_envs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare DummyVecEnv, SubprocVecEnv and SharedMemoryVecEnv.")
+    parser.add_argument("--num-envs", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--num-workers", type=int, default=None)
+    parser.add_argument("--num-steps", type=int, default=500)
+    args = parser.parse_args()
+
+    backends = {
+        "DummyVecEnv": lambda fns: DummyVecEnv(fns),
+        "SubprocVecEnv": lambda fns: SubprocVecEnv(fns),
+        "SharedMemoryVecEnv": lambda fns: SharedMemoryVecEnv(fns, num_workers=args.num_workers),
+    }
+    for policy_type in ("MlpPolicy", "CnnPolicy"):
+        for num_envs in args.num_envs:
+            env_fns = [make_env(policy_type, seed=i) for i in range(num_envs)]
+            for name, build in backends.items():
+                vec_env = build(env_fns)
+                steps_per_sec = benchmark(vec_env, args.num_steps)
+                vec_env.close()
+                print(f"{policy_type:<10} num_envs={num_envs:<5} {name:<20} {steps_per_sec:>12.0f} steps/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+异步 checkpoint：训练线程只把策略网络的权重复制到内存（CPU 张量），写文件在后台线程中完成，不阻塞 rollout。
+
+每个 checkpoint 只包含策略网络（state_dict + 构造参数），不含优化器状态和 replay buffer，
+评估时用 load_policy() 直接恢复策略，比 MaskablePPO.load / QRDQN.load 加载完整模型快得多。
+保存目录下的 index.json 记录所有 checkpoint 的步数和指标，只保留指标最好的 keep_top_k 个以及最新的一个。
+evaluate.py --update-index 写回的评估分数（EVAL_METRIC）优先于训练时的指标，淘汰和 best() 都按它排序。
+需要继续训练时仍然使用 train.py 最后保存的完整 zip。
+训练环境的配置（观测方式、窗口大小等）写在每个 .pt 快照里，完整 zip 则写在同一目录的 env_config.json 中，
+评估、回放和推理服务用 load_env_config() 取回，重建与训练时相同的环境。
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import torch as th
+from stable_baselines3.common.callbacks import BaseCallback
+
+INDEX_FILE = "index.json"
+# evaluate.py --update-index 写回的评估分数
+EVAL_METRIC = "eval_score_mean"
+ENV_CONFIG_FILE = "env_config.json"
+
+
+class CheckpointIndex:
+    """
+    save_dir/index.json：[{"path", "timesteps", "time", "metrics"}, ...]，按步数排序。
+    只由写 checkpoint 的线程（或评估脚本）修改，每次整体写入临时文件后替换，读取时不会看到写了一半的文件。
+    """
+
+    def __init__(self, save_dir, metric="ep_rew_mean", keep_top_k=3):
+        self.save_dir = save_dir
+        self.path = os.path.join(save_dir, INDEX_FILE)
+        self.metric = metric
+        self.keep_top_k = keep_top_k
+        self.lock = threading.Lock()
+
+    def entries(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _write(self, entries):
+        entries = sorted(entries, key=lambda entry: entry["timesteps"])
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _score(self, entry):
+        # 评估过的 checkpoint 按评估分数排在没评估过的前面，没评估过的之间再按训练时的指标比较
+        metrics = entry["metrics"]
+        evaluated = metrics.get(EVAL_METRIC)
+        value = metrics.get(self.metric)
+        return (-np.inf if evaluated is None else evaluated, -np.inf if value is None else value)
+
+    def add(self, path, timesteps, metrics):
+        with self.lock:
+            entries = [entry for entry in self.entries() if entry["path"] != path]
+            entries.append({"path": path, "timesteps": timesteps, "time": time.time(), "metrics": metrics})
+            self._write(self._prune(entries))
+
+    def update_metrics(self, path, metrics):
+        # 评估完成后把分数等指标写回；写回 EVAL_METRIC 后 best() 和之后 add() 时的淘汰都优先按评估分数排序
+        with self.lock:
+            entries = self.entries()
+            for entry in entries:
+                if entry["path"] == path:
+                    entry["metrics"].update(metrics)
+            self._write(entries)
+
+    def _prune(self, entries):
+        latest = max(entries, key=lambda entry: entry["timesteps"])
+        best = sorted(entries, key=self._score, reverse=True)[:self.keep_top_k]
+        kept = []
+        for entry in entries:
+            if entry is latest or any(entry is other for other in best):
+                kept.append(entry)
+            else:
+                file = os.path.join(self.save_dir, entry["path"])
+                if os.path.exists(file):
+                    os.remove(file)
+        return kept
+
+    def best(self):
+        entries = self.entries()
+        return os.path.join(self.save_dir, max(entries, key=self._score)["path"]) if entries else None
+
+    def latest(self):
+        entries = self.entries()
+        return os.path.join(self.save_dir, entries[-1]["path"]) if entries else None
+
+    def paths(self):
+        return [os.path.join(self.save_dir, entry["path"]) for entry in self.entries()]
+
+
+def snapshot_policy(policy, env_config=None):
+    """
+    在训练线程中调用：把策略权重复制成 CPU 张量（之后训练继续修改原权重也不影响快照）。
+    env_config 为训练环境的配置，如 {"observation": "ego", "view_size": 13}。
+    """
+    return {
+        "policy_class": type(policy),
+        "data": policy._get_constructor_parameters(),
+        "state_dict": {name: tensor.detach().to("cpu", copy=True) for name, tensor in policy.state_dict().items()},
+        "env_config": dict(env_config or {}),
+    }
+
+
+def save_policy(snapshot, path):
+    # 先写临时文件再替换，写到一半被中断也不会留下损坏的 checkpoint
+    tmp_path = path + ".tmp"
+    th.save(snapshot, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_policy(path, device="cpu"):
+    """
+    只恢复策略网络（MaskableActorCriticPolicy / QRDQNPolicy），可以直接 policy.predict(obs, action_masks=...)。
+    """
+    snapshot = th.load(path, map_location=device, weights_only=False)
+    policy = snapshot["policy_class"](**snapshot["data"])
+    policy.load_state_dict(snapshot["state_dict"])
+    policy.to(device)
+    policy.set_training_mode(False)
+    # 旧的快照没有环境配置
+    policy.env_config = snapshot.get("env_config", {})
+    return policy
+
+
+def save_env_config(save_dir, env_config):
+    # 完整模型 zip 的环境配置，train.py 在训练开始时写入
+    os.makedirs(save_dir, exist_ok=True)
+    with open(os.path.join(save_dir, ENV_CONFIG_FILE), "w") as f:
+        json.dump(env_config, f, indent=2)
+
+
+def load_env_config(model, path):
+    """
+    model 训练时的环境配置：.pt 快照自带（load_policy 放在 policy.env_config 上），完整 zip 读同一目录下的 env_config.json。
+    都没有时返回空字典，即默认环境。
+    """
+    config = getattr(model, "env_config", None)
+    if config:
+        return dict(config)
+    file = os.path.join(os.path.dirname(path), ENV_CONFIG_FILE)
+    if os.path.exists(file):
+        with open(file) as f:
+            return json.load(f)
+    return {}
+
+
+class AsyncCheckpointCallback(BaseCallback):
+    """
+    替代 SB3 的 CheckpointCallback：每 save_freq 次调用（即 save_freq * num_envs 步）保存一次策略，
+    文件名为 {name_prefix}_{num_timesteps}_steps.pt，指标取最近回合的平均奖励和长度。
+    后台线程最多积压 max_pending 个快照，写盘跟不上时训练线程才会等待。
+    """
+
+    def __init__(self, save_freq, save_path, name_prefix="rl_model", keep_top_k=3, metric="ep_rew_mean",
+                 max_pending=2, env_config=None, verbose=0):
+        super().__init__(verbose)
+        self.env_config = env_config
+        self.save_freq = save_freq
+        self.save_path = save_path
+        self.name_prefix = name_prefix
+        self.index = CheckpointIndex(save_path, metric=metric, keep_top_k=keep_top_k)
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.writer = None
+        # 后台线程写盘时的异常（磁盘满、没有权限等），由训练线程在下一次 _on_step / _on_training_end 时重新抛出
+        self.error = None
+
+    def _init_callback(self):
+        os.makedirs(self.save_path, exist_ok=True)
+        self.writer = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+        self.writer.start()
+
+    def _write_loop(self):
+        while True:
+            item = self.pending.get()
+            try:
+                if item is None:
+                    return
+                if self.error is not None:
+                    # 已经出错，剩下的快照直接丢弃，线程继续取队列，训练线程不会卡在 put() 上
+                    continue
+                snapshot, name, timesteps, metrics = item
+                start_time = time.perf_counter()
+                save_policy(snapshot, os.path.join(self.save_path, name))
+                self.index.add(name, timesteps, metrics)
+                if self.verbose >= 2:
+                    print(f"Saved checkpoint {name} in {time.perf_counter() - start_time:.3f}s")
+            except Exception as e:
+                self.error = e
+            finally:
+                self.pending.task_done()
+
+    def _metrics(self):
+        episodes = self.model.ep_info_buffer
+        if not episodes:
+            return {}
+        return {
+            "ep_rew_mean": float(np.mean([episode["r"] for episode in episodes])),
+            "ep_len_mean": float(np.mean([episode["l"] for episode in episodes])),
+        }
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError(f"Failed to write checkpoint to {self.save_path}") from error
+
+    def _on_step(self):
+        self._raise_error()
+        if self.n_calls % self.save_freq == 0:
+            name = f"{self.name_prefix}_{self.num_timesteps}_steps.pt"
+            self.pending.put((snapshot_policy(self.model.policy, self.env_config), name, self.num_timesteps, self._metrics()))
+        return True
+
+    def _on_training_end(self):
+        # 等待剩下的快照写完
+        self.pending.put(None)
+        self.writer.join()
+        self._raise_error()
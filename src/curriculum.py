@@ -0,0 +1,130 @@
+"""
+课程学习：根据策略最近的成功率在线调整出题区域大小和障碍物密度。
+
+每一段路程（从起点或上一个终点出发到下一个终点）是一次尝试：到达终点算成功，回合先结束（撞墙、撞障碍物、超时）算失败。
+最近 window 段路程的成功率达到 promote_at 时升一级，低于 demote_at 时降一级；换级后重新统计。
+新的难度通过 env_method("set_difficulty", ...) 推给正在运行的向量环境，各环境在下一次 reset 时生效，不需要重建环境。
+第一级难度要在第一次 reset 之前用 CurriculumScheduler.apply(env) 推送，否则第一个回合仍是完整难度。
+"""
+import collections
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+
+# (出题区域占棋盘边长的比例, 障碍物占比)，按难度递增；占比为 None 表示原来的默认值（格子数的 1/7）。
+# 区域大小按棋盘大小换算（12x12 上依次是 6、8、10、12），最后几级覆盖整个棋盘
+DEFAULT_LEVELS = (
+    (6 / 12, 0.05),
+    (8 / 12, 0.1),
+    (10 / 12, 0.12),
+    (1.0, None),
+    (1.0, 0.2),
+    (1.0, 0.25),
+)
+
+
+class CurriculumScheduler:
+    def __init__(self, num_envs, levels=DEFAULT_LEVELS, board_size=12, window=500, promote_at=0.8, demote_at=0.3,
+                 start_level=0):
+        self.num_envs = num_envs
+        # 区域至少 2x2 才能包含起点（见 game_random.active_region）
+        self.levels = [(min(max(2, round(fraction * board_size)), board_size), density) for fraction, density in levels]
+        self.window = window
+        self.promote_at = promote_at
+        self.demote_at = demote_at
+        self.level = start_level
+
+        self.outcomes = collections.deque(maxlen=window)
+        self.steps_to_goal = collections.deque(maxlen=window)
+        # 当前难度下每个环境的尝试次数和成功次数
+        self.env_attempts = np.zeros(num_envs, dtype=np.int64)
+        self.env_successes = np.zeros(num_envs, dtype=np.int64)
+
+    @property
+    def difficulty(self):
+        return self.levels[self.level]
+
+    def record(self, env_index, arrived, steps):
+        self.outcomes.append(arrived)
+        self.env_attempts[env_index] += 1
+        if arrived:
+            self.env_successes[env_index] += 1
+            self.steps_to_goal.append(steps)
+
+    def apply(self, env):
+        # 把当前难度推给向量环境，下一次 reset 时生效；训练开始前调用，第一个回合就使用第一级难度
+        env.env_method("set_difficulty", *self.difficulty)
+
+    def success_rate(self):
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def update(self):
+        """
+        窗口统计满了之后决定是否换级，换级时返回新的 (board_size, density)，否则返回 None。
+        """
+        if len(self.outcomes) < self.window:
+            return None
+        success_rate = self.success_rate()
+        if success_rate >= self.promote_at and self.level + 1 < len(self.levels):
+            self.level += 1
+        elif success_rate < self.demote_at and self.level > 0:
+            self.level -= 1
+        else:
+            return None
+        self.outcomes.clear()
+        self.steps_to_goal.clear()
+        self.env_attempts[:] = 0
+        self.env_successes[:] = 0
+        return self.difficulty
+
+    def stats(self):
+        attempted = self.env_attempts > 0
+        env_rates = self.env_successes[attempted] / self.env_attempts[attempted]
+        return {
+            "level": self.level,
+            "board_size": self.difficulty[0],
+            "density": -1.0 if self.difficulty[1] is None else self.difficulty[1],
+            "success_rate": self.success_rate(),
+            "steps_to_goal": float(np.mean(self.steps_to_goal)) if self.steps_to_goal else 0.0,
+            # 各环境成功率的最小值，环境之间差距很大时说明难度设置没有同步到所有环境
+            "min_env_success_rate": float(env_rates.min()) if len(env_rates) else 0.0,
+        }
+
+
+class CurriculumCallback(BaseCallback):
+    """
+    从每一步的 info["destination_arrived"] 和 dones 统计各环境的路程结果，难度变化时推送给 training_env，
+    每次 rollout 结束时把统计写到 logger 的 curriculum/* 下。
+    """
+
+    def __init__(self, scheduler, verbose=0):
+        super().__init__(verbose)
+        self.scheduler = scheduler
+        self.leg_steps = None
+
+    def _init_callback(self):
+        self.leg_steps = np.zeros(self.training_env.num_envs, dtype=np.int64)
+        # SB3 在调用这里之前已经 reset 过环境，第一级难度应在创建模型前用 scheduler.apply(env) 推送
+        self.scheduler.apply(self.training_env)
+
+    def _on_step(self):
+        self.leg_steps += 1
+        dones = self.locals["dones"]
+        for i, info in enumerate(self.locals["infos"]):
+            if info.get("destination_arrived"):
+                self.scheduler.record(i, True, int(self.leg_steps[i]))
+                self.leg_steps[i] = 0
+            elif dones[i]:
+                self.scheduler.record(i, False, int(self.leg_steps[i]))
+        self.leg_steps[dones] = 0
+
+        difficulty = self.scheduler.update()
+        if difficulty is not None:
+            self.scheduler.apply(self.training_env)
+            if self.verbose:
+                print(f"Curriculum level {self.scheduler.level}: board_size={difficulty[0]}, density={difficulty[1]}")
+        return True
+
+    def _on_rollout_end(self):
+        for name, value in self.scheduler.stats().items():
+            self.logger.record(f"curriculum/{name}", value)
@@ -0,0 +1,195 @@
+from collections import deque
+
+import numpy as np
+
+UNREACHABLE = int(1e9)
+
+
+def bfs_deque(blocked, destination):
+    """
+    以 deque 为队列的逐格 BFS。blocked 为 (board_size, board_size) 的布尔障碍物网格。
+    """
+    height, width = blocked.shape
+    distance = np.full((height, width), UNREACHABLE, dtype=np.int32)
+    free = (~blocked).tolist()
+    row, col = destination
+    distance[row, col] = 0
+    # Python list 上的逐格访问比 ndarray 标量索引快得多
+    dist = distance.tolist()
+    q = deque([(row, col)])
+    while q:
+        row, col = q.popleft()
+        d = dist[row][col] + 1
+        if row > 0 and free[row - 1][col] and dist[row - 1][col] > d:
+            dist[row - 1][col] = d
+            q.append((row - 1, col))
+        if row < height - 1 and free[row + 1][col] and dist[row + 1][col] > d:
+            dist[row + 1][col] = d
+            q.append((row + 1, col))
+        if col > 0 and free[row][col - 1] and dist[row][col - 1] > d:
+            dist[row][col - 1] = d
+            q.append((row, col - 1))
+        if col < width - 1 and free[row][col + 1] and dist[row][col + 1] > d:
+            dist[row][col + 1] = d
+            q.append((row, col + 1))
+    return np.array(dist, dtype=np.int32)
+
+
+def bfs_wavefront(blocked, destination):
+    """
+    波前 BFS：每一轮用数组平移一次性扩展整条波前。
+    """
+    return bfs_batched(blocked[None], np.asarray(destination).reshape(1, 2))[0]
+
+
+def bfs_batched(blocked, destinations):
+    """
+    同时计算多个棋盘的距离场。blocked 为 (N, H, W)，destinations 为 (N, 2)。
+    """
+    boards = np.arange(len(blocked))
+    destinations = np.asarray(destinations)
+    frontier = np.zeros_like(blocked)
+    frontier[boards, destinations[:, 0], destinations[:, 1]] = True
+
+    distance = np.full(blocked.shape, UNREACHABLE, dtype=np.int32)
+    distance[frontier] = 0
+    free = ~(blocked | frontier)
+    expanded = np.empty_like(frontier)
+    step = 0
+    while True:
+        expanded[:] = False
+        expanded[:, 1:, :] |= frontier[:, :-1, :]
+        expanded[:, :-1, :] |= frontier[:, 1:, :]
+        expanded[:, :, 1:] |= frontier[:, :, :-1]
+        expanded[:, :, :-1] |= frontier[:, :, 1:]
+        expanded &= free
+        if not expanded.any():
+            return distance
+        step += 1
+        distance[expanded] = step
+        free &= ~expanded
+        frontier, expanded = expanded, frontier
+
+
+def bfs_frontier(blocked, destination):
+    """
+    稀疏波前 BFS：波前保存为一维格子下标数组，每一轮只处理波前上的格子，
+    总工作量与可达格子数成正比，适合大棋盘（64x64 以上）。
+    """
+    height, width = blocked.shape
+    # 四周补一圈障碍物，邻居下标不需要做越界检查
+    padded_width = width + 2
+    free = np.zeros((height + 2, padded_width), dtype=bool)
+    free[1:-1, 1:-1] = ~blocked
+    free = free.ravel()
+    distance = np.full(free.shape, UNREACHABLE, dtype=np.int32)
+
+    row, col = destination
+    frontier = np.array([(row + 1) * padded_width + col + 1])
+    distance[frontier] = 0
+    free[frontier] = False
+    offsets = np.array([-padded_width, padded_width, -1, 1])
+    step = 0
+    while len(frontier) > 0:
+        step += 1
+        neighbors = (frontier[:, None] + offsets).ravel()
+        neighbors = neighbors[free[neighbors]]
+        # 同一个格子可能被多个波前格子扩展到，先标记再去重
+        free[neighbors] = False
+        frontier = np.unique(neighbors)
+        distance[frontier] = step
+    return distance.reshape(height + 2, padded_width)[1:-1, 1:-1].copy()
+
+
+DISTANCE_BACKENDS = {
+    "deque": bfs_deque,
+    "wavefront": bfs_wavefront,
+    "frontier": bfs_frontier,
+}
+
+# 超过这个格子数时 "auto" 使用稀疏波前 BFS，否则使用逐格 BFS
+AUTO_FRONTIER_MIN_CELLS = 32 * 32
+
+
+def calculate_distance(blocked, destination, backend="deque"):
+    if backend == "auto":
+        backend = "frontier" if blocked.size > AUTO_FRONTIER_MIN_CELLS else "deque"
+    return DISTANCE_BACKENDS[backend](blocked, destination)
+
+
+def _legacy_calculate_distance(board_size, obstacles, destination):
+    # 原 NavigateGame.calculate_distance 的实现，仅用于下面的一致性检查
+    next_row = (0, -1, 1, 0, 0)
+    next_col = (0, 0, 0, -1, 1)
+    distance = [[int(1e9) for _ in range(board_size)] for _ in range(board_size)]
+    q = list()
+    q.append(destination)
+    distance[destination[0]][destination[1]] = 0
+    while len(q) > 0:
+        current_node = q.pop(0)
+        for d in range(1, 5):
+            nx = current_node[0] + next_col[d]
+            ny = current_node[1] + next_row[d]
+            if not (0 <= nx < board_size and 0 <= ny < board_size):
+                continue
+            if (nx, ny) in obstacles:
+                continue
+            if distance[nx][ny] > distance[current_node[0]][current_node[1]] + 1:
+                distance[nx][ny] = distance[current_node[0]][current_node[1]] + 1
+                q.append((nx, ny))
+    return distance
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    # 与原实现的一致性检查 + 各后端耗时
+    rng = random.Random(0)
+    for board_size in (3, 7, 12, 24, 48):
+        boards = []
+        for _ in range(200):
+            obstacles = {(rng.randrange(board_size), rng.randrange(board_size))
+                         for _ in range(board_size * board_size // rng.choice((3, 7)))}
+            destination = (rng.randrange(board_size), rng.randrange(board_size))
+            obstacles.discard(destination)
+            blocked = np.zeros((board_size, board_size), dtype=bool)
+            for pos in obstacles:
+                blocked[pos] = True
+            boards.append((obstacles, destination, blocked))
+
+        for obstacles, destination, blocked in boards:
+            expected = np.array(_legacy_calculate_distance(board_size, obstacles, destination), dtype=np.int32)
+            for name, backend in DISTANCE_BACKENDS.items():
+                assert (backend(blocked, destination) == expected).all(), (name, board_size)
+        batched = bfs_batched(np.stack([b[2] for b in boards]), [b[1] for b in boards])
+        for (obstacles, destination, _), distance in zip(boards, batched):
+            assert (distance == np.array(_legacy_calculate_distance(board_size, obstacles, destination))).all()
+
+        start_time = time.perf_counter()
+        for obstacles, destination, _ in boards:
+            _legacy_calculate_distance(board_size, obstacles, destination)
+        timings = {"legacy": time.perf_counter() - start_time}
+        for name, backend in DISTANCE_BACKENDS.items():
+            start_time = time.perf_counter()
+            for _, destination, blocked in boards:
+                backend(blocked, destination)
+            timings[name] = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        bfs_batched(np.stack([b[2] for b in boards]), [b[1] for b in boards])
+        timings["batched"] = time.perf_counter() - start_time
+        print(f"board_size={board_size}: " + ", ".join(
+            f"{name} {1e6 * t / len(boards):.1f}us" for name, t in timings.items()))
+    print("All backends match the original calculate_distance.")
+
+    # 大棋盘只比较逐格 BFS 与稀疏波前 BFS
+    for board_size in (256, 1024):
+        blocked = np.random.default_rng(board_size).random((board_size, board_size)) < 1 / 7
+        destination = (board_size // 2, board_size // 2)
+        blocked[destination] = False
+        timings = {}
+        for name in ("deque", "frontier"):
+            start_time = time.perf_counter()
+            timings[name] = (DISTANCE_BACKENDS[name](blocked, destination), time.perf_counter() - start_time)
+        assert (timings["deque"][0] == timings["frontier"][0]).all()
+        print(f"board_size={board_size}: " + ", ".join(f"{name} {1e3 * t:.1f}ms" for name, (_, t) in timings.items()))
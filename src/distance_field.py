@@ -0,0 +1,201 @@
+import heapq
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from distance_engine import AUTO_FRONTIER_MIN_CELLS, UNREACHABLE, bfs_batched, calculate_distance
+
+
+class DistanceFieldCache:
+    """
+    维护障碍物网格，并按终点缓存 BFS 距离场。
+    障碍物增删时对已缓存的距离场做增量更新，而不是整张重算。
+    """
+
+    def __init__(self, board_size, max_size=64, backend="deque", max_bytes=16 << 20):
+        self.board_size = board_size
+        # 大棋盘上单个距离场就有几 MB，按内存上限收紧缓存条数
+        self.max_size = max(1, min(max_size, max_bytes // (board_size * board_size * 4)))
+        self.backend = backend
+        self.blocked = np.zeros((board_size, board_size), dtype=bool)
+        self.fields = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.incremental_updates = 0
+
+        # UP, DOWN, LEFT, RIGHT
+        self.neighbors = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+    def set_obstacles(self, occupancy):
+        # 直接共享游戏的 uint8 占用网格（按 bool 解释），整体替换障碍物后旧的距离场全部失效
+        self.blocked = occupancy.view(bool)
+        self.fields.clear()
+
+    def get(self, destination):
+        destination = tuple(destination)
+        field = self.fields.get(destination)
+        if field is not None:
+            self.hits += 1
+            self.fields.move_to_end(destination)
+            return field
+
+        self.misses += 1
+        field = calculate_distance(self.blocked, destination, self.backend)
+        self.fields[destination] = field
+        if len(self.fields) > self.max_size:
+            self.fields.popitem(last=False)
+        return field
+
+    def get_many(self, destinations):
+        """
+        一次取多个终点的距离场，返回与 destinations 一一对应的列表。
+        未缓存的终点去重后用 bfs_batched 一起计算（多个 Navigator 共用一次波前扩展）；大棋盘上批量波前太占内存，仍逐个计算。
+        """
+        keys = [tuple(destination) for destination in destinations]
+        missing = [key for key in dict.fromkeys(keys) if key not in self.fields]
+        computed = {}
+        if len(missing) > 1 and self.blocked.size <= AUTO_FRONTIER_MIN_CELLS:
+            blocked = np.broadcast_to(self.blocked, (len(missing),) + self.blocked.shape)
+            computed = dict(zip(missing, bfs_batched(blocked, np.array(missing))))
+            self.misses += len(missing)
+            for key, field in computed.items():
+                self.put(key, field)
+        fields = []
+        for key in keys:
+            field = computed.get(key)
+            fields.append(self.get(key) if field is None else field)
+        return fields
+
+    def put(self, destination, field):
+        # 放入预先算好的距离场（例如来自场景库）
+        self.fields[tuple(destination)] = field
+        if len(self.fields) > self.max_size:
+            self.fields.popitem(last=False)
+
+    def reset_stats(self):
+        self.hits = self.misses = self.incremental_updates = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "incremental_updates": self.incremental_updates,
+            "cached_fields": len(self.fields),
+        }
+
+    def add_obstacle(self, pos):
+        pos = tuple(pos)
+        if self.blocked[pos]:
+            return
+        self.blocked[pos] = True
+        self.fields.pop(pos, None)
+        for destination, field in self.fields.items():
+            self._raise_distances(field, pos, destination)
+            self.incremental_updates += 1
+
+    def remove_obstacle(self, pos):
+        pos = tuple(pos)
+        if not self.blocked[pos]:
+            return
+        self.blocked[pos] = False
+        # 以 pos 为终点的距离场（终点落在障碍物上时才会有）直接丢弃，需要时重新计算
+        self.fields.pop(pos, None)
+        for destination, field in self.fields.items():
+            self._lower_distances(field, pos, destination)
+            self.incremental_updates += 1
+
+    def _free_neighbors(self, row, col):
+        for dr, dc in self.neighbors:
+            nr, nc = row + dr, col + dc
+            if 0 <= nr < self.board_size and 0 <= nc < self.board_size and not self.blocked[nr, nc]:
+                yield nr, nc
+
+    def _parents(self, row, col, destination):
+        # 能为 (row, col) 提供距离的邻居：空格子，以及终点本身（BFS 从终点出发，终点即使是障碍物也会向外扩展）
+        for dr, dc in self.neighbors:
+            nr, nc = row + dr, col + dc
+            if 0 <= nr < self.board_size and 0 <= nc < self.board_size and (
+                    not self.blocked[nr, nc] or (nr, nc) == destination):
+                yield nr, nc
+
+    def _raise_distances(self, distance, pos, destination):
+        # 新障碍物只会让距离变大：逐层找出最短路全部经过 pos 的格子，再只对这些格子重新松弛
+        if distance[pos] >= UNREACHABLE:
+            return
+        affected = {pos}
+        level = [pos]
+        while level:
+            candidates = set()
+            for row, col in level:
+                for n in self._free_neighbors(row, col):
+                    if n not in affected and distance[n] == distance[row, col] + 1:
+                        candidates.add(n)
+            level = []
+            for n in candidates:
+                supported = any(
+                    m not in affected and distance[m] == distance[n] - 1
+                    for m in self._parents(*n, destination)
+                )
+                if not supported:
+                    level.append(n)
+            affected.update(level)
+
+        for cell in affected:
+            distance[cell] = UNREACHABLE
+        affected.discard(pos)
+
+        heap = []
+        for cell in affected:
+            best = min((distance[m] for m in self._parents(*cell, destination)), default=UNREACHABLE)
+            if best < UNREACHABLE:
+                distance[cell] = best + 1
+                heap.append((best + 1, cell))
+        heapq.heapify(heap)
+        while heap:
+            d, (row, col) = heapq.heappop(heap)
+            if d > distance[row, col]:
+                continue
+            for n in self._free_neighbors(row, col):
+                if distance[n] > d + 1:
+                    distance[n] = d + 1
+                    heapq.heappush(heap, (d + 1, n))
+
+    def _lower_distances(self, distance, pos, destination):
+        # 移除障碍物只会让距离变小：从 pos 出发向外松弛
+        best = min((distance[m] for m in self._parents(*pos, destination)), default=UNREACHABLE)
+        if best >= UNREACHABLE:
+            return
+        distance[pos] = best + 1
+        q = deque([pos])
+        while q:
+            row, col = q.popleft()
+            d = distance[row, col] + 1
+            for n in self._free_neighbors(row, col):
+                if distance[n] > d:
+                    distance[n] = d
+                    q.append(n)
+
+
+if __name__ == "__main__":
+    # 随机增删障碍物，与整张重算的 BFS 对照：每次增量更新后所有缓存的距离场都与 bfs_deque 一致
+    from distance_engine import bfs_deque
+
+    rng = np.random.default_rng(0)
+    checked = 0
+    for board_size in (5, 12, 24):
+        for _ in range(10):
+            cache = DistanceFieldCache(board_size, max_size=16)
+            cache.set_obstacles((rng.random((board_size, board_size)) < rng.choice((1 / 7, 0.3, 0.45))).astype(np.uint8))
+            for _ in range(200):
+                pos = tuple(int(v) for v in rng.integers(board_size, size=2))
+                if rng.random() < 0.5:
+                    cache.add_obstacle(pos)
+                else:
+                    cache.remove_obstacle(pos)
+                # 终点可能落在障碍物上（solvability="off" 时会出现）
+                cache.get(tuple(int(v) for v in rng.integers(board_size, size=2)))
+                for destination, field in cache.fields.items():
+                    assert np.array_equal(field, bfs_deque(cache.blocked, destination)), (board_size, destination)
+                    checked += 1
+    print(f"{checked} incremental distance fields match bfs_deque.")
@@ -0,0 +1,29 @@
+import torch
+from torch import nn
+from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
+
+
+class EgoCnn(BaseFeaturesExtractor):
+    """
+    NavigateEnvEgo / NavigateVecEnv(observation="ego") 的 (frames * channels, V, V) 观测用的小卷积网络。
+    SB3 默认的 NatureCNN 第一层是 8x8 / stride 4，要求图像至少 36x36，局部窗口用不了；
+    这里第一层 3x3 保持分辨率，第二层 stride 2 缩小一半（13x13 -> 6x6），再接一个全连接层。
+    用法：policy_kwargs=dict(features_extractor_class=EgoCnn)
+    """
+
+    def __init__(self, observation_space, features_dim=256):
+        super().__init__(observation_space, features_dim)
+        channels = observation_space.shape[0]
+        self.cnn = nn.Sequential(
+            nn.Conv2d(channels, 16, kernel_size=3, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(16, 32, kernel_size=3, stride=2),
+            nn.ReLU(),
+            nn.Flatten(),
+        )
+        with torch.no_grad():
+            n_flatten = self.cnn(torch.as_tensor(observation_space.sample()[None]).float()).shape[1]
+        self.linear = nn.Sequential(nn.Linear(n_flatten, features_dim), nn.ReLU())
+
+    def forward(self, observations):
+        return self.linear(self.cnn(observations))
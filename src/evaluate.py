@@ -0,0 +1,171 @@
+import argparse
+import glob
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from checkpointing import EVAL_METRIC, CheckpointIndex, load_env_config, load_policy
+from navigate_vec_env import NavigateVecEnv
+
+FAILURE_CAUSES = ("wall", "obstacle", "timeout")
+
+
+def _summary(values):
+    if len(values) == 0:
+        return {"count": 0}
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(len(values)),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "max": float(values.max()),
+    }
+
+
+def evaluate(model, policy_type, num_episodes=200, num_envs=64, seed=0, deterministic=True, step_limit=500,
+             board_size=12, observation="full", view_size=None):
+    """
+    在 NavigateVecEnv 上并行跑 num_episodes 个带种子的回合，每一步对所有未结束的回合批量调用一次 predict。
+    board_size / observation / view_size 需要与训练时相同（见 checkpointing.load_env_config）。
+    返回分数、回合长度、到达终点所需步数和失败原因的统计。
+    """
+    num_envs = min(num_envs, num_episodes)
+    env = NavigateVecEnv(num_envs, policy_type=policy_type, seed=seed, board_size=board_size, step_limit=step_limit,
+                         observation=observation, view_size=view_size)
+    use_masks = "action_masks" in inspect.signature(model.predict).parameters
+
+    # 与 SB3 evaluate_policy 一样预先给每个环境分配回合数，避免偏向较短的回合
+    targets = np.array([(num_episodes + i) // num_envs for i in range(num_envs)])
+    finished_episodes = np.zeros(num_envs, dtype=np.int64)
+    episode_steps = np.zeros(num_envs, dtype=np.int64)
+    leg_steps = np.zeros(num_envs, dtype=np.int64)
+
+    scores, lengths, steps_to_goal = [], [], []
+    failure_causes = dict.fromkeys(FAILURE_CAUSES, 0)
+
+    start_time = time.perf_counter()
+    obs = env.reset()
+    while (finished_episodes < targets).any():
+        if use_masks:
+            actions, _ = model.predict(obs, deterministic=deterministic, action_masks=env.action_masks())
+        else:
+            actions, _ = model.predict(obs, deterministic=deterministic)
+        obs, _, dones, infos = env.step(actions)
+        episode_steps += 1
+        leg_steps += 1
+
+        active = finished_episodes < targets
+        for i, info in enumerate(infos):
+            if not active[i]:
+                continue
+            if info.get("destination_arrived"):
+                steps_to_goal.append(int(leg_steps[i]))
+                leg_steps[i] = 0
+            if dones[i]:
+                scores.append(info["score"])
+                lengths.append(int(episode_steps[i]))
+                failure_causes[info["failure_cause"]] += 1
+                finished_episodes[i] += 1
+        episode_steps[dones] = 0
+        leg_steps[dones] = 0
+    env.close()
+
+    return {
+        "policy_type": policy_type,
+        "board_size": board_size,
+        "observation": observation,
+        "num_episodes": int(finished_episodes.sum()),
+        "num_envs": num_envs,
+        "seed": seed,
+        "deterministic": deterministic,
+        "score": _summary(scores),
+        "episode_length": _summary(lengths),
+        "steps_to_goal": _summary(steps_to_goal),
+        "failure_causes": failure_causes,
+        "elapsed_sec": time.perf_counter() - start_time,
+    }
+
+
+def load_model(model_type, path, device="cpu"):
+    from sb3_contrib import MaskablePPO, QRDQN
+
+    if path.endswith(".pt"):
+        # AsyncCheckpointCallback 保存的 checkpoint 只有策略网络，predict 的用法与完整模型相同
+        return load_policy(path, device=device)
+    if model_type == "QRDQN":
+        return QRDQN.load(path, device=device)
+    elif model_type == "PPO":
+        return MaskablePPO.load(path, device=device)
+    raise ValueError(f"Unknown model type: {model_type}")
+
+
+def evaluate_checkpoint(path, model_type, policy_type, **kwargs):
+    # 环境配置默认取 checkpoint 训练时的配置，kwargs 中不为 None 的值优先
+    model = load_model(model_type, path)
+    kwargs = {**load_env_config(model, path), **{key: value for key, value in kwargs.items() if value is not None}}
+    report = evaluate(model, policy_type, **kwargs)
+    report["checkpoint"] = path
+    report["model_type"] = model_type
+    return report
+
+
+def evaluate_checkpoints(paths, model_type, policy_type, max_workers=None, **kwargs):
+    # 每个 checkpoint 在独立进程中评估，互不阻塞
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(evaluate_checkpoint, path, model_type, policy_type, **kwargs) for path in paths]
+        return [future.result() for future in futures]
+
+
+def find_checkpoints(save_dir, model_type):
+    # CheckpointCallback / AsyncCheckpointCallback 保存的文件名为 {name_prefix}_{num_timesteps}_steps.zip / .pt
+    paths = glob.glob(os.path.join(save_dir, "{}_navigate_*_steps.zip".format(model_type)))
+    paths += CheckpointIndex(save_dir).paths()
+    return sorted(paths, key=lambda path: int(os.path.basename(path).split("_")[-2]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate trained navigators on seeded, vectorized episodes.")
+    parser.add_argument("--model-type", default="PPO", choices=("PPO", "QRDQN"))
+    parser.add_argument("--policy-type", default="CnnPolicy", choices=("CnnPolicy", "MlpPolicy"))
+    parser.add_argument("checkpoints", nargs="*",
+                        help="checkpoint zips; defaults to every checkpoint in the training save_dir")
+    parser.add_argument("--episodes", type=int, default=200)
+    parser.add_argument("--num-envs", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    # 棋盘大小和观测默认取每个 checkpoint 训练时的配置
+    parser.add_argument("--board-size", type=int, default=None)
+    parser.add_argument("--observation", default=None, choices=("full", "crop", "downsample", "ego"),
+                        help="defaults to the observation each checkpoint was trained with")
+    parser.add_argument("--view-size", type=int, default=None)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--update-index", action="store_true",
+                        help="record the mean score of each .pt checkpoint in its index.json; "
+                             "the \"best\" checkpoint and pruning then rank by it")
+    args = parser.parse_args()
+
+    checkpoints = args.checkpoints or find_checkpoints(
+        "../output/trained_models_{}/{}".format(args.policy_type, args.model_type), args.model_type)
+    reports = evaluate_checkpoints(checkpoints, args.model_type, args.policy_type, max_workers=args.workers,
+                                   num_episodes=args.episodes, num_envs=args.num_envs, seed=args.seed,
+                                   board_size=args.board_size, observation=args.observation,
+                                   view_size=args.view_size)
+    if args.update_index:
+        for report in reports:
+            path = report["checkpoint"]
+            if path.endswith(".pt"):
+                CheckpointIndex(os.path.dirname(path)).update_metrics(
+                    os.path.basename(path), {EVAL_METRIC: report["score"]["mean"]})
+    text = json.dumps(reports, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
@@ -0,0 +1,207 @@
+"""
+基于距离场的专家策略与行为克隆（behavior cloning）预训练。
+
+游戏中已经有到终点的精确 BFS 距离场，每一步选择距离最小的相邻格子就是最优动作。
+generate_dataset() 在 NavigateVecEnv 上用专家策略（加少量随机动作扩大状态分布）批量采样，
+把 (观测, 动作掩码, 专家动作) 分块写入磁盘；behavior_cloning() 用这些样本预热 MaskablePPO / QRDQN。
+
+    python expert.py generate ../output/expert/CnnPolicy --policy CnnPolicy --samples 200000
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from distance_engine import UNREACHABLE
+from legal_moves import ACTION_OFFSETS
+from navigate_vec_env import NavigateVecEnv
+
+DATASET_FILES = ("observations.npy", "action_masks.npy", "actions.npy")
+
+
+def expert_actions(distance, navigator, action_masks=None):
+    """
+    distance: (N, H, W) 每个棋盘到终点的距离场，navigator: (N, 2) 当前位置，action_masks: (N, 4) 可选的合法动作。
+    返回 (actions, reachable)：actions 为环境动作 0-3（UP, DOWN, LEFT, RIGHT），距离相同时取编号小的动作；
+    reachable 表示终点是否可达，不可达的棋盘给出任意一个合法动作，这些样本没有意义。
+    Navigator 需要在棋盘内。
+    """
+    distance = np.asarray(distance)
+    navigator = np.asarray(navigator)
+    num_boards, height, width = distance.shape
+    neighbor = navigator[:, None, :] + np.array(ACTION_OFFSETS)
+    inside = ((neighbor >= 0) & (neighbor < (height, width))).all(axis=2)
+
+    # 出界（以及给出掩码时不合法）的方向记为 UNREACHABLE + 1，终点不可达时仍然优先选择合法的动作
+    neighbor_distance = np.full((num_boards, 4), UNREACHABLE + 1, dtype=np.int64)
+    boards, actions = np.nonzero(inside)
+    neighbor_distance[boards, actions] = distance[boards, neighbor[boards, actions, 0], neighbor[boards, actions, 1]]
+    if action_masks is not None:
+        neighbor_distance[~np.asarray(action_masks, dtype=bool)] = UNREACHABLE + 1
+    best = neighbor_distance.argmin(axis=1)
+    # 可达时最优的相邻格子一定比当前格子近一步；终点被障碍物占据（到达后重新生成的终点可能落在障碍物上）时
+    # 距离场有限但走不到，也算作不可达
+    rows = np.arange(num_boards)
+    reachable = neighbor_distance[rows, best] < distance[rows, navigator[:, 0], navigator[:, 1]]
+    return best, reachable
+
+
+def expert_action(game):
+    # 单个 NavigateGame 的专家动作（环境动作 0-3）
+    actions, _ = expert_actions(game.distance[None], np.array([game.navigator]))
+    return int(actions[0])
+
+
+def generate_dataset(path, num_samples=200000, policy_type="MlpPolicy", num_envs=256, seed=0, epsilon=0.1,
+                     chunk_steps=64, observation="full", board_size=12, view_size=None):
+    """
+    采样 num_samples 条专家数据写到目录 path，每个数组一个 .npy 文件（内存映射，按块写入，不占用整份内存）。
+    每一步以 epsilon 的概率执行随机的合法动作而不是专家动作，记录的标签始终是专家动作，
+    这样数据里也有偏离最优路径之后如何回到最优路径的状态。终点不可达的样本不写入。
+    """
+    os.makedirs(path, exist_ok=True)
+    env = NavigateVecEnv(num_envs, policy_type=policy_type, seed=seed, board_size=board_size, observation=observation,
+                         view_size=view_size)
+    game = env.game
+    rng = np.random.default_rng(seed)
+
+    files = [os.path.join(path, name) for name in DATASET_FILES]
+    observations = np.lib.format.open_memmap(files[0], mode="w+", dtype=env.observation_space.dtype,
+                                             shape=(num_samples,) + env.observation_space.shape)
+    masks = np.lib.format.open_memmap(files[1], mode="w+", dtype=bool, shape=(num_samples, 4))
+    labels = np.lib.format.open_memmap(files[2], mode="w+", dtype=np.int8, shape=(num_samples,))
+
+    # 先在内存中攒 chunk_steps 步再一次写入
+    chunk_obs = np.empty((chunk_steps * num_envs,) + env.observation_space.shape, dtype=env.observation_space.dtype)
+    chunk_masks = np.empty((chunk_steps * num_envs, 4), dtype=bool)
+    chunk_labels = np.empty(chunk_steps * num_envs, dtype=np.int8)
+
+    start_time = time.perf_counter()
+    written = 0
+    obs = env.reset()
+    while written < num_samples:
+        filled = 0
+        for _ in range(chunk_steps):
+            action_masks = env.action_masks()
+            actions, reachable = expert_actions(game.distance, game.navigator, action_masks)
+            keep = np.flatnonzero(reachable)
+            end = filled + len(keep)
+            chunk_obs[filled:end] = obs[keep]
+            chunk_masks[filled:end] = action_masks[keep]
+            chunk_labels[filled:end] = actions[keep]
+            filled = end
+
+            explore = rng.random(num_envs) < epsilon
+            if explore.any():
+                # 在合法动作中随机选择（没有合法动作时随便走一步，回合结束后自动重置）
+                scores = rng.random((num_envs, 4)) + action_masks
+                actions = np.where(explore, scores.argmax(axis=1), actions)
+            obs, _, _, _ = env.step(actions)
+
+        count = min(filled, num_samples - written)
+        observations[written:written + count] = chunk_obs[:count]
+        masks[written:written + count] = chunk_masks[:count]
+        labels[written:written + count] = chunk_labels[:count]
+        written += count
+
+    for array in (observations, masks, labels):
+        array.flush()
+    elapsed = time.perf_counter() - start_time
+    meta = {"policy_type": policy_type, "observation": observation, "board_size": board_size, "samples": num_samples,
+            "seed": seed, "epsilon": epsilon, "samples_per_sec": num_samples / elapsed}
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_dataset(path):
+    # 以只读内存映射方式打开，返回 (observations, action_masks, actions)
+    return tuple(np.load(os.path.join(path, name), mmap_mode="r") for name in DATASET_FILES)
+
+
+def behavior_cloning(model, path, epochs=3, batch_size=256, learning_rate=1e-3, seed=0, verbose=1):
+    """
+    用专家数据对 model 的策略做监督训练（单独的 Adam 优化器，不影响之后强化学习的优化器状态）。
+      MaskablePPO: 最大化带动作掩码的专家动作对数概率（价值网络不参与）
+      QRDQN:       以分位数均值作为 Q 值，对合法动作上的 Q 值做交叉熵，训练完同步目标网络
+    返回每个 epoch 的平均损失。
+    """
+    import torch as th
+    import torch.nn.functional as F
+
+    observations, masks, labels = load_dataset(path)
+    policy = model.policy
+    policy.set_training_mode(True)
+    is_qrdqn = hasattr(policy, "quantile_net")
+    parameters = list(policy.quantile_net.parameters() if is_qrdqn else policy.parameters())
+    optimizer = th.optim.Adam(parameters, lr=learning_rate)
+    rng = np.random.default_rng(seed)
+
+    losses = []
+    for epoch in range(epochs):
+        order = rng.permutation(len(labels))
+        total = 0.0
+        for start in range(0, len(order), batch_size):
+            # 按排序后的下标读取，内存映射上接近顺序访问
+            batch = np.sort(order[start:start + batch_size])
+            obs, _ = policy.obs_to_tensor(np.asarray(observations[batch]))
+            action_masks = th.as_tensor(masks[batch], device=policy.device)
+            actions = th.as_tensor(labels[batch], dtype=th.long, device=policy.device)
+
+            if is_qrdqn:
+                q_values = policy.quantile_net(obs).mean(dim=1)
+                q_values = q_values.masked_fill(~action_masks, -1e8)
+                loss = F.cross_entropy(q_values, actions)
+            else:
+                _, log_prob, _ = policy.evaluate_actions(obs, actions, action_masks=action_masks)
+                loss = -log_prob.mean()
+
+            optimizer.zero_grad()
+            loss.backward()
+            th.nn.utils.clip_grad_norm_(parameters, 0.5)
+            optimizer.step()
+            total += loss.item() * len(batch)
+
+        losses.append(total / len(order))
+        if verbose:
+            print(f"behavior cloning epoch {epoch + 1}/{epochs}: loss {losses[-1]:.4f}")
+
+    if is_qrdqn:
+        model.quantile_net_target.load_state_dict(model.quantile_net.state_dict())
+    policy.set_training_mode(False)
+    return losses
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate expert demonstrations from the BFS distance field.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate")
+    generate_parser.add_argument("path")
+    generate_parser.add_argument("--policy", default="MlpPolicy", choices=("MlpPolicy", "CnnPolicy"))
+    generate_parser.add_argument("--samples", type=int, default=200000)
+    generate_parser.add_argument("--num-envs", type=int, default=256)
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument("--epsilon", type=float, default=0.1)
+    check_parser = subparsers.add_parser("check", help="run the expert and count arrivals / collisions")
+    check_parser.add_argument("--steps", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        meta = generate_dataset(args.path, args.samples, policy_type=args.policy, num_envs=args.num_envs,
+                                seed=args.seed, epsilon=args.epsilon)
+        print(f"Wrote {meta['samples']} samples to {args.path} ({meta['samples_per_sec']:.0f} samples/s)")
+    else:
+        # 专家在终点可达时不会撞墙或撞障碍物，回合只会因为超时或终点不可达而结束
+        env = NavigateVecEnv(64, seed=0)
+        env.reset()
+        arrivals = collisions = unreachable = 0
+        for _ in range(args.steps):
+            actions, reachable = expert_actions(env.game.distance, env.game.navigator, env.action_masks())
+            unreachable += int((~reachable).sum())
+            _, _, dones, infos = env.step(actions)
+            arrivals += sum(info.get("destination_arrived", False) for info in infos)
+            collisions += sum(info.get("failure_cause") in ("wall", "obstacle") for info in infos)
+        print(f"{arrivals} arrivals, {collisions} collisions, {unreachable} steps with an unreachable destination "
+              f"in {64 * args.steps} steps")
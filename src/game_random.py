@@ -0,0 +1,97 @@
+import numpy as np
+
+
+def spawn_seeds(root_seed, count):
+    """
+    从一个根种子派生 count 个互相独立的子种子（SeedSequence），第 i 个环境 / 棋盘使用第 i 个。
+    NavigateVecEnv 和 train.py 构造多个环境时都按这个约定，所以不同后端的 rollout 逐位一致。
+    """
+    root = root_seed if isinstance(root_seed, np.random.SeedSequence) else np.random.SeedSequence(root_seed)
+    return root.spawn(count)
+
+
+def obstacle_count_for(size, density=None):
+    # density 为 None 时与最初的默认值相同：格子数的 1/7；起点和终点必须留空
+    if density is None:
+        return size * size // 7
+    return min(int(round(size * size * density)), size * size - 2)
+
+
+def active_region(board_size, size, density=None):
+    """
+    课程学习的难度设置：只在棋盘中央 size x size 的区域内出题，区域外全部是障碍物，观测大小不变。
+    返回区域左上角的偏移量。起点固定在整个棋盘的中心，区域至少 2x2 才能包含它。
+    """
+    if not 2 <= size <= board_size:
+        raise ValueError(f"active board size must be between 2 and {board_size}, got {size}")
+    if density is not None and not 0 <= density < 1:
+        raise ValueError(f"obstacle density must be in [0, 1), got {density}")
+    return (board_size - size) // 2
+
+
+class GameRandom:
+    """
+    每个棋盘独占的随机数流（PCG64），替代全局 random 模块。
+    终点等标量采样从批量预先生成的缓冲区中取，用完再整批补充；障碍物一次性整批采样。
+    NavigateGame 和 BatchedNavigateGame 都通过这里生成棋盘，同一个种子得到完全相同的布局。
+    """
+
+    def __init__(self, seed=0, buffer_size=256):
+        self.buffer_size = buffer_size
+        self.seed(seed)
+
+    def seed(self, seed):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.generator = np.random.Generator(np.random.PCG64(seed))
+        self.buffer = []
+        self.position = 0
+
+    def new_episode(self, seed=None):
+        """
+        回合开始时调用：从当前的流中抽一个整数种子（或使用给定的 seed），用它重新设定随机数流并返回。
+        这个回合的棋盘和之后的终点只由这个种子决定，记录下来（如轨迹文件）就能复现。每次约 30 us。
+        """
+        if seed is None:
+            seed = int(self.generator.integers(1 << 63))
+        self.seed(seed)
+        return seed
+
+    def uniform(self):
+        if self.position == len(self.buffer):
+            # Python float 列表上逐个取值比 ndarray 标量索引快
+            self.buffer = self.generator.random(self.buffer_size).tolist()
+            self.position = 0
+        value = self.buffer[self.position]
+        self.position += 1
+        return value
+
+    def integer(self, n):
+        # [0, n) 中的整数
+        return int(self.uniform() * n)
+
+    def destination(self, board_size, navigator):
+        # 在除 Navigator 以外的格子中均匀采样
+        navigator_index = navigator[0] * board_size + navigator[1]
+        index = self.integer(board_size * board_size - 1)
+        index += index >= navigator_index
+        return divmod(index, board_size)
+
+    def cell(self, cells, excluded):
+        """
+        在升序的一维格子下标 cells 中除 excluded 以外的格子里均匀采样，excluded 必须在 cells 中。
+        与 destination() 一样只消耗一个随机数。
+        """
+        index = self.integer(len(cells) - 1)
+        index += index >= int(np.searchsorted(cells, excluded))
+        return int(cells[index])
+
+    def obstacle_cells(self, grid_size, excluded, count):
+        """
+        从除 excluded 以外的格子中不放回地抽取 count 个，返回一维格子下标。
+        """
+        excluded = sorted(set(excluded))
+        cells = self.generator.choice(grid_size - len(excluded), count, replace=False)
+        for index in excluded:
+            cells += cells >= index
+        return cells
@@ -0,0 +1,364 @@
+"""
+训练好的导航策略的推理服务：模型只加载一次，并发的请求在很短的时间窗口内合并成一批做一次前向。
+
+请求中的棋盘状态为 {"obstacles": 二维 0/1 列表, "navigator": [row, col], "destination": [row, col]}，
+观测由 NavigateEnvCnn / NavigateEnvMlp 的 _generate_observation 生成，动作掩码与训练时相同。
+
+    python inference_server.py serve ../output/trained_models_CnnPolicy/PPO/PPO_navigate_final.zip --port 8000
+    curl -X POST localhost:8000/predict -d '{"state": {...}}'      -> {"action": 2, "action_name": "LEFT"}
+    curl -X POST localhost:8000/plan -d '{"state": {...}}'         -> {"actions": [...], "path": [...], "status": ...}
+    python inference_server.py bench <model> --concurrency 32     # 进程内压测，加 --url 压测正在运行的服务
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from checkpointing import load_env_config
+from evaluate import load_model
+from legal_moves import ACTION_OFFSETS, legal_move_table
+from navigate_game import NavigateGame
+from navigate_game_custom_wrapper_cnn import NavigateEnvCnn
+from navigate_game_custom_wrapper_mlp import NavigateEnvMlp
+
+ACTION_NAMES = ("UP", "DOWN", "LEFT", "RIGHT")
+
+
+def parse_state(state, board_size):
+    # 在请求线程里检查完再放进 MicroBatcher，格式不对的请求不会进入批次
+    obstacles = np.asarray(state["obstacles"])
+    if obstacles.shape != (board_size, board_size):
+        raise ValueError(f"obstacles must be a {board_size}x{board_size} grid, got {obstacles.shape}")
+    if not np.isin(obstacles, (0, 1)).all():
+        raise ValueError("obstacles must only contain 0 and 1")
+    occupancy = obstacles.astype(np.uint8)
+    navigator = tuple(int(v) for v in state["navigator"])
+    destination = tuple(int(v) for v in state["destination"])
+    for name, pos in (("navigator", navigator), ("destination", destination)):
+        if len(pos) != 2 or not (0 <= pos[0] < board_size and 0 <= pos[1] < board_size):
+            raise ValueError(f"{name} {pos} is outside the {board_size}x{board_size} board")
+    return occupancy, navigator, destination
+
+
+def state_from_game(game):
+    # 当前棋盘的请求格式，压测和调试用
+    return {"obstacles": game.occupancy.tolist(), "navigator": list(game.navigator),
+            "destination": list(game.destination)}
+
+
+class NavigatorPolicy:
+    """
+    加载一次模型（完整 zip 或 checkpointing 保存的 .pt 策略），对一批棋盘状态返回动作。
+    观测借用一个不运行的 NavigateEnvCnn / NavigateEnvMlp：把请求的棋盘写进它的 game，再调用 _generate_observation，
+    保证与训练时的观测完全一致。只在一个线程（MicroBatcher 的工作线程）中使用。
+    """
+
+    def __init__(self, model_path, model_type="PPO", policy_type="CnnPolicy", board_size=None, observation=None,
+                 view_size=None, device="cpu"):
+        self.model = load_model(model_type, model_path, device=device)
+        # 没有指定的参数取模型训练时的配置（checkpointing.load_env_config），再没有时用默认值
+        env_config = load_env_config(self.model, model_path)
+        board_size = board_size or env_config.get("board_size") or 12
+        observation = observation or env_config.get("observation") or "full"
+        view_size = view_size or env_config.get("view_size") or 12
+        if observation == "ego":
+            # ego 观测叠加了最近几帧，单个请求的棋盘状态无法重建
+            raise ValueError("observation='ego' needs frame history and cannot be served from single board states")
+        self.board_size = board_size
+        env_class = NavigateEnvCnn if policy_type == "CnnPolicy" else NavigateEnvMlp
+        self.env = env_class(seed=0, board_size=board_size, observation=observation, view_size=view_size)
+        self.obs = np.zeros((0,) + self.env.observation_space.shape, dtype=self.env.observation_space.dtype)
+        self.masks = np.zeros((0, 4), dtype=bool)
+
+    def _load_board(self, occupancy, navigator, destination):
+        game = self.env.game
+        if occupancy is not game.occupancy:
+            game.occupancy = occupancy
+            game.legal_moves = legal_move_table(occupancy)
+        game.navigator = navigator
+        game.destination = destination
+
+    def predict_batch(self, boards):
+        """
+        boards: [(occupancy, navigator, destination), ...]（parse_state 的结果），返回动作数组（0-3）。
+        """
+        n = len(boards)
+        if len(self.obs) < n:
+            self.obs = np.zeros((n,) + self.obs.shape[1:], dtype=self.obs.dtype)
+            self.masks = np.zeros((n, 4), dtype=bool)
+        for i, board in enumerate(boards):
+            self._load_board(*board)
+            self.obs[i] = self.env._generate_observation()
+            self.masks[i] = self.env.get_action_mask()[0]
+        return self._masked_actions(self.obs[:n], self.masks[:n])
+
+    def _masked_actions(self, obs, masks):
+        policy = getattr(self.model, "policy", self.model)
+        if hasattr(policy, "quantile_net"):
+            # QRDQN 的 predict 不支持动作掩码，直接在分位数均值上取合法动作中的最大值
+            import torch as th
+
+            with th.no_grad():
+                obs_tensor, _ = policy.obs_to_tensor(obs)
+                q_values = policy.quantile_net(obs_tensor).mean(dim=1).cpu().numpy()
+            q_values[~masks] = -np.inf
+            return q_values.argmax(axis=1)
+        actions, _ = self.model.predict(obs, deterministic=True, action_masks=masks)
+        return actions
+
+
+class MicroBatcher:
+    """
+    把并发提交的请求合并成批：工作线程拿到第一个请求后，最多再等 max_latency 秒或凑够 max_batch_size 个，
+    然后一次调用 predict_batch。submit() 返回 concurrent.futures.Future。
+    """
+
+    def __init__(self, predict_batch, max_batch_size=64, max_latency=0.002):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.batched_requests = 0
+        self.worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, board):
+        future = Future()
+        self.requests.put((board, future))
+        return future
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
+
+    def _run(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    # 处理完这一批再退出
+                    self.requests.put(None)
+                    break
+                batch.append(item)
+
+            try:
+                actions = self.predict_batch([board for board, _ in batch])
+            except Exception:
+                # 逐个重试，只有出错的请求收到异常，同一批的其他请求不受影响
+                for board, future in batch:
+                    try:
+                        action = int(self.predict_batch([board])[0])
+                    except Exception as e:
+                        future.set_exception(e)
+                        continue
+                    self.batches += 1
+                    self.batched_requests += 1
+                    future.set_result(action)
+                continue
+            self.batches += 1
+            self.batched_requests += len(batch)
+            for (_, future), action in zip(batch, actions):
+                future.set_result(int(action))
+
+
+class InferenceService:
+    def __init__(self, policy, max_batch_size=64, max_latency=0.002):
+        self.board_size = policy.board_size
+        self.batcher = MicroBatcher(policy.predict_batch, max_batch_size, max_latency)
+
+    def predict(self, state):
+        return self.batcher.submit(parse_state(state, self.board_size)).result()
+
+    def plan(self, state, max_steps=None):
+        """
+        从 navigator 出发反复询问策略直到到达终点，返回动作序列、经过的位置和结束原因：
+        "arrived" 到达终点，"blocked" 没有合法动作，"max_steps" 超过步数上限（默认为格子数）。
+        每一步都经过 MicroBatcher，多个并发的规划请求会合并成批。
+        """
+        occupancy, navigator, destination = parse_state(state, self.board_size)
+        max_steps = max_steps or self.board_size * self.board_size
+        actions, path = [], [list(navigator)]
+        legal_moves = legal_move_table(occupancy)
+        status = "max_steps"
+        for _ in range(max_steps):
+            if not legal_moves[navigator].any():
+                status = "blocked"
+                break
+            action = self.batcher.submit((occupancy, navigator, destination)).result()
+            row_offset, col_offset = ACTION_OFFSETS[action]
+            navigator = (navigator[0] + row_offset, navigator[1] + col_offset)
+            actions.append(action)
+            path.append(list(navigator))
+            if navigator == destination:
+                status = "arrived"
+                break
+        return {"actions": actions, "action_names": [ACTION_NAMES[a] for a in actions], "path": path,
+                "status": status}
+
+    def stats(self):
+        batcher = self.batcher
+        return {"batches": batcher.batches, "requests": batcher.batched_requests,
+                "mean_batch_size": batcher.batched_requests / max(batcher.batches, 1)}
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok", **service.stats()})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if self.path == "/predict":
+                    if "states" in request:
+                        # 先检查完所有棋盘再提交，有一个格式不对时整个请求返回 400，不会留下已提交的请求
+                        boards = [parse_state(state, service.board_size) for state in request["states"]]
+                        futures = [service.batcher.submit(board) for board in boards]
+                        actions = [future.result() for future in futures]
+                        self._reply(200, {"actions": actions, "action_names": [ACTION_NAMES[a] for a in actions]})
+                    else:
+                        action = service.predict(request["state"])
+                        self._reply(200, {"action": action, "action_name": ACTION_NAMES[action]})
+                elif self.path == "/plan":
+                    self._reply(200, service.plan(request["state"], request.get("max_steps")))
+                else:
+                    self._reply(404, {"error": "not found"})
+            except (KeyError, ValueError, TypeError) as e:
+                self._reply(400, {"error": str(e)})
+            except Exception as e:
+                # future.result() 会重新抛出 predict_batch 中的异常，也要回复，否则客户端一直收不到响应
+                self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(service, host="127.0.0.1", port=8000):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    print(f"Serving on http://{host}:{port}")
+    server.serve_forever()
+
+
+def load_test(send, states, concurrency=32, duration=10.0):
+    """
+    concurrency 个线程在 duration 秒内不停地发请求，send(state) 完成一次请求。返回吞吐量和延迟分位数。
+    """
+    latencies = [[] for _ in range(concurrency)]
+    stop_time = time.perf_counter() + duration
+
+    def client(i):
+        k = i
+        while time.perf_counter() < stop_time:
+            start_time = time.perf_counter()
+            send(states[k % len(states)])
+            latencies[i].append(time.perf_counter() - start_time)
+            k += concurrency
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    all_latencies = np.concatenate([np.asarray(values) for values in latencies]) * 1e3
+    return {
+        "concurrency": concurrency,
+        "requests": int(len(all_latencies)),
+        "requests_per_sec": len(all_latencies) / elapsed,
+        "p50_ms": float(np.percentile(all_latencies, 50)),
+        "p99_ms": float(np.percentile(all_latencies, 99)),
+    }
+
+
+def http_sender(url):
+    def send(state):
+        request = urllib.request.Request(url.rstrip("/") + "/predict", data=json.dumps({"state": state}).encode(),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())["action"]
+
+    return send
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a trained navigator with micro-batched inference.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name in ("serve", "bench"):
+        command_parser = subparsers.add_parser(name)
+        command_parser.add_argument("model", help="model zip or .pt policy checkpoint")
+        command_parser.add_argument("--model-type", default="PPO", choices=("PPO", "QRDQN"))
+        command_parser.add_argument("--policy-type", default="CnnPolicy", choices=("CnnPolicy", "MlpPolicy"))
+        # 默认取模型训练时的配置
+        command_parser.add_argument("--board-size", type=int, default=None)
+        command_parser.add_argument("--observation", default=None, choices=("full", "crop", "downsample"))
+        command_parser.add_argument("--view-size", type=int, default=None)
+        command_parser.add_argument("--max-batch-size", type=int, default=64)
+        command_parser.add_argument("--max-latency-ms", type=float, default=2.0)
+    subparsers.choices["serve"].add_argument("--host", default="127.0.0.1")
+    subparsers.choices["serve"].add_argument("--port", type=int, default=8000)
+    bench_parser = subparsers.choices["bench"]
+    bench_parser.add_argument("--concurrency", type=int, default=32)
+    bench_parser.add_argument("--duration", type=float, default=10.0)
+    bench_parser.add_argument("--url", default=None, help="benchmark a running server instead of in-process")
+    args = parser.parse_args()
+
+    policy = NavigatorPolicy(args.model, args.model_type, args.policy_type, board_size=args.board_size,
+                             observation=args.observation, view_size=args.view_size)
+    service = InferenceService(policy, args.max_batch_size, args.max_latency_ms / 1e3)
+    if args.command == "serve":
+        serve(service, args.host, args.port)
+    else:
+        game = NavigateGame(seed=0, board_size=policy.board_size)
+        states = []
+        for _ in range(256):
+            game.reset()
+            states.append(state_from_game(game))
+
+        if args.url:
+            print(json.dumps(load_test(http_sender(args.url), states, args.concurrency, args.duration), indent=2))
+        else:
+            # 对照：不合并请求，每个请求单独调用一次 predict_batch（加锁，与逐个 model.predict 相同）
+            lock = threading.Lock()
+
+            def unbatched(state):
+                with lock:
+                    return policy.predict_batch([parse_state(state, policy.board_size)])[0]
+
+            report = {"unbatched": load_test(unbatched, states, args.concurrency, args.duration),
+                      "batched": load_test(service.predict, states, args.concurrency, args.duration)}
+            report["batched"].update(service.stats())
+            print(json.dumps(report, indent=2))
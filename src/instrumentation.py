@@ -0,0 +1,317 @@
+"""
+可选的性能埋点：在游戏、环境和 SB3 三层的热点函数外面包一层计时器。
+
+未启用时不修改任何函数，没有额外开销；enable() 时才用带计时的版本替换（monkeypatch），disable() 恢复原函数。
+计时器同时记录包含子调用的总耗时和扣除子计时器后的自身耗时，例如 env.step 的自身耗时就是奖励计算等
+NavigateEnv.step 里除了 game.step 和观测生成之外的部分。
+
+计时器只统计当前进程。subproc / shared_memory 后端下游戏和环境在 worker 进程中运行，
+分析这两层的开销时请使用 dummy 或 batched 后端，或者用采样分析器直接附加到进程上。
+
+采样分析器：install_sampling_profiler() 注册 SIGUSR1，收到信号后开始按 ITIMER_PROF 采样主线程调用栈，
+再次收到信号时停止并把 collapsed stack（可直接交给 flamegraph.pl / speedscope）写到 output_dir 下的
+profile-<pid>-<时间>.collapsed，路径同时打印到训练进程的 stderr。train(profile=True) 才会注册（写到 LOG_DIR），
+附加到正在运行的训练进程：
+
+    python instrumentation.py attach <pid> --duration 30
+    python instrumentation.py attach <pid> --duration 30 --py-spy   # 使用 py-spy，也能看到 worker 进程
+"""
+import argparse
+import collections
+import functools
+import importlib
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+from stable_baselines3.common.callbacks import BaseCallback
+
+from connectivity import summarize_generation
+
+# 名称 -> (模块, 类, 方法)
+TARGETS = {
+    # NavigateEnv 调用的是 step_fast / reset_fast，兼容接口 step() / reset() 也经过它们
+    "game.step": ("navigate_game", "NavigateGame", "step_fast"),
+    "game.reset": ("navigate_game", "NavigateGame", "reset_fast"),
+    "game.calculate_distance": ("navigate_game", "NavigateGame", "calculate_distance"),
+    "env.step": ("navigate_game_custom_wrapper", "NavigateEnv", "step"),
+    "env.reset": ("navigate_game_custom_wrapper", "NavigateEnv", "reset"),
+    "env.get_action_mask": ("navigate_game_custom_wrapper", "NavigateEnv", "get_action_mask"),
+    "env.mlp_observation": ("navigate_game_custom_wrapper_mlp", "NavigateEnvMlp", "_generate_observation"),
+    "env.cnn_observation": ("navigate_game_custom_wrapper_cnn", "NavigateEnvCnn", "_generate_observation"),
+    "env.ego_observation": ("navigate_game_custom_wrapper_ego", "NavigateEnvEgo", "_generate_observation"),
+    "batched.step": ("batched_navigate_game", "BatchedNavigateGame", "step"),
+    "batched.reset": ("batched_navigate_game", "BatchedNavigateGame", "reset"),
+    "batched.calculate_distance": ("batched_navigate_game", "BatchedNavigateGame", "calculate_distance"),
+    "vec.batched_observation": ("navigate_vec_env", "NavigateVecEnv", "_generate_observation"),
+}
+
+
+class Timer:
+    __slots__ = ("calls", "total", "self_total")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.self_total = 0.0
+
+
+class Instrumentation:
+    def __init__(self, max_episodes=1000):
+        self.enabled = False
+        self.timers = collections.defaultdict(Timer)
+        self.counters = collections.Counter()
+        # 每个环境实例当前回合内 env.step 的累计耗时，reset 时汇总为一条回合记录
+        self.episode_time = collections.defaultdict(float)
+        self.episodes = collections.deque(maxlen=max_episodes)
+        # 正在运行的计时器的子调用耗时，用于计算自身耗时
+        self._child_time = []
+        self._patches = []
+
+    def wrap(self, name, func):
+        timer = self.timers[name]
+        child_time = self._child_time
+        episode_time = self.episode_time if name == "env.step" else None
+        end_episode = self._end_episode if name == "env.reset" else None
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            if end_episode is not None:
+                end_episode(args[0])
+            child_time.append(0.0)
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                children = child_time.pop()
+                if child_time:
+                    child_time[-1] += elapsed
+                timer.calls += 1
+                timer.total += elapsed
+                timer.self_total += elapsed - children
+                if episode_time is not None:
+                    episode_time[id(args[0])] += elapsed
+
+        return timed
+
+    def _end_episode(self, env):
+        if env.total_step > 0:
+            self.episodes.append({
+                "steps": env.total_step,
+                "score": env.game.score,
+                "env_time_sec": self.episode_time.pop(id(env), 0.0),
+            })
+
+    def patch(self, owner, attr, name):
+        original = owner.__dict__[attr]
+        setattr(owner, attr, self.wrap(name, original))
+        self._patches.append((owner, attr, original))
+
+    def enable(self, targets=None):
+        if self.enabled:
+            return
+        targets = targets or TARGETS
+        for module_name, _, _ in targets.values():
+            importlib.import_module(module_name)
+        for name, (module_name, class_name, method) in targets.items():
+            # navigate_game_custom_wrapper 以 src.navigate_game 的名字导入游戏，两份模块对象都要替换
+            owners = []
+            for qualified in (module_name, "src." + module_name):
+                module = sys.modules.get(qualified)
+                owner = getattr(module, class_name, None) if module is not None else None
+                if owner is not None and method in owner.__dict__ and owner not in owners:
+                    owners.append(owner)
+            for owner in owners:
+                self.patch(owner, method, name)
+        self.enabled = True
+
+    def disable(self):
+        for owner, attr, original in reversed(self._patches):
+            setattr(owner, attr, original)
+        self._patches.clear()
+        self.enabled = False
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] += n
+
+    def stats(self):
+        timers = {
+            name: {
+                "calls": timer.calls,
+                "total_sec": timer.total,
+                "self_sec": timer.self_total,
+                "mean_us": 1e6 * timer.total / timer.calls,
+            }
+            for name, timer in self.timers.items() if timer.calls
+        }
+        episodes = {}
+        if self.episodes:
+            episodes = {key: sum(e[key] for e in self.episodes) / len(self.episodes)
+                        for key in ("steps", "score", "env_time_sec")}
+            episodes["count"] = len(self.episodes)
+            episodes["us_per_step"] = 1e6 * episodes["env_time_sec"] / max(episodes["steps"], 1)
+        return {"timers": timers, "counters": dict(self.counters), "episodes": episodes}
+
+    def reset_stats(self):
+        for timer in self.timers.values():
+            timer.calls = 0
+            timer.total = timer.self_total = 0.0
+        self.counters.clear()
+        self.episodes.clear()
+
+
+instrumentation = Instrumentation()
+enable = instrumentation.enable
+disable = instrumentation.disable
+count = instrumentation.count
+stats = instrumentation.stats
+
+
+class InstrumentationCallback(BaseCallback):
+    """
+    每次 rollout 结束时把计时器、计数器（reset 次数、BFS 次数、距离场缓存命中 / 未命中，见 NavigateGame.counters）、回合统计和棋盘生成统计（拒绝率、平均生成耗时）写进 SB3 的 logger（即 train.py 在 LOG_DIR 下的 TensorBoard 日志），
+    并记录 SB3 这一侧的 rollout / 训练耗时。写完后清零，日志中的值都是两次 rollout 之间的统计。
+    """
+
+    def __init__(self, verbose=0):
+        super().__init__(verbose)
+        self.rollout_start = None
+        self.rollout_end = None
+
+    def _init_callback(self):
+        instrumentation.enable()
+        # 向量环境的 step_wait 是 SB3 一侧看到的环境耗时，rollout 中剩下的时间主要花在策略网络前向上
+        vec_env = self.training_env
+        vec_env.step_wait = instrumentation.wrap("vec.step_wait", vec_env.step_wait)
+
+    def _on_rollout_start(self):
+        now = time.perf_counter()
+        if self.rollout_end is not None:
+            self.logger.record("instrumentation/sb3.train_sec", now - self.rollout_end)
+        self.rollout_start = now
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_end(self):
+        # 游戏对象上的计数（reset、BFS、距离场缓存命中 / 未命中）在 worker 进程中也有效，通过 env_method 取回
+        for counters in self.training_env.env_method("counters", True):
+            for name, value in (counters or {}).items():
+                instrumentation.count(name, value)
+        self.rollout_end = time.perf_counter()
+        rollout_sec = self.rollout_end - self.rollout_start
+        self.logger.record("instrumentation/sb3.rollout_sec", rollout_sec)
+
+        report = instrumentation.stats()
+        step_wait = report["timers"].get("vec.step_wait")
+        if step_wait is not None:
+            self.logger.record("instrumentation/sb3.policy_sec", rollout_sec - step_wait["total_sec"])
+        for name, timer in report["timers"].items():
+            self.logger.record(f"instrumentation/{name}.mean_us", timer["mean_us"])
+            self.logger.record(f"instrumentation/{name}.self_sec", timer["self_sec"])
+            self.logger.record(f"instrumentation/{name}.calls", timer["calls"])
+        for name, value in report["counters"].items():
+            self.logger.record(f"instrumentation/counter.{name}", value)
+        for name, value in report["episodes"].items():
+            self.logger.record(f"instrumentation/episode.{name}", value)
+        # 棋盘生成统计在游戏对象上，任何后端都能通过 env_method 取回（见 connectivity.GenerationStats）
+        generation = summarize_generation(self.training_env.env_method("generation_stats", True))
+        for name, value in generation.items():
+            self.logger.record(f"instrumentation/generation.{name}", value)
+        instrumentation.reset_stats()
+
+
+class SamplingProfiler:
+    """
+    基于 SIGPROF 的采样分析器：每隔 interval 秒（按进程 CPU 时间）记录一次主线程的调用栈。
+    """
+
+    def __init__(self, interval=0.005, output_dir="."):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.samples = collections.Counter()
+        self.running = False
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.samples.clear()
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self.running = True
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_IGN)
+        self.running = False
+        path = os.path.join(self.output_dir, f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        with open(path, "w") as f:
+            for stack, samples in self.samples.most_common():
+                f.write(f"{stack} {samples}\n")
+        return path
+
+    def toggle(self, signum=None, frame=None):
+        if self.running:
+            path = self.stop()
+            print(f"Sampling profiler stopped, wrote {path}", file=sys.stderr)
+        else:
+            self.start()
+            print("Sampling profiler started", file=sys.stderr)
+
+
+def install_sampling_profiler(output_dir=".", interval=0.005, signum=None):
+    """
+    注册信号处理函数，收到 SIGUSR1 时开始/停止采样。在收到信号之前没有任何开销。
+    """
+    signum = signum or getattr(signal, "SIGUSR1", None)
+    if signum is None or not hasattr(signal, "setitimer"):
+        return None
+    profiler = SamplingProfiler(interval=interval, output_dir=output_dir)
+    signal.signal(signum, profiler.toggle)
+    return profiler
+
+
+def attach(pid, duration, use_py_spy=False, output=None):
+    if use_py_spy:
+        py_spy = shutil.which("py-spy")
+        if py_spy is None:
+            raise RuntimeError("py-spy is not installed (pip install py-spy)")
+        output = output or f"profile-{pid}.svg"
+        # --subprocesses 同时采样 SubprocVecEnv / SharedMemoryVecEnv 的 worker 进程
+        subprocess.run([py_spy, "record", "--pid", str(pid), "--duration", str(int(duration)),
+                        "--subprocesses", "--output", output], check=True)
+        return output
+
+    os.kill(pid, signal.SIGUSR1)
+    time.sleep(duration)
+    os.kill(pid, signal.SIGUSR1)
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Attach a sampling profiler to a running train.py job.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    attach_parser = subparsers.add_parser("attach")
+    attach_parser.add_argument("pid", type=int)
+    attach_parser.add_argument("--duration", type=float, default=30)
+    attach_parser.add_argument("--py-spy", action="store_true", help="use py-spy instead of the built-in sampler")
+    attach_parser.add_argument("--output", help="py-spy output file")
+    args = parser.parse_args()
+
+    result = attach(args.pid, args.duration, use_py_spy=args.py_spy, output=args.output)
+    if result:
+        print(f"Wrote {result}")
+    else:
+        print(f"Profiled {args.pid} for {args.duration}s; the job wrote profile-{args.pid}-<time>.collapsed to its "
+              f"profiler output_dir (LOG_DIR for train.py) and printed the path on its stderr.")
@@ -0,0 +1,28 @@
+import numpy as np
+
+# 动作 UP, DOWN, LEFT, RIGHT 对应的 (row, col) 偏移
+ACTION_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+def legal_move_table(blocked):
+    """
+    预计算每个格子上 4 个动作是否合法（不出界、不撞障碍物）。
+    blocked 的形状为 (..., H, W)，返回 (..., H, W, 4) 的布尔表，可以同时处理多个棋盘。
+    """
+    free = ~blocked.astype(bool)
+    legal = np.zeros(blocked.shape + (4,), dtype=bool)
+    legal[..., 1:, :, 0] = free[..., :-1, :]
+    legal[..., :-1, :, 1] = free[..., 1:, :]
+    legal[..., :, 1:, 2] = free[..., :, :-1]
+    legal[..., :, :-1, 3] = free[..., :, 1:]
+    return legal
+
+
+def update_legal_moves(legal, blocked, pos):
+    # pos 处障碍物变化后，只需更新它四个邻居走向 pos 的那一项
+    row, col = pos
+    height, width = blocked.shape
+    for action, (dr, dc) in enumerate(ACTION_OFFSETS):
+        nr, nc = row - dr, col - dc
+        if 0 <= nr < height and 0 <= nc < width:
+            legal[nr, nc, action] = not blocked[row, col]
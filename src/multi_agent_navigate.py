@@ -0,0 +1,395 @@
+"""
+多智能体模式：K 个 Navigator 在同一张棋盘上各自前往自己的终点。
+
+障碍物网格、合法动作表和按终点缓存的距离场（DistanceFieldCache）只有一份，所有 Navigator 共用：
+同一个终点的距离场只算一次，多个 Navigator 同时需要新的距离场时用 bfs_batched 一起计算。
+所有 Navigator 同时移动（MultiAgentNavigateGame.step 一次推进全部），Navigator 之间的冲突向量化处理：
+
+    两个以上 Navigator 走向同一个格子            都留在原地
+    两个 Navigator 互换位置                      都留在原地
+    走向的格子上有留在原地的 Navigator           留在原地（连锁传递，直到没有新的冲突）
+
+被挡住的 Navigator 不算结束，只在 blocked 中标记；撞墙、撞障碍物的 Navigator 结束并离开棋盘，其他 Navigator 继续。
+
+MultiAgentNavigateEnv 提供与 PettingZoo ParallelEnv 相同的接口（reset / step 收发以智能体名称为键的字典，
+observation_space(agent) / action_space(agent)），但不依赖 pettingzoo；step_batch 直接收发数组，没有字典开销。
+观测是每个 Navigator 自己的 EgocentricObservation（与 NavigateEnvEgo 相同），其他 Navigator 在障碍物通道上显示为 128。
+"""
+import argparse
+import time
+
+import gymnasium
+import numpy as np
+
+from connectivity import SOLVABILITY_MODES, GenerationStats, component_cells, generate_solvable
+from distance_engine import UNREACHABLE
+from distance_field import DistanceFieldCache
+from game_random import GameRandom, obstacle_count_for
+from legal_moves import ACTION_OFFSETS, legal_move_table
+from observation_renderer import EgocentricObservation
+from reward import RewardFunction, failure_causes
+
+OFFSET_ROWS = np.array([dr for dr, _ in ACTION_OFFSETS])
+OFFSET_COLS = np.array([dc for _, dc in ACTION_OFFSETS])
+
+
+class MultiAgentNavigateGame:
+    def __init__(self, num_navigators, seed=0, board_size=12, density=None, solvability="reject",
+                 distance_backend="auto"):
+        if solvability not in SOLVABILITY_MODES:
+            raise ValueError(f"solvability must be one of {SOLVABILITY_MODES}, got {solvability!r}")
+        if 2 * num_navigators > board_size * board_size:
+            raise ValueError(f"{num_navigators} navigators do not fit on a {board_size}x{board_size} board")
+        self.num_navigators = num_navigators
+        self.board_size = board_size
+        self.grid_size = board_size ** 2
+        self.density = density
+        self.solvability = solvability
+
+        # 0:None 1: UP, 2: DOWN, 3: LEFT, 4: RIGHT
+        self.next_row = np.array((0, -1, 1, 0, 0), dtype=np.int64)
+        self.next_col = np.array((0, 0, 0, -1, 1), dtype=np.int64)
+
+        # 整张棋盘一个随机数流
+        self.rng = GameRandom(seed)
+        self.agent_index = np.arange(num_navigators)
+
+        self.navigator = np.zeros((num_navigators, 2), dtype=np.int64)
+        self.prev_navigator = np.zeros((num_navigators, 2), dtype=np.int64)
+        self.start_pos = np.zeros((num_navigators, 2), dtype=np.int64)
+        self.destination = np.zeros((num_navigators, 2), dtype=np.int64)
+        # 撞墙 / 撞障碍物之后为 False，离开棋盘，不再参与冲突和动作掩码
+        self.alive = np.ones(num_navigators, dtype=bool)
+        self.score = np.zeros(num_navigators, dtype=np.int64)
+
+        # 共享的障碍物、合法动作表和距离场缓存；distance[i] 是第 i 个 Navigator 当前终点的距离场
+        self.occupancy = np.zeros((board_size, board_size), dtype=np.uint8)
+        self.legal_moves = None
+        self.distance = np.full((num_navigators, board_size, board_size), UNREACHABLE, dtype=np.int32)
+        self.distance_fields = DistanceFieldCache(board_size, max_size=max(64, 2 * num_navigators),
+                                                  backend=distance_backend)
+        # 连通分量标签，新终点在 Navigator 所在的分量中采样；component_cells 按标签缓存分量的格子
+        self.labels = None
+        self.component_cells = {}
+        self.generation_stats = GenerationStats()
+
+        self.reset()
+
+    def seed(self, sed):
+        self.rng.seed(sed)
+
+    def reset(self):
+        count, size = self.num_navigators, self.board_size
+        # 起点和终点是 2K 个互不相同的格子，障碍物从剩下的格子中采样
+        endpoints = self.rng.obstacle_cells(self.grid_size, (), 2 * count)
+        self.navigator[:] = np.stack(np.divmod(endpoints[:count], size), axis=1)
+        self.destination[:] = np.stack(np.divmod(endpoints[count:], size), axis=1)
+        self.occupancy = self._generate_solvable_obstacles(endpoints)
+
+        self.prev_navigator[:] = self.navigator
+        self.start_pos[:] = self.navigator
+        self.alive[:] = True
+        self.score[:] = 0
+        self.legal_moves = legal_move_table(self.occupancy)
+        self.distance_fields.set_obstacles(self.occupancy)
+        self._update_distance(self.agent_index)
+
+    def step(self, actions):
+        """
+        所有 Navigator 同时执行一步动作（取值 0-4，与 NavigateGame.step 相同），已结束的 Navigator 的动作被忽略。
+        返回 (done, destination_arrived, blocked) 三个 (K,) 布尔数组，done 只在这一步撞墙 / 撞障碍物时为 True。
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        alive = self.alive
+        self.prev_navigator[:] = self.navigator
+        target = self.navigator + np.stack((self.next_row[actions], self.next_col[actions]), axis=1)
+        row, col = target[:, 0], target[:, 1]
+
+        # 检查是否撞墙或撞障碍物
+        out_of_board = (row < 0) | (row >= self.board_size) | (col < 0) | (col >= self.board_size)
+        done = alive & out_of_board
+        inside = np.flatnonzero(alive & ~out_of_board)
+        done[inside] = self.occupancy[row[inside], col[inside]] == 1
+
+        blocked = self._resolve_collisions(alive & ~done, target)
+        target[blocked] = self.navigator[blocked]
+        self.navigator[alive] = target[alive]
+        self.alive &= ~done
+
+        # 检查是否到达终点
+        destination_arrived = self.alive & (self.navigator == self.destination).all(axis=1)
+        self.score[destination_arrived] += 10
+        if destination_arrived.any():
+            agents = np.flatnonzero(destination_arrived)
+            # 新的一段路程从当前到达的位置开始
+            self.start_pos[agents] = self.navigator[agents]
+            self.destination[agents] = self._generate_destination(agents)
+            self._update_distance(agents)
+        return done, destination_arrived, blocked
+
+    def _resolve_collisions(self, moving, target):
+        # moving 中的 Navigator 同时走向 target，返回因为与其他 Navigator 冲突而留在原地的 (K,) 布尔数组
+        agents = np.flatnonzero(moving)
+        current = self.navigator[agents, 0] * self.board_size + self.navigator[agents, 1]
+        wanted = target[agents, 0] * self.board_size + target[agents, 1]
+        index = np.arange(len(agents))
+        occupant = np.full(self.grid_size, -1, dtype=np.int64)
+        occupant[current] = index
+        blocked = np.zeros(len(agents), dtype=bool)
+        while True:
+            # 留在原地的 Navigator 也占着自己的格子，走进去的 Navigator 会与它一起计数
+            claims = np.bincount(wanted, minlength=self.grid_size)
+            other = occupant[wanted]
+            has_other = (other >= 0) & (other != index)
+            swap = has_other & (wanted[np.where(has_other, other, 0)] == current)
+            stopped = ((claims[wanted] > 1) | swap) & (wanted != current)
+            if not stopped.any():
+                break
+            wanted[stopped] = current[stopped]
+            blocked |= stopped
+        result = np.zeros(self.num_navigators, dtype=bool)
+        result[agents] = blocked
+        return result
+
+    def _generate_destination(self, agents):
+        # 在 Navigator 所在的连通分量中、除 Navigator 以外的格子里均匀采样；solvability="off" 时在整个棋盘上采样
+        size = self.board_size
+        destination = np.empty((len(agents), 2), dtype=np.int64)
+        for row, agent in enumerate(agents.tolist()):
+            navigator = tuple(self.navigator[agent].tolist())
+            cells = None
+            if self.solvability != "off":
+                label = int(self.labels[navigator])
+                cells = self.component_cells.get(label)
+                if cells is None:
+                    cells = self.component_cells[label] = component_cells(self.labels, navigator)
+            if cells is not None and len(cells) > 1:
+                destination[row] = divmod(self.rng.cell(cells, navigator[0] * size + navigator[1]), size)
+            else:
+                destination[row] = self.rng.destination(size, navigator)
+        return destination
+
+    def _generate_obstacles(self, endpoints):
+        occupancy = np.zeros((self.board_size, self.board_size), dtype=np.uint8)
+        count = min(obstacle_count_for(self.board_size, self.density), self.grid_size - len(endpoints))
+        occupancy.ravel()[self.rng.obstacle_cells(self.grid_size, endpoints.tolist(), count)] = 1
+        return occupancy
+
+    def _generate_solvable_obstacles(self, endpoints):
+        # 与 NavigateGame._generate_solvable_obstacles 相同，但要求每个 Navigator 都与自己的终点连通
+        occupancy, self.labels = generate_solvable(lambda: self._generate_obstacles(endpoints), self.navigator.tolist(),
+                                                   self.destination.tolist(), self.solvability, self.generation_stats)
+        self.component_cells = {}
+        return occupancy
+
+    def _update_distance(self, agents):
+        # 共享缓存中没有的终点一起计算，多个 Navigator 的终点相同时只算一次
+        self.distance[agents] = self.distance_fields.get_many(self.destination[agents].tolist())
+
+    def get_action_masks(self):
+        """
+        (K, 4)，对应动作 UP, DOWN, LEFT, RIGHT：不撞墙、不撞障碍物，也不走进其他 Navigator 当前所在的格子。
+        已结束的 Navigator 全部为 False。
+        """
+        masks = np.zeros((self.num_navigators, 4), dtype=bool)
+        agents = np.flatnonzero(self.alive)
+        row, col = self.navigator[agents, 0], self.navigator[agents, 1]
+        masks[agents] = self.legal_moves[row, col]
+        # 四周补一圈，邻居下标不需要做越界检查（越界的动作已经被 legal_moves 排除）
+        occupied = np.zeros((self.board_size + 2, self.board_size + 2), dtype=bool)
+        occupied[row + 1, col + 1] = True
+        masks[agents] &= ~occupied[row[:, None] + 1 + OFFSET_ROWS, col[:, None] + 1 + OFFSET_COLS]
+        return masks
+
+
+class MultiAgentNavigateEnv:
+    """
+    PettingZoo ParallelEnv 风格的多智能体环境，智能体名称为 navigator_0 ... navigator_{K-1}。
+    奖励与 NavigateEnv 相同（reward.RewardFunction）；超过 step_limit 步时所有仍在棋盘上的 Navigator 被截断。
+    """
+
+    metadata = {"name": "navigate_multi_agent_v0", "render_modes": []}
+
+    def __init__(self, num_navigators=8, seed=0, board_size=12, density=None, step_limit=500, view_size=13,
+                 frames=4, reward_fn=None):
+        self.game = MultiAgentNavigateGame(num_navigators, seed=seed, board_size=board_size, density=density)
+        self.possible_agents = [f"navigator_{i}" for i in range(num_navigators)]
+        self.agent_ids = {agent: i for i, agent in enumerate(self.possible_agents)}
+        self.agents = []
+        self.render_mode = None
+        self.reward_fn = reward_fn or RewardFunction()
+        self.step_limit = step_limit
+
+        self.pipeline = EgocentricObservation(num_navigators, board_size, view_size, frames)
+        self._observation_space = gymnasium.spaces.Box(low=0, high=255, shape=self.pipeline.shape, dtype=np.uint8)
+        self._action_space = gymnasium.spaces.Discrete(4)  # 0: UP, 1: DOWN, 2: LEFT, 3: RIGHT
+        # 上一次在观测中标出的其他 Navigator 的位置，下一次观测前恢复成原来的障碍物值
+        self.marked = None
+
+        self.total_step = 0
+        self.already_achieve = np.zeros(num_navigators, dtype=np.int64)
+        # 奖励函数的输入：距离、上一步距离、起点距离、曼哈顿距离、上一步曼哈顿距离
+        self.reward_terms = np.zeros((5, num_navigators), dtype=np.float64)
+
+    @property
+    def num_agents(self):
+        return len(self.agents)
+
+    @property
+    def max_num_agents(self):
+        return len(self.possible_agents)
+
+    def observation_space(self, agent):
+        return self._observation_space
+
+    def action_space(self, agent):
+        return self._action_space
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self.game.seed(seed)
+        self.game.reset()
+        self.agents = list(self.possible_agents)
+        self.total_step = 0
+        self.already_achieve[:] = 0
+        obs = self._generate_observation(restart=True).copy()
+        return {agent: obs[i] for i, agent in enumerate(self.possible_agents)}, {agent: {} for agent in self.agents}
+
+    def step(self, actions):
+        """
+        actions 为 {智能体名称: 动作}，返回 (observations, rewards, terminations, truncations, infos) 五个字典，
+        包含这一步开始时仍在棋盘上的全部智能体；结束的智能体随后从 self.agents 中移除。
+        """
+        agents = self.agents
+        action_array = np.zeros(self.game.num_navigators, dtype=np.int64)
+        for agent, action in actions.items():
+            action_array[self.agent_ids[agent]] = action
+        obs, rewards, terminations, truncations, infos = self.step_batch(action_array)
+        obs = obs.copy()
+        ids = [self.agent_ids[agent] for agent in agents]
+        return (
+            {agent: obs[i] for agent, i in zip(agents, ids)},
+            {agent: float(rewards[i]) for agent, i in zip(agents, ids)},
+            {agent: bool(terminations[i]) for agent, i in zip(agents, ids)},
+            {agent: bool(truncations[i]) for agent, i in zip(agents, ids)},
+            {agent: infos[i] for agent, i in zip(agents, ids)},
+        )
+
+    def step_batch(self, actions):
+        """
+        数组版本的 step：actions 为 (K,) 的动作（0-3），返回 (obs, rewards, terminations, truncations, infos)，
+        前四个是长度为 K 的数组（已经结束的 Navigator 奖励为 0），obs 是帧缓冲区的只读视图，下一步会被改写。
+        """
+        game = self.game
+        alive = game.alive.copy()
+        done, destination_arrived, blocked = game.step(np.where(alive, np.asarray(actions) + 1, 0))
+
+        self.total_step += 1
+        over_time = alive & ~done & (self.total_step > self.step_limit)
+        arrived = ~over_time & destination_arrived
+        self.already_achieve[arrived] += 1
+
+        # 普通移动的 Navigator 才需要查距离场（到达终点时距离场已切换，撞墙时位置在棋盘外）
+        moving = np.flatnonzero(alive & ~done & ~over_time & ~destination_arrived)
+        rewards = self.reward_fn.batch_step(game, self.reward_terms, moving, done, over_time, arrived,
+                                            self.already_achieve)
+        rewards[~alive] = 0
+
+        # 截断的 Navigator 也离开棋盘
+        game.alive &= ~over_time
+        obs = self._generate_observation(arrived=np.flatnonzero(destination_arrived))
+
+        infos = [{} for _ in range(game.num_navigators)]
+        for i in np.flatnonzero(destination_arrived):
+            infos[i]["destination_arrived"] = True
+        for i in np.flatnonzero(blocked):
+            infos[i]["blocked"] = True
+        finished = done | over_time
+        if finished.any():
+            # 结束原因：撞墙、撞障碍物或超时
+            causes = failure_causes(game, finished, over_time)
+            for i, cause in zip(np.flatnonzero(finished), causes):
+                infos[i]["score"] = int(game.score[i])
+                infos[i]["failure_cause"] = cause
+        self.agents = [agent for agent, active in zip(self.possible_agents, game.alive.tolist()) if active]
+        return obs, rewards, done, over_time, infos
+
+    def action_masks(self):
+        return self.game.get_action_masks()
+
+    def close(self):
+        pass
+
+    def _generate_observation(self, restart=False, arrived=None):
+        game, pipeline = self.game, self.pipeline
+        if restart:
+            pipeline.set_boards(game.agent_index, game.occupancy[None], game.distance)
+            self.marked = None
+        elif len(arrived) > 0:
+            # 到达终点的 Navigator 换了距离场
+            pipeline.set_boards(arrived, game.occupancy[None], game.distance[arrived])
+
+        # 其他 Navigator 在障碍物通道上显示为 128，先恢复上一步标出的格子
+        if self.marked is not None:
+            rows, cols = self.marked
+            pipeline.mark_cells(rows, cols, game.occupancy[rows, cols] * np.uint8(255))
+        agents = np.flatnonzero(game.alive)
+        rows, cols = game.navigator[agents, 0], game.navigator[agents, 1]
+        self.marked = rows, cols
+        pipeline.mark_cells(rows, cols, 128)
+        # 每个 Navigator 自己的格子不算其他 Navigator，写回原来的值
+        pipeline.mark_cells(rows, cols, game.occupancy[rows, cols] * np.uint8(255), envs=agents)
+
+        if restart:
+            return pipeline.restart(game.agent_index, game.navigator, game.destination)
+        return pipeline.observe(game.navigator, game.destination)
+
+
+def benchmark(num_navigators, steps=2000, board_size=12, seed=0):
+    """
+    K 个 Navigator 共用一张棋盘（step_batch）与 K 个独立的 NavigateEnvEgo 逐个 step 的吞吐量（Navigator 步 / 秒）。
+    两边都使用随机的合法动作，回合结束后重置。
+    """
+    from navigate_game_custom_wrapper_ego import NavigateEnvEgo
+
+    rng = np.random.default_rng(seed)
+    env = MultiAgentNavigateEnv(num_navigators, seed=seed, board_size=board_size)
+    env.reset()
+    start_time = time.perf_counter()
+    for _ in range(steps):
+        masks = env.action_masks()
+        actions = (rng.random((num_navigators, 4)) * masks).argmax(axis=1)
+        env.step_batch(actions)
+        if not env.agents:
+            env.reset()
+    shared = num_navigators * steps / (time.perf_counter() - start_time)
+    stats = env.game.distance_fields.stats()
+
+    envs = [NavigateEnvEgo(seed=seed + i, board_size=board_size) for i in range(num_navigators)]
+    for single in envs:
+        single.reset()
+    start_time = time.perf_counter()
+    for _ in range(steps):
+        for single in envs:
+            mask = single.get_action_mask()[0]
+            _, _, done, over_time, _ = single.step(int((rng.random(4) * mask).argmax()))
+            if done or over_time:
+                single.reset()
+    separate = num_navigators * steps / (time.perf_counter() - start_time)
+    return shared, separate, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare one shared multi-agent board with K separate envs.")
+    parser.add_argument("--navigators", type=int, nargs="+", default=[4, 16, 32])
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--board-size", type=int, default=12)
+    args = parser.parse_args()
+    for num_navigators in args.navigators:
+        shared, separate, stats = benchmark(num_navigators, args.steps, args.board_size)
+        print(f"K={num_navigators:4d} shared {shared:10.0f} steps/s   separate {separate:10.0f} steps/s   "
+              f"x{shared / separate:5.1f}   distance cache {stats}")
+
+
+if __name__ == "__main__":
+    main()
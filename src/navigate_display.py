@@ -0,0 +1,102 @@
+import os
+import sys
+
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+import pygame
+from pygame import mixer
+
+from navigate_renderer import NavigateRenderer
+
+
+class NavigateDisplay:
+    """
+    NavigateGame 的可选显示层：窗口 / 离屏渲染、音效、欢迎和结束画面、事件处理。
+    pygame 和 mixer 只在这里导入，游戏第一次需要渲染或播放音效时才创建（NavigateGame.display），
+    静默训练的环境和 worker 进程完全不会导入 pygame。
+    headless=True 时只有离屏渲染器，不打开窗口也不初始化音频。
+    """
+
+    def __init__(self, game, headless=False):
+        self.game = game
+        self.headless = headless
+        self.renderer = NavigateRenderer(game, headless=headless)
+        self.screen = self.renderer.screen
+        self.font = self.renderer.font
+
+        self.sound_eat = self.sound_game_over = self.sound_victory = None
+        if not headless:
+            # 加载音效；没有音频设备时不播放音效，不影响显示
+            try:
+                mixer.init()
+            except pygame.error:
+                return
+            self.sound_eat = mixer.Sound("../resources/sound/eat.wav")
+            self.sound_game_over = mixer.Sound("../resources/sound/game_over.wav")
+            self.sound_victory = mixer.Sound("../resources/sound/victory.wav")
+
+    def play(self, sound):
+        if sound is not None:
+            sound.play()
+
+    def render(self):
+        self.renderer.render()
+        if self.headless:
+            return self.renderer.frame()
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+
+    def draw_welcome_screen(self):
+        game = self.game
+        title_text = self.font.render("NAVIGATE GAME", True, (255, 255, 255))
+        start_button_text = "START"
+
+        self.screen.fill((0, 0, 0))
+        self.screen.blit(title_text, (game.display_width // 2 - title_text.get_width() // 2, game.display_height // 4))
+        self.draw_button_text(start_button_text, (game.display_width // 2, game.display_height // 2))
+        pygame.display.flip()
+
+    def draw_game_over_screen(self):
+        game = self.game
+        game_over_text = self.font.render("GAME OVER", True, (255, 255, 255))
+        final_score_text = self.font.render(f"SCORE: {game.score}", True, (255, 255, 255))
+        retry_button_text = "RETRY"
+
+        self.screen.fill((0, 0, 0))
+        self.screen.blit(game_over_text,
+                         (game.display_width // 2 - game_over_text.get_width() // 2, game.display_height // 4))
+        self.screen.blit(final_score_text, (game.display_width // 2 - final_score_text.get_width() // 2,
+                                            game.display_height // 4 + final_score_text.get_height() + 10))
+        self.draw_button_text(retry_button_text, (game.display_width // 2, game.display_height // 2))
+        pygame.display.flip()
+
+    def draw_button_text(self, button_text_str, pos, hover_color=(255, 255, 255), normal_color=(100, 100, 100)):
+        mouse_pos = pygame.mouse.get_pos()
+        button_text = self.font.render(button_text_str, True, normal_color)
+        text_rect = button_text.get_rect(center=pos)
+
+        if text_rect.collidepoint(mouse_pos):
+            colored_text = self.font.render(button_text_str, True, hover_color)
+        else:
+            colored_text = self.font.render(button_text_str, True, normal_color)
+
+        self.screen.blit(colored_text, text_rect)
+
+    def draw_countdown(self, number):
+        game = self.game
+        countdown_text = self.font.render(str(number), True, (255, 255, 255))
+        self.screen.blit(countdown_text, (game.display_width // 2 - countdown_text.get_width() // 2,
+                                          game.display_height // 2 - countdown_text.get_height() // 2))
+        pygame.display.flip()
+
+    def is_mouse_on_button(self, button_text):
+        mouse_pos = pygame.mouse.get_pos()
+        text_rect = button_text.get_rect(
+            center=(
+                self.game.display_width // 2,
+                self.game.display_height // 2,
+            )
+        )
+        return text_rect.collidepoint(mouse_pos)
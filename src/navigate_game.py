@@ -1,19 +1,23 @@
-import os
-import sys
 import random
+import time
 
 import numpy as np
 
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
-import pygame
-from pygame import mixer
+from connectivity import SOLVABILITY_MODES, GenerationStats, component_cells, generate_solvable, label_components
+from distance_engine import UNREACHABLE
+from distance_field import DistanceFieldCache
+from game_random import GameRandom, active_region, obstacle_count_for
+from legal_moves import legal_move_table, update_legal_moves
+from step_state import StepState
 
 
 class NavigateGame:
-    def __init__(self, seed=0, board_size=12, silent_mode=True):
+    def __init__(self, seed=0, board_size=12, silent_mode=True, distance_backend="auto", scenario_bank=None,
+                 scenario_order="random", solvability="reject"):
         self.board_size = board_size
         self.grid_size = self.board_size ** 2
-        self.cell_size = 40
+        # 12x12 时每格 40 像素，大棋盘按比例缩小，窗口大小基本不变
+        self.cell_size = max(1, min(40, 480 // self.board_size))
         self.width = self.height = self.board_size * self.cell_size
 
         self.border_size = 20
@@ -25,64 +29,120 @@ class NavigateGame:
         self.next_col = (0, 0, 0, -1, 1)
 
         self.silent_mode = silent_mode
-        if not silent_mode:
-            pygame.init()
-            pygame.display.set_caption("Navigate Game")
-            self.screen = pygame.display.set_mode((self.display_width, self.display_height))
-            self.font = pygame.font.Font(None, 36)
-
-            # 加载音效
-            mixer.init()
-            self.sound_eat = mixer.Sound("../resources/sound/eat.wav")
-            self.sound_game_over = mixer.Sound("../resources/sound/game_over.wav")
-            self.sound_victory = mixer.Sound("../resources/sound/victory.wav")
-        else:
-            self.screen = None
-            self.font = None
+        # 渲染、音效和菜单画面在可选的显示层 navigate_display.NavigateDisplay 中，第一次用到时才导入 pygame 并创建，
+        # 静默模式下是离屏渲染器，否则是窗口和音效
+        self._display = None
 
         self.navigator = None
         self.prev_navigator = None
-        self.obstacles = None
+        # 障碍物占用网格（uint8，1 表示障碍物），每次 reset() 生成一次，是障碍物的唯一数据源
+        self.occupancy = np.zeros((self.board_size, self.board_size), dtype=np.uint8)
+        # 每个格子 UP, DOWN, LEFT, RIGHT 是否合法，(board_size, board_size, 4)，随 occupancy 一起生成
+        self.legal_moves = None
         self.distance = None
         self.start_pos = None
+        # add_obstacle / remove_obstacle 原地修改 occupancy 后依次调用的回调，
+        # 环境用它让缓存了障碍物的观测渲染器（CnnObservationRenderer 等）失效
+        self.obstacle_listeners = []
 
         self.direction = None
         self.score = 0
         self.destination = None
+        # 预分配的状态记录，step_fast() / reset_fast() 原地更新并返回它，不再每一步构造 info 字典
+        self.state = StepState(self.board_size)
         self.seed_value = seed
-
-        random.seed(seed)  # Set random seed.
+        # reset 次数，与距离场缓存的命中 / 未命中次数一起由 counters() 汇报
+        self.resets = 0
+        # 当前回合的整数种子（GameRandom.new_episode），reset_fast(episode_seed) 可以重新生成同一个回合
+        self.episode_seed = None
+        # 距离场计算后端见 distance_engine.DISTANCE_BACKENDS，"auto" 按棋盘大小选择
+        self.distance_fields = DistanceFieldCache(self.board_size, backend=distance_backend)
+        # 可选的预生成场景库（scenario_bank.ScenarioBank），reset() 时直接取场景，不再随机生成和 BFS
+        if scenario_bank is not None and scenario_bank.board_size != self.board_size:
+            raise ValueError(f"scenario bank {scenario_bank.path} has board_size={scenario_bank.board_size}, "
+                             f"but the game has board_size={self.board_size}")
+        self.scenario_bank = scenario_bank
+        self.scenario_order = scenario_order
+
+        # 每个游戏独占一个随机数流，seed 可以是整数或 game_random.spawn_seeds 派生的 SeedSequence
+        self.rng = GameRandom(seed)
+
+        # 起点和终点的连通性保证，取值见 connectivity.SOLVABILITY_MODES；"off" 与原来的生成方式完全一致。
+        # reachable_cells 为 Navigator 所在连通区域的一维下标（升序），到达终点后新的终点只在其中采样
+        if solvability not in SOLVABILITY_MODES:
+            raise ValueError(f"solvability must be one of {SOLVABILITY_MODES}, got {solvability!r}")
+        self.solvability = solvability
+        self.reachable_cells = None
+        self.generation_stats = GenerationStats()
+
+        # 难度（课程学习）：在中央 active_size x active_size 的区域内出题，obstacle_density 为 None 时障碍物为 1/7。
+        # set_difficulty() 只修改 pending_difficulty，下一次 reset 时生效，不影响正在进行的回合
+        self.active_size = self.board_size
+        self.active_offset = 0
+        self.obstacle_density = None
+        self.pending_difficulty = None
 
         self.reset()
 
     def seed(self, sed):
-        random.seed(sed)  # Set random seed.
+        self.rng.seed(sed)
 
-    def reset(self):
-        # 初始化开始位置为中心
-        self.navigator = (self.board_size // 2, self.board_size // 2)
-        self.prev_navigator = self.navigator
-        self.start_pos = self.navigator
+    def set_difficulty(self, board_size=None, density=None):
+        """
+        board_size: 出题区域的大小（不超过构造时的 board_size，观测大小不变）；density: 区域内障碍物的占比。
+        在下一次 reset 时生效。使用场景库时不起作用。
+        """
+        board_size = self.board_size if board_size is None else int(board_size)
+        offset = active_region(self.board_size, board_size, density)
+        self.pending_difficulty = (board_size, offset, density)
+
+    def reset(self, episode_seed=None):
+        # 兼容接口：返回 info 字典
+        return self.reset_fast(episode_seed).info()
 
+    def reset_fast(self, episode_seed=None):
         # 初始方向（下一步要走的方向）
         self.direction = "NONE"
-        self.destination = self._generate_destination()
-        self.obstacles = self._generate_obstacles()
-        self.distance = self.calculate_distance()
         self.score = 0
+        self.episode_seed = self.rng.new_episode(episode_seed)
+        self.resets += 1
 
-        destination_arrived = (self.navigator == self.destination)
-
-        info = {
-            "prev_navigator_pos": self.prev_navigator,
-            "navigator_pos": self.navigator,
-            "start_pos": self.navigator,
-            "destination_pos": self.destination,
-            "destination_arrived": destination_arrived
-        }
-        return info
+        if self.scenario_bank is not None:
+            self._load_scenario()
+        else:
+            if self.pending_difficulty is not None:
+                self.active_size, self.active_offset, self.obstacle_density = self.pending_difficulty
+                self.pending_difficulty = None
+            # 初始化开始位置为中心
+            self.navigator = (self.board_size // 2, self.board_size // 2)
+            self.prev_navigator = self.navigator
+            self.start_pos = self.navigator
+
+            # 新棋盘还没有连通区域，第一个终点在整个出题区域中采样
+            self.reachable_cells = None
+            self.destination = self._generate_destination()
+            self.occupancy = self._generate_solvable_obstacles()
+            self.legal_moves = legal_move_table(self.occupancy)
+            self.distance_fields.set_obstacles(self.occupancy)
+            self.distance = self.calculate_distance()
+
+        state = self.state
+        state.navigator = state.prev_navigator = state.start = state.index(self.navigator)
+        state.destination = state.index(self.destination)
+        state.done = False
+        state.destination_arrived = (self.navigator == self.destination)
+        return state
 
     def step(self, step_action):
+        # 兼容接口：返回 (done, info)
+        state = self.step_fast(step_action)
+        return state.done, state.info()
+
+    def step_fast(self, step_action):
+        """
+        与 step() 相同，但返回预分配的 StepState（下一次调用时会被覆盖），不构造 info 字典。
+        StepState 中的终点和起点是这一步之前的值；到达终点后 self.destination / self.start_pos 已经换成新的。
+        """
         self.direction = step_action
 
         # 移动 Navigator 位置
@@ -97,7 +157,7 @@ class NavigateGame:
                 or row >= self.board_size
                 or col < 0
                 or col >= self.board_size
-                or (row, col) in self.obstacles
+                or self.occupancy[row, col] == 1
         )
 
         # 检查是否到达终点
@@ -105,205 +165,200 @@ class NavigateGame:
             destination_arrived = True
             self.score += 10
             if not self.silent_mode:
-                self.sound_eat.play()
+                self.display.play(self.display.sound_eat)
         else:
             destination_arrived = False
 
         self.navigator = (row, col)
         if done:
             if not self.silent_mode:
-                self.sound_game_over.play()
-
-        info = {
-            "prev_navigator_pos": self.prev_navigator,
-            "navigator_pos": self.navigator,
-            "start_pos": self.start_pos,
-            "destination_pos": self.destination,
-            "destination_arrived": destination_arrived
-        }
+                self.display.play(self.display.sound_game_over)
+
+        state = self.state
+        if state.destination_arrived:
+            # 上一步到达终点后换了新的起点和终点，到这一步才写入，上一步返回的记录仍是到达前的值
+            state.start = state.index(self.start_pos)
+            state.destination = state.index(self.destination)
+        state.prev_navigator = state.navigator
+        state.navigator = (row + 1) * state.stride + col + 1
+        state.done = done
+        state.destination_arrived = destination_arrived
         if destination_arrived:
+            # 新的一段路程从当前到达的位置开始，并切换到新终点的距离场
+            self.start_pos = self.navigator
             self.destination = self._generate_destination()
+            self.distance = self.calculate_distance()
             # self.obstacles = self._generate_obstacles()
             # done = destination_arrived
             # if self.score >= 100:
             #     done = True
 
-        return done, info
+        return state
+
+    def _load_scenario(self):
+        if self.scenario_order == "sequential":
+            index = self.scenario_bank.next_index()
+        else:
+            index = self.rng.integer(len(self.scenario_bank))
+        self.occupancy, self.start_pos, self.destination, distance = self.scenario_bank.scenario(index)
+        self.navigator = self.start_pos
+        self.prev_navigator = self.navigator
+        self.legal_moves = legal_move_table(self.occupancy)
+        self.distance_fields.set_obstacles(self.occupancy)
+        self.distance_fields.put(self.destination, distance)
+        self.distance = distance
+        if self.solvability != "off" and distance[self.navigator] < UNREACHABLE:
+            # 起点能到达终点时，起点所在的连通区域就是距离场中可达的格子，不需要再标记一遍
+            self.reachable_cells = np.flatnonzero(distance.ravel() < UNREACHABLE)
+        else:
+            self._update_reachable_cells()
 
     def _generate_destination(self) -> tuple:
-        row = random.randint(0, self.board_size - 1)
-        col = random.randint(0, self.board_size - 1)
-        while (row, col) == self.navigator:
-            row = random.randint(0, self.board_size - 1)
-            col = random.randint(0, self.board_size - 1)
-        return row, col
+        if self.reachable_cells is not None and len(self.reachable_cells) > 1:
+            # 只在 Navigator 能走到的格子中采样，新终点不会落在障碍物上或被围住的区域里
+            navigator = self.navigator[0] * self.board_size + self.navigator[1]
+            return divmod(self.rng.cell(self.reachable_cells, navigator), self.board_size)
+        # 在出题区域的局部坐标中采样（默认区域就是整个棋盘）
+        offset = self.active_offset
+        row, col = self.rng.destination(self.active_size, (self.navigator[0] - offset, self.navigator[1] - offset))
+        return row + offset, col + offset
 
     def _generate_obstacles(self, obstacle_count=None):
         """
-        随机在游戏板上生成障碍物。
+        随机在游戏板上生成障碍物，返回 uint8 占用网格。
         可以通过 obstacle_count 参数指定障碍物的数量，
-        如果没有指定，障碍物数量默认为板大小的 1/7。
+        如果没有指定，障碍物数量由难度决定，默认为板大小的 1/7。
         """
-        obstacles = set()
+        size, offset = self.active_size, self.active_offset
+        # 出题区域以外都是障碍物
+        occupancy = np.ones((self.board_size, self.board_size), dtype=np.uint8)
+        occupancy[offset:offset + size, offset:offset + size] = 0
         if obstacle_count is None:
-            obstacle_count = self.board_size * self.board_size // 7  # 默认障碍物数量
+            obstacle_count = obstacle_count_for(size, self.obstacle_density)  # 默认障碍物数量
 
-        while len(obstacles) < obstacle_count:
-            row = random.randint(0, self.board_size - 1)
-            col = random.randint(0, self.board_size - 1)
-            pos = (row, col)
-            if pos not in obstacles and pos != self.navigator and pos != self.destination:
-                obstacles.add(pos)
-        return obstacles
+        # 从除起点和终点外的空格子中不放回地抽样，不会因为重复抽中而重试，密度再高也不会变慢
+        navigator = (self.navigator[0] - offset) * size + self.navigator[1] - offset
+        destination = (self.destination[0] - offset) * size + self.destination[1] - offset
+        cells = self.rng.obstacle_cells(size * size, (navigator, destination), obstacle_count)
+        rows, cols = np.divmod(cells, size)
+        occupancy[rows + offset, cols + offset] = 1
+        return occupancy
+
+    def _generate_solvable_obstacles(self):
+        """
+        生成障碍物，并按 self.solvability 保证 Navigator 和终点连通，同时记下 Navigator 所在的连通区域。
+        """
+        occupancy, labels = generate_solvable(self._generate_obstacles, [self.navigator], [self.destination],
+                                              self.solvability, self.generation_stats)
+        if labels is not None:
+            self.reachable_cells = component_cells(labels, self.navigator)
+        return occupancy
+
+    def _update_reachable_cells(self):
+        # 场景库和动态障碍物改变了棋盘，重新标记 Navigator 所在的连通区域
+        if self.solvability != "off":
+            self.reachable_cells = component_cells(label_components(self.occupancy), self.navigator)
+
+    @property
+    def obstacles(self):
+        # 兼容旧接口：由占用网格导出的障碍物坐标集合，热路径请直接使用 occupancy
+        return set(map(tuple, np.argwhere(self.occupancy).tolist()))
+
+    def is_blocked(self, row, col):
+        return not (0 <= row < self.board_size and 0 <= col < self.board_size) or self.occupancy[row, col] == 1
+
+    def add_obstacle(self, pos):
+        # 动态障碍物：距离场与 occupancy 共用同一块内存，增量更新距离场即可
+        pos = tuple(pos)
+        self.distance_fields.add_obstacle(pos)
+        if pos == self.destination:
+            # 以终点为键的距离场已从缓存中丢弃，重新取一份
+            self.distance = self.calculate_distance()
+        update_legal_moves(self.legal_moves, self.occupancy, pos)
+        self._update_reachable_cells()
+        self._obstacles_changed()
+
+    def remove_obstacle(self, pos):
+        pos = tuple(pos)
+        self.distance_fields.remove_obstacle(pos)
+        if pos == self.destination:
+            self.distance = self.calculate_distance()
+        update_legal_moves(self.legal_moves, self.occupancy, pos)
+        self._update_reachable_cells()
+        self._obstacles_changed()
+
+    def _obstacles_changed(self):
+        if self.renderer is not None:
+            self.renderer.invalidate()
+        for listener in self.obstacle_listeners:
+            listener()
+
+    def counters(self, reset=False):
+        # 每次未命中都做一次 BFS（场景库预先算好的距离场不算）
+        cache = self.distance_fields
+        counters = {"resets": self.resets, "bfs_calls": cache.misses, "distance_cache_hits": cache.hits,
+                    "distance_cache_misses": cache.misses, "distance_incremental_updates": cache.incremental_updates}
+        if reset:
+            self.resets = 0
+            cache.reset_stats()
+        return counters
 
     def calculate_distance(self):
-        distance = [[int(1e9) for _ in range(self.board_size)] for _ in range(self.board_size)]
-        q = list()
-        q.append(self.destination)
-        distance[self.destination[0]][self.destination[1]] = 0
-        while len(q) > 0:
-            current_node = q.pop(0)
-            for d in range(1,5):
-                nx = current_node[0] + self.next_col[d]
-                ny = current_node[1] + self.next_row[d]
-                if not (0 <= nx < self.board_size and 0 <= ny < self.board_size):
-                    continue
-                if (nx, ny) in self.obstacles:
-                    continue
-                if distance[nx][ny] > distance[current_node[0]][current_node[1]] + 1:
-                    distance[nx][ny] = distance[current_node[0]][current_node[1]] + 1
-                    q.append((nx, ny))
-        return distance
-
-    def draw_score(self):
-        score_text = self.font.render(f"Score: {self.score}", True, (255, 255, 255))
-        self.screen.blit(score_text, (self.border_size, self.height + 2 * self.border_size))
+        # 距离场按终点缓存，同一终点不会重复计算
+        return self.distance_fields.get(self.destination)
 
-    def draw_welcome_screen(self):
-        title_text = self.font.render("NAVIGATE GAME", True, (255, 255, 255))
-        start_button_text = "START"
+    @property
+    def display(self):
+        if self._display is None:
+            from navigate_display import NavigateDisplay
 
-        self.screen.fill((0, 0, 0))
-        self.screen.blit(title_text, (self.display_width // 2 - title_text.get_width() // 2, self.display_height // 4))
-        self.draw_button_text(start_button_text, (self.display_width // 2, self.display_height // 2))
-        pygame.display.flip()
+            self._display = NavigateDisplay(self, headless=self.silent_mode)
+        return self._display
 
-    def draw_game_over_screen(self):
-        game_over_text = self.font.render("GAME OVER", True, (255, 255, 255))
-        final_score_text = self.font.render(f"SCORE: {self.score}", True, (255, 255, 255))
-        retry_button_text = "RETRY"
-
-        self.screen.fill((0, 0, 0))
-        self.screen.blit(game_over_text,
-                         (self.display_width // 2 - game_over_text.get_width() // 2, self.display_height // 4))
-        self.screen.blit(final_score_text, (self.display_width // 2 - final_score_text.get_width() // 2,
-                                            self.display_height // 4 + final_score_text.get_height() + 10))
-        self.draw_button_text(retry_button_text, (self.display_width // 2, self.display_height // 2))
-        pygame.display.flip()
+    @property
+    def renderer(self):
+        return self._display.renderer if self._display is not None else None
 
-    def draw_button_text(self, button_text_str, pos, hover_color=(255, 255, 255), normal_color=(100, 100, 100)):
-        mouse_pos = pygame.mouse.get_pos()
-        button_text = self.font.render(button_text_str, True, normal_color)
-        text_rect = button_text.get_rect(center=pos)
+    @property
+    def screen(self):
+        return self.display.screen
 
-        if text_rect.collidepoint(mouse_pos):
-            colored_text = self.font.render(button_text_str, True, hover_color)
-        else:
-            colored_text = self.font.render(button_text_str, True, normal_color)
+    @property
+    def font(self):
+        return self.display.font
 
-        self.screen.blit(colored_text, text_rect)
+    def draw_welcome_screen(self):
+        self.display.draw_welcome_screen()
+
+    def draw_game_over_screen(self):
+        self.display.draw_game_over_screen()
+
+    def draw_button_text(self, button_text_str, pos, hover_color=(255, 255, 255), normal_color=(100, 100, 100)):
+        self.display.draw_button_text(button_text_str, pos, hover_color, normal_color)
 
     def draw_countdown(self, number):
-        countdown_text = self.font.render(str(number), True, (255, 255, 255))
-        self.screen.blit(countdown_text, (self.display_width // 2 - countdown_text.get_width() // 2,
-                                          self.display_height // 2 - countdown_text.get_height() // 2))
-        pygame.display.flip()
+        self.display.draw_countdown(number)
 
     def is_mouse_on_button(self, button_text):
-        mouse_pos = pygame.mouse.get_pos()
-        text_rect = button_text.get_rect(
-            center=(
-                self.display_width // 2,
-                self.display_height // 2,
-            )
-        )
-        return text_rect.collidepoint(mouse_pos)
+        return self.display.is_mouse_on_button(button_text)
 
     def render(self):
-        self.screen.fill((0, 0, 0))
-
-        # Draw border
-        pygame.draw.rect(self.screen, (255, 255, 255),
-                         (self.border_size - 2, self.border_size - 2, self.width + 4, self.height + 4), 2)
-
-        # Draw navigator
-        self.draw_navigator()
-
-        # Draw obstacles
-        for row, col in self.obstacles:
-            pygame.draw.rect(self.screen, (50, 50, 50), (
-                col * self.cell_size + self.border_size, row * self.cell_size + self.border_size, self.cell_size,
-                self.cell_size))
-
-        # Draw destination
-        r, c = self.destination
-        pygame.draw.rect(self.screen, (255, 0, 0), (
-            c * self.cell_size + self.border_size, r * self.cell_size + self.border_size, self.cell_size,
-            self.cell_size))
-
-        # Draw score
-        self.draw_score()
-
-        pygame.display.flip()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-
-    def draw_navigator(self):
-
-        r, c = self.navigator
-        x = c * self.cell_size + self.border_size
-        y = r * self.cell_size + self.border_size
-
-        # 定义颜色
-        body_color = (0, 100, 200)  # 更深的蓝色用于身体
-        eye_color = (255, 255, 255)  # 白色用于眼睛
-        pupil_color = (0, 0, 0)  # 黑色用于瞳孔
-
-        # 绘制 Navigator 的身体（圆形）
-        pygame.draw.circle(self.screen, body_color, (x + self.cell_size // 2, y + self.cell_size // 2),
-                           self.cell_size // 2)
-
-        # 绘制眼睛（较大的圆形）
-        eye_radius = self.cell_size // 5
-        left_eye_center = (x + self.cell_size // 3, y + self.cell_size // 3)
-        right_eye_center = (x + 2 * self.cell_size // 3, y + self.cell_size // 3)
-
-        pygame.draw.circle(self.screen, eye_color, left_eye_center, eye_radius)
-        pygame.draw.circle(self.screen, eye_color, right_eye_center, eye_radius)
-
-        # 绘制瞳孔（较小的圆形）
-        pupil_radius = self.cell_size // 10
-        pygame.draw.circle(self.screen, pupil_color, left_eye_center, pupil_radius)
-        pygame.draw.circle(self.screen, pupil_color, right_eye_center, pupil_radius)
-
-        # 绘制嘴巴（一个简单的线或者笑脸）
-        mouth_start = (x + self.cell_size // 3, y + 2 * self.cell_size // 3)
-        mouth_end = (x + 2 * self.cell_size // 3, y + 2 * self.cell_size // 3)
-        pygame.draw.line(self.screen, pupil_color, mouth_start, mouth_end, 2)  # 使用线条绘制简单嘴巴
+        """
+        有窗口时绘制到屏幕并处理退出事件；静默模式下在离屏 Surface 上绘制，返回 (H, W, 3) 的 uint8 画面。
+        """
+        return self.display.render()
 
 
 if __name__ == "__main__":
+    import os
+    import sys
     import time
 
+    os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+    import pygame
+
     seed = random.randint(0, 1e9)
     game = NavigateGame(seed=seed, silent_mode=False)
-    pygame.init()
-    game.screen = pygame.display.set_mode((game.display_width, game.display_height))
-    pygame.display.set_caption("Navigate Game")
-    game.font = pygame.font.Font(None, 36)
 
     game_state = "welcome"
 
@@ -341,7 +396,7 @@ if __name__ == "__main__":
                     for i in range(3, 0, -1):
                         game.screen.fill((0, 0, 0))
                         game.draw_countdown(i)
-                        game.sound_eat.play()
+                        game.display.play(game.display.sound_eat)
                         pygame.time.wait(1000)
                     action = 0  # Reset action variable when starting a new game
                     game_state = "running"
@@ -351,7 +406,7 @@ if __name__ == "__main__":
                     for i in range(3, 0, -1):
                         game.screen.fill((0, 0, 0))
                         game.draw_countdown(i)
-                        game.sound_eat.play()
+                        game.display.play(game.display.sound_eat)
                         pygame.time.wait(1000)
                     game.reset()
                     action = 0  # Reset action variable when starting a new game
@@ -1,4 +1,3 @@
-import math
 import random
 import time
 
@@ -6,12 +5,15 @@ import gymnasium as gym
 import numpy as np
 
 from src.navigate_game import NavigateGame
+from reward import RewardFunction
+from step_state import LazyInfo
 
 
 class NavigateEnv(gym.Env):
-    def __init__(self, seed=0, board_size=12, silent_mode=True, limit_step=True):
+    def __init__(self, seed=0, board_size=12, silent_mode=True, limit_step=True, scenario_bank=None, reward_fn=None):
         super().__init__()
-        self.game = NavigateGame(seed=seed, board_size=board_size, silent_mode=silent_mode)
+        self.game = NavigateGame(seed=seed, board_size=board_size, silent_mode=silent_mode,
+                                 scenario_bank=scenario_bank)
         self.game.reset()
 
         self.action_space = gym.spaces.Discrete(4)  # 0: UP, 1: DOWN, 2: LEFT, 3: RIGHT
@@ -28,13 +30,33 @@ class NavigateEnv(gym.Env):
         self.path = None
         self.total_reward = 0
         self.already_achieve = 1
+        # 奖励项和权重见 reward.RewardFunction
+        self.reward_fn = reward_fn or RewardFunction()
 
     def seed(self, sed):
         self.game.seed(sed)
         # self.game.seed(random.randint(0, 1e9))
 
+    def set_difficulty(self, board_size=None, density=None):
+        # 课程学习调整难度，下一个回合生效；向量环境中用 env_method("set_difficulty", ...) 调用
+        self.game.set_difficulty(board_size, density)
+
+    def generation_stats(self, reset=False):
+        # 棋盘生成的统计（connectivity.GenerationStats），向量环境中用 env_method("generation_stats", True) 汇总
+        stats = self.game.generation_stats.as_dict()
+        if reset:
+            self.game.generation_stats.reset()
+        return stats
+
+    def counters(self, reset=False):
+        # reset 次数、BFS 次数和距离场缓存命中情况（NavigateGame.counters），用 env_method("counters", True) 汇总
+        return self.game.counters(reset)
+
     def reset(self, seed=None, options=None):
-        info = self.game.reset()
+        if seed is not None:
+            # gymnasium 约定：传入 seed 时重新设定这个环境自己的随机数流
+            self.game.seed(seed)
+        info = LazyInfo(self.game.reset_fast().pack())
 
         self.done = False
         self.over_time = False
@@ -48,39 +70,40 @@ class NavigateEnv(gym.Env):
         return obs, info
 
     def step(self, action):
-        self.done, info = self.game.step(action + 1)
+        # info 只在被读取时才展开成字典
+        state = self.game.step_fast(action + 1)
+        self.done = state.done
+        info = LazyInfo(state.pack())
         obs = self._generate_observation()
 
         if self.done:
-            reward = -4
+            reward = self.reward_fn.collision
             return obs, reward, self.done, self.over_time, info
 
-        navigator = info["navigator_pos"]
-        prev_navigator = info["prev_navigator_pos"]
-        start_pos = info["start_pos"]
-        destination = info["destination_pos"]
-        reward = 0
         self.total_step += 1
-
         if self.total_step > self.step_limit :
             self.over_time = True
-            return obs, reward, self.done, self.over_time, info
-
-        distance_no_obstacles = abs(destination[0] - navigator[0]) + abs(destination[1] - navigator[1])
-        prev_distance_no_obstacles = abs(destination[0] - prev_navigator[0]) + abs(destination[1] - prev_navigator[1])
-        distance_obstacles = self.game.distance[navigator[0]][navigator[1]]
-        prev_distance_obstacles = self.game.distance[prev_navigator[0]][prev_navigator[1]]
-        start_distance_obstacles = self.game.distance[start_pos[0]][start_pos[1]]
+            return obs, self.reward_fn.timeout, self.done, self.over_time, info
 
-        reward_optimal = distance_obstacles - prev_distance_obstacles
-        reward_dis = math.exp(-(distance_obstacles / start_distance_obstacles))
-        reward_dis_no_obstacles = distance_no_obstacles - prev_distance_no_obstacles
-
-        if navigator == destination:
+        if state.destination_arrived:
             self.already_achieve += 1
-            reward += 10 ** self.already_achieve ** 0.5
+            reward = self.reward_fn.single(False, False, True, self.already_achieve, 0, 0, 1, 0, 0)
         else:
-            reward = 0.8 * reward_optimal + 0.1 * reward_dis + 0.1 * reward_dis_no_obstacles
+            # 到达终点时 game 已切换到新终点的距离场，所以只在未到达时计算距离奖励；
+            # 未到达时游戏的起点和终点与这一步的 info 相同
+            navigator = self.game.navigator
+            prev_navigator = self.game.prev_navigator
+            start_pos = self.game.start_pos
+            destination = self.game.destination
+            distance = self.game.distance
+            reward = self.reward_fn.single(
+                False, False, False, self.already_achieve,
+                distance[navigator[0]][navigator[1]],
+                distance[prev_navigator[0]][prev_navigator[1]],
+                distance[start_pos[0]][start_pos[1]],
+                abs(destination[0] - navigator[0]) + abs(destination[1] - navigator[1]),
+                abs(destination[0] - prev_navigator[0]) + abs(destination[1] - prev_navigator[1]),
+            )
 
         if not self.game.silent_mode:
             self.game.render()
@@ -88,9 +111,13 @@ class NavigateEnv(gym.Env):
         return obs, reward, self.done, self.over_time, info
 
     def render(self):
-        self.game.render()
+        return self.game.render()
 
     def get_action_mask(self) -> np.ndarray:
+        # 直接取预计算的合法动作表中的一行，形状 (1, 4)，调用方不应原地修改
+        row, col = self.game.navigator
+        if 0 <= row < self.board_size and 0 <= col < self.board_size:
+            return self.game.legal_moves[row, col][None]
         return np.array([[self._check_action_validity(a) for a in range(self.action_space.n)]])
 
     # Check if the action is against the current direction of the navigator or is ending the game.
@@ -104,7 +131,7 @@ class NavigateEnv(gym.Env):
                 or row >= self.board_size
                 or col < 0
                 or col >= self.board_size
-                or (row, col) in self.game.obstacles
+                or self.game.occupancy[row, col] == 1
         )
 
         # return True
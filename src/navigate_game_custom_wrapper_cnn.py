@@ -1,29 +1,34 @@
 import numpy as np
 import gymnasium
 from navigate_game_custom_wrapper import NavigateEnv
+from observation_renderer import CnnObservationRenderer, WindowObservationRenderer
 
 
 class NavigateEnvCnn(NavigateEnv):
-    def __init__(self, seed, limit_step=False, silent_mode=True):
-        super().__init__(seed=seed, limit_step=limit_step, silent_mode=silent_mode)
+    def __init__(self, seed, limit_step=False, silent_mode=True, scenario_bank=None, board_size=12,
+                 observation="full", view_size=12, reward_fn=None):
+        super().__init__(seed=seed, board_size=board_size, limit_step=limit_step, silent_mode=silent_mode,
+                         scenario_bank=scenario_bank, reward_fn=reward_fn)
+        # Navigator green, obstacles red, destination blue, enlarged 3x (36x36 on the default 12x12 board).
+        # "crop" / "downsample" render a view_size x view_size window instead of the full board.
+        if observation == "full":
+            self.renderer = CnnObservationRenderer(self.game.board_size, scale=3)
+        else:
+            self.renderer = WindowObservationRenderer(self.game.board_size, view_size, observation, scale=3)
+        # Rebuild the cached obstacle background after add_obstacle / remove_obstacle.
+        self.game.obstacle_listeners.append(self.renderer.invalidate)
         self.observation_space = gymnasium.spaces.Box(
             low=0, high=255,
-            shape=(36, 36, 3),
+            shape=self.renderer.buffer.shape,
             dtype=np.uint8
         )
 
+    def step(self, action):
+        obs, reward, done, over_time, info = super().step(action)
+        if done or over_time:
+            # The renderer buffer is rewritten in place by the next reset, so keep a copy of the terminal observation.
+            obs = obs.copy()
+        return obs, reward, done, over_time, info
+
     def _generate_observation(self):
-        obs = np.zeros((self.game.board_size, self.game.board_size), dtype=np.uint8)
-        # Stack single layer into 3-channel-image.
-        obs = np.stack((obs, obs, obs), axis=-1)
-        # Set the snake head to green and the tail to blue
-        if (0 <= self.game.navigator[0] < 12 and
-            0 <= self.game.navigator[1] < 12):
-            obs[self.game.navigator] = [0, 255, 0]
-        for obstacle in self.game.obstacles:
-            obs[obstacle] = [255, 0, 0]
-        # Set the food to red
-        obs[self.game.destination] = [0, 0, 255]
-        # Enlarge the observation to 84x84
-        obs = np.repeat(np.repeat(obs, 3, axis=0), 3, axis=1)
-        return obs
+        return self.renderer.render(self.game.occupancy, self.game.navigator, self.game.destination)
@@ -0,0 +1,53 @@
+import numpy as np
+import gymnasium
+from navigate_game_custom_wrapper import NavigateEnv
+from observation_renderer import EgocentricObservation
+
+
+class NavigateEnvEgo(NavigateEnv):
+    def __init__(self, seed, limit_step=False, silent_mode=True, scenario_bank=None, board_size=12,
+                 view_size=13, frames=4, distance=True, reward_fn=None):
+        # 以 Navigator 为中心的局部窗口 + 距离场通道 + 最近 frames 帧，见 EgocentricObservation
+        self.pipeline = EgocentricObservation(1, board_size, view_size, frames, distance)
+        self.occupancy = None
+        self.distance = None
+        self.fill_history = True
+        super().__init__(seed=seed, board_size=board_size, limit_step=limit_step, silent_mode=silent_mode,
+                         scenario_bank=scenario_bank, reward_fn=reward_fn)
+        self.observation_space = gymnasium.spaces.Box(
+            low=0, high=255,
+            shape=self.pipeline.shape,
+            dtype=np.uint8
+        )
+        # add_obstacle / remove_obstacle 原地修改 occupancy 和距离场，对象不变，需要通知这里重新读取
+        self.game.obstacle_listeners.append(self.invalidate)
+
+    def reset(self, seed=None, options=None):
+        # 新回合的第一帧填满全部历史
+        self.fill_history = True
+        return super().reset(seed=seed, options=options)
+
+    def step(self, action):
+        obs, reward, done, over_time, info = super().step(action)
+        if done or over_time:
+            # 帧缓冲区会被下一次 reset 原地改写，终止观测需要复制一份
+            obs = obs.copy()
+        return obs, reward, done, over_time, info
+
+    def invalidate(self):
+        # 障碍物被原地修改（add_obstacle / remove_obstacle）后由 game.obstacle_listeners 调用
+        self.occupancy = None
+
+    def _generate_observation(self):
+        game = self.game
+        if game.occupancy is not self.occupancy or game.distance is not self.distance:
+            # 新的棋盘或到达终点后换了距离场
+            self.occupancy = game.occupancy
+            self.distance = game.distance
+            self.pipeline.set_boards(0, game.occupancy, game.distance)
+        navigator = (game.navigator,)
+        destination = (game.destination,)
+        if self.fill_history:
+            self.fill_history = False
+            return self.pipeline.restart([0], navigator, destination)[0]
+        return self.pipeline.observe(navigator, destination)[0]
@@ -1,23 +1,34 @@
 import numpy as np
 import gymnasium
 from navigate_game_custom_wrapper import NavigateEnv
+from observation_renderer import ObservationWindow
 
 
 class NavigateEnvMlp(NavigateEnv):
-    def __init__(self, seed, limit_step=False, silent_mode=True):
-        super().__init__(seed=seed, limit_step=limit_step, silent_mode=silent_mode)
+    def __init__(self, seed, limit_step=False, silent_mode=True, scenario_bank=None, board_size=12,
+                 observation="full", view_size=12, reward_fn=None):
+        super().__init__(seed=seed, board_size=board_size, limit_step=limit_step, silent_mode=silent_mode,
+                         scenario_bank=scenario_bank, reward_fn=reward_fn)
+        # observation: "full" 整张棋盘；"crop" / "downsample" 见 ObservationWindow，观测大小为 view_size
+        self.window = None if observation == "full" else ObservationWindow(board_size, view_size, observation)
+        if self.window is not None:
+            # add_obstacle / remove_obstacle 原地修改障碍物后重新预处理窗口
+            self.game.obstacle_listeners.append(self.window.invalidate)
+        obs_size = board_size if self.window is None else view_size
         self.observation_space = gymnasium.spaces.Box(
-            low=-1, high=1,
-            shape=(self.game.board_size, self.game.board_size),
+            low=-1, high=100,
+            shape=(obs_size, obs_size),
             dtype=np.float32
-        )  # 0: empty,  1: navigator, -1: destination
+        )  # 0: empty,  1: navigator, -1: obstacle, 100: destination
 
     def _generate_observation(self):
+        if self.window is not None:
+            return self.window.mlp_observation(self.game.occupancy, self.game.navigator, self.game.destination)
+
         obs = np.zeros((self.game.board_size, self.game.board_size), dtype=np.float32)
-        if (0 <= self.game.navigator[0] < 12 and
-            0 <= self.game.navigator[1] < 12):
+        if (0 <= self.game.navigator[0] < self.game.board_size and
+            0 <= self.game.navigator[1] < self.game.board_size):
             obs[tuple(self.game.navigator)] = 1.0
         obs[tuple(self.game.destination)] = 100
-        for obstacle in self.game.obstacles:
-            obs[tuple(obstacle)] = -1.0
+        obs[self.game.occupancy.view(bool)] = -1.0
         return obs
@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
+import pygame
+
+BACKGROUND_COLOR = (0, 0, 0)
+BORDER_COLOR = (255, 255, 255)
+OBSTACLE_COLOR = (50, 50, 50)
+DESTINATION_COLOR = (255, 0, 0)
+SCORE_COLOR = (255, 255, 255)
+
+
+class NavigateRenderer:
+    """
+    NavigateGame 的 pygame 渲染器。
+    边框和障碍物每个回合只画一次到缓存的静态棋盘 Surface 上，Navigator 和分数文字也预先渲染好，
+    之后每一帧只需要把上一帧画过的区域从静态棋盘上恢复，再贴上新的 Navigator、终点和分数。
+
+    headless=True 时使用 SDL 的 dummy 视频驱动，不需要显示器。离屏 Surface 直接建在一块 (H, W, 3) 的
+    NumPy 缓冲区上，绘制即写入缓冲区，frame() 不需要任何拷贝，可用于录制评估视频。
+    """
+
+    def __init__(self, game, headless=False):
+        self.game = game
+        self.headless = headless
+        self.cell_size = game.cell_size
+        self.border_size = game.border_size
+        self.size = (game.display_width, game.display_height)
+
+        if headless:
+            # 必须在初始化 display 之前设置
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            pygame.font.init()
+            self.frame_buffer = np.zeros((self.size[1], self.size[0], 3), dtype=np.uint8)
+            self.screen = pygame.image.frombuffer(self.frame_buffer, self.size, "RGB")
+        else:
+            pygame.init()
+            pygame.display.set_caption("Navigate Game")
+            self.screen = pygame.display.set_mode(self.size)
+            self.frame_buffer = None
+        self.font = pygame.font.Font(None, 36)
+
+        # 与 screen 相同的像素格式，恢复脏区域时不需要格式转换
+        self.board = pygame.Surface(self.size, 0, self.screen)
+        self.navigator_sprite = self._render_navigator_sprite()
+        # 分数 -> 预渲染的文字 Surface
+        self.score_glyphs = {}
+        self.score_pos = (self.border_size, game.height + 2 * self.border_size)
+
+        self.board_occupancy = None
+        self.dirty_rects = []
+
+    def invalidate(self):
+        # 障碍物被原地修改（如 add_obstacle）后调用，下一帧重建静态棋盘
+        self.board_occupancy = None
+
+    def cell_rect(self, pos):
+        row, col = pos
+        return pygame.Rect(col * self.cell_size + self.border_size, row * self.cell_size + self.border_size,
+                           self.cell_size, self.cell_size)
+
+    def render(self):
+        game = self.game
+        if game.occupancy is not self.board_occupancy:
+            # reset() 会生成新的 occupancy 数组，以对象身份判断是否进入了新回合
+            self._render_board(game.occupancy)
+            self.screen.blit(self.board, (0, 0))
+            previous = None
+        else:
+            previous = self.dirty_rects
+            for rect in previous:
+                self.screen.blit(self.board, rect, rect)
+
+        rects = []
+        row, col = game.navigator
+        # 撞上障碍物时与原来的绘制顺序一致，Navigator 被障碍物盖住
+        if not (0 <= row < game.board_size and 0 <= col < game.board_size and game.occupancy[row, col]):
+            rect = self.cell_rect(game.navigator)
+            self.screen.blit(self.navigator_sprite, rect)
+            rects.append(rect)
+
+        rect = self.cell_rect(game.destination)
+        self.screen.fill(DESTINATION_COLOR, rect)
+        rects.append(rect)
+
+        glyph = self.score_glyphs.get(game.score)
+        if glyph is None:
+            glyph = self.score_glyphs[game.score] = self.font.render(f"Score: {game.score}", True, SCORE_COLOR)
+        rects.append(self.screen.blit(glyph, self.score_pos))
+
+        self.dirty_rects = rects
+        if not self.headless:
+            if previous is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(previous + rects)
+
+    def frame(self):
+        """
+        返回当前画面 (H, W, 3) 的 uint8 数组。headless 模式下直接返回离屏 Surface 底层的缓冲区，
+        下一次 render() 会原地改写它，需要保留时请自行 copy()。
+        """
+        if self.frame_buffer is None:
+            return pygame.surfarray.array3d(self.screen).transpose(1, 0, 2)
+        return self.frame_buffer
+
+    def _render_board(self, occupancy):
+        self.board.fill(BACKGROUND_COLOR)
+        pygame.draw.rect(self.board, BORDER_COLOR,
+                         (self.border_size - 2, self.border_size - 2, self.game.width + 4, self.game.height + 4), 2)
+        for row, col in np.argwhere(occupancy).tolist():
+            self.board.fill(OBSTACLE_COLOR, self.cell_rect((row, col)))
+        self.board_occupancy = occupancy
+
+    def _render_navigator_sprite(self):
+        size = self.cell_size
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+
+        # 定义颜色
+        body_color = (0, 100, 200)  # 更深的蓝色用于身体
+        eye_color = (255, 255, 255)  # 白色用于眼睛
+        pupil_color = (0, 0, 0)  # 黑色用于瞳孔
+
+        # 绘制 Navigator 的身体（圆形）
+        pygame.draw.circle(sprite, body_color, (size // 2, size // 2), size // 2)
+
+        # 绘制眼睛（较大的圆形）和瞳孔（较小的圆形）
+        left_eye_center = (size // 3, size // 3)
+        right_eye_center = (2 * size // 3, size // 3)
+        for center in (left_eye_center, right_eye_center):
+            pygame.draw.circle(sprite, eye_color, center, size // 5)
+            pygame.draw.circle(sprite, pupil_color, center, size // 10)
+
+        # 绘制嘴巴（一个简单的线）
+        pygame.draw.line(sprite, pupil_color, (size // 3, 2 * size // 3), (2 * size // 3, 2 * size // 3), 2)
+        return sprite
@@ -0,0 +1,209 @@
+import gymnasium
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv
+
+from batched_navigate_game import BatchedNavigateGame
+from observation_renderer import EgocentricObservation, ObservationWindow, WindowObservationRenderer
+from reward import RewardFunction, failure_causes
+
+
+class NavigateVecEnv(VecEnv):
+    """
+    基于 BatchedNavigateGame 的 SB3 VecEnv，奖励与观测和 NavigateEnvMlp / NavigateEnvCnn 保持一致。
+    结束的环境会自动重置，终止时的观测放在 info["terminal_observation"] 中。
+    """
+
+    def __init__(self, num_envs, policy_type="MlpPolicy", seed=0, board_size=12, step_limit=500, reward_fn=None,
+                 observation="full", view_size=None, frames=4):
+        self.game = BatchedNavigateGame(num_envs, seed=seed, board_size=board_size)
+        # 构造时已经生成过一次棋盘；重新设定随机数流，使第一次 reset() 与用 spawn_seeds(seed, num_envs)
+        # 创建并 seed 过的 NavigateEnv 得到相同的棋盘
+        self.game.seed(seed)
+        self.reward_fn = reward_fn or RewardFunction()
+        self.policy_type = policy_type
+        self.board_size = board_size
+        self.step_limit = step_limit
+        self.render_mode = None
+
+        # observation="ego" 时与 NavigateEnvEgo 相同，所有环境共用一个 EgocentricObservation（view_size 默认 13）；
+        # "crop" / "downsample" 时每个环境一个 ObservationWindow / WindowObservationRenderer（view_size 默认 12），
+        # 与 NavigateEnvMlp / NavigateEnvCnn 的窗口观测相同
+        if observation not in ("full", "crop", "downsample", "ego"):
+            raise ValueError(f"Unknown observation: {observation!r}")
+        self.pipeline = None
+        self.windows = None
+        if observation == "ego":
+            self.pipeline = EgocentricObservation(num_envs, board_size, view_size or 13, frames)
+            observation_space = gymnasium.spaces.Box(low=0, high=255, shape=self.pipeline.shape, dtype=np.uint8)
+        elif observation != "full":
+            view_size = view_size or 12
+            if policy_type == "CnnPolicy":
+                self.windows = [WindowObservationRenderer(board_size, view_size, observation, scale=3)
+                                for _ in range(num_envs)]
+                observation_space = gymnasium.spaces.Box(low=0, high=255, shape=self.windows[0].buffer.shape,
+                                                         dtype=np.uint8)
+            else:
+                self.windows = [ObservationWindow(board_size, view_size, observation) for _ in range(num_envs)]
+                observation_space = gymnasium.spaces.Box(low=-1, high=100, shape=(view_size, view_size),
+                                                         dtype=np.float32)
+            # 窗口按对象身份缓存预处理过的障碍物，每个棋盘固定用同一个视图，重置后再让对应的窗口失效
+            self.board_views = list(self.game.obstacles)
+        elif policy_type == "CnnPolicy":
+            observation_space = gymnasium.spaces.Box(
+                low=0, high=255,
+                shape=(board_size * 3, board_size * 3, 3),
+                dtype=np.uint8
+            )
+        else:
+            observation_space = gymnasium.spaces.Box(
+                low=-1, high=100,
+                shape=(board_size, board_size),
+                dtype=np.float32
+            )
+        super().__init__(num_envs, observation_space, gymnasium.spaces.Discrete(4))
+
+        self.total_step = np.zeros(num_envs, dtype=np.int64)
+        self.already_achieve = np.zeros(num_envs, dtype=np.int64)
+        self.actions = np.zeros(num_envs, dtype=np.int64)
+        # 奖励函数的输入：距离、上一步距离、起点距离、曼哈顿距离、上一步曼哈顿距离
+        self.reward_terms = np.zeros((5, num_envs), dtype=np.float64)
+        self.obs = np.zeros((num_envs,) + observation_space.shape, dtype=observation_space.dtype)
+
+    def reset(self):
+        if self._seeds[0] is not None:
+            # 与 DummyVecEnv 相同：第 i 个环境用 seed + i 重新设定
+            self.game.seed(list(self._seeds))
+        self._reset_seeds()
+        self._reset_options()
+
+        self.game.reset()
+        self.total_step[:] = 0
+        self.already_achieve[:] = 0
+        self._generate_observation(restart=self.game.board_index)
+        return self.obs.copy()
+
+    def step_async(self, actions):
+        self.actions[:] = actions
+
+    def step_wait(self):
+        game = self.game
+        done, destination_arrived = game.step(self.actions + 1)
+
+        alive = ~done
+        self.total_step[alive] += 1
+        over_time = alive & (self.total_step > self.step_limit)
+        arrived = alive & ~over_time & destination_arrived
+        self.already_achieve[arrived] += 1
+
+        # 普通移动的环境才需要查距离场（到达终点时距离场已切换，撞墙时位置在棋盘外）
+        moving = np.flatnonzero(alive & ~over_time & ~destination_arrived)
+        rewards = self.reward_fn.batch_step(game, self.reward_terms, moving, done, over_time, arrived,
+                                            self.already_achieve)
+
+        if self.pipeline is not None and destination_arrived.any():
+            # 到达终点的环境换了距离场
+            arrived_boards = np.flatnonzero(destination_arrived)
+            self.pipeline.set_boards(arrived_boards, game.obstacles[arrived_boards], game.distance[arrived_boards])
+        self._generate_observation()
+
+        infos = [{} for _ in range(self.num_envs)]
+        for i in np.flatnonzero(destination_arrived):
+            infos[i]["destination_arrived"] = True
+
+        finished = done | over_time
+        if finished.any():
+            # 回合结束原因：撞墙、撞障碍物或超时
+            causes = failure_causes(game, finished, over_time)
+            for i, cause in zip(np.flatnonzero(finished), causes):
+                infos[i]["terminal_observation"] = self.obs[i].copy()
+                infos[i]["TimeLimit.truncated"] = bool(over_time[i])
+                infos[i]["score"] = int(game.score[i])
+                infos[i]["failure_cause"] = cause
+            game.reset(finished)
+            self.total_step[finished] = 0
+            self.already_achieve[finished] = 0
+            self._generate_observation(restart=np.flatnonzero(finished))
+
+        return self.obs.copy(), rewards, finished, infos
+
+    def _generate_observation(self, restart=None):
+        # restart 为刚 reset 的环境下标，ego 观测要用新棋盘的第一帧填满它们的历史；其他观测每次都整体重画
+        game = self.game
+        if self.pipeline is not None:
+            if restart is None:
+                self.obs = self.pipeline.observe(game.navigator, game.destination)
+            else:
+                self.pipeline.set_boards(restart, game.obstacles[restart], game.distance[restart])
+                self.obs = self.pipeline.restart(restart, game.navigator[restart], game.destination[restart])
+            return
+        if self.windows is not None:
+            if restart is not None:
+                for i in restart:
+                    self.windows[i].invalidate()
+            navigator, destination = game.navigator.tolist(), game.destination.tolist()
+            for i, window in enumerate(self.windows):
+                if self.policy_type == "CnnPolicy":
+                    self.obs[i] = window.render(self.board_views[i], navigator[i], destination[i])
+                else:
+                    self.obs[i] = window.mlp_observation(self.board_views[i], navigator[i], destination[i])
+            return
+
+        boards = game.board_index
+        navigator = game.navigator
+        inside = ((navigator >= 0) & (navigator < self.board_size)).all(axis=1)
+
+        if self.policy_type == "CnnPolicy":
+            cells = np.zeros((self.num_envs, self.board_size, self.board_size, 3), dtype=np.uint8)
+            cells[boards[inside], navigator[inside, 0], navigator[inside, 1]] = (0, 255, 0)
+            cells[game.obstacles] = (255, 0, 0)
+            cells[boards, game.destination[:, 0], game.destination[:, 1]] = (0, 0, 255)
+            self.obs[:] = np.repeat(np.repeat(cells, 3, axis=1), 3, axis=2)
+        else:
+            obs = self.obs
+            obs[:] = 0
+            obs[boards[inside], navigator[inside, 0], navigator[inside, 1]] = 1.0
+            obs[boards, game.destination[:, 0], game.destination[:, 1]] = 100
+            obs[game.obstacles] = -1.0
+
+    def set_difficulty(self, board_size=None, density=None, indices=None):
+        # 与 NavigateEnv.set_difficulty 相同，各棋盘在下一次 reset 时生效
+        self.game.set_difficulty(board_size, density, boards=self._get_indices(indices))
+
+    def generation_stats(self, reset=False):
+        stats = self.game.generation_stats.as_dict()
+        if reset:
+            self.game.generation_stats.reset()
+        return stats
+
+    def counters(self, reset=False):
+        return self.game.counters(reset)
+
+    def action_masks(self) -> np.ndarray:
+        return self.game.get_action_masks()
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        # MaskablePPO 通过 env_method("action_masks") 获取动作掩码，这里一次性计算全部环境
+        if method_name in ("action_masks", "get_action_mask"):
+            masks = self.action_masks()
+            return [masks[i] for i in self._get_indices(indices)]
+        if method_name == "set_difficulty":
+            self.set_difficulty(*method_args, indices=indices, **method_kwargs)
+            return [None] * len(self._get_indices(indices))
+        if method_name in ("generation_stats", "counters"):
+            # 统计是全部棋盘合计的，只放在第一个位置，汇总时不会重复计算
+            stats = getattr(self, method_name)(*method_args, **method_kwargs)
+            return [stats] + [None] * (len(self._get_indices(indices)) - 1)
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result] * len(self._get_indices(indices))
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False] * len(self._get_indices(indices))
@@ -0,0 +1,293 @@
+import numpy as np
+
+from distance_engine import UNREACHABLE
+
+NAVIGATOR_COLOR = (0, 255, 0)
+OBSTACLE_COLOR = (255, 0, 0)
+DESTINATION_COLOR = (0, 0, 255)
+
+
+class CnnObservationRenderer:
+    """
+    增量渲染 CNN 观测（放大 scale 倍的 RGB 图像）。
+    障碍物作为静态背景每个回合只画一次，之后每一步只重画 Navigator 和终点变化的格子，
+    结果写在预分配的缓冲区里，返回只读视图。
+    """
+
+    def __init__(self, board_size, scale=3):
+        self.board_size = board_size
+        self.scale = scale
+        shape = (board_size * scale, board_size * scale, 3)
+        self.buffer = np.zeros(shape, dtype=np.uint8)
+        self.background = np.zeros(shape, dtype=np.uint8)
+
+        # (row, col, scale, scale, 3) 形式的视图，按格子读写放大后的像素块
+        self.cells = self._cell_view(self.buffer)
+        self.background_cells = self._cell_view(self.background)
+
+        self.view = self.buffer.view()
+        self.view.flags.writeable = False
+
+        self.occupancy = None
+        self.navigator = None
+        self.destination = None
+
+    def _cell_view(self, image):
+        board_size, scale = self.board_size, self.scale
+        return image.reshape(board_size, scale, board_size, scale, 3).transpose(0, 2, 1, 3, 4)
+
+    def invalidate(self):
+        # 障碍物被原地修改后调用，下一次 render 会重建背景
+        self.occupancy = None
+
+    def render(self, occupancy, navigator, destination):
+        if occupancy is not self.occupancy:
+            self._draw_background(occupancy)
+            self._draw_cell(navigator, NAVIGATOR_COLOR)
+            self._draw_cell(destination, DESTINATION_COLOR)
+        else:
+            if navigator != self.navigator or destination != self.destination:
+                # 先恢复上一步的两个格子，再画新的位置（终点覆盖 Navigator，与原实现一致）
+                self._restore_cell(self.navigator)
+                self._restore_cell(self.destination)
+                self._draw_cell(navigator, NAVIGATOR_COLOR)
+                self._draw_cell(destination, DESTINATION_COLOR)
+        self.navigator = navigator
+        self.destination = destination
+        return self.view
+
+    def _draw_background(self, occupancy):
+        self.occupancy = occupancy
+        self.background[:] = 0
+        self.background_cells[occupancy.view(bool)] = OBSTACLE_COLOR
+        self.buffer[:] = self.background
+
+    def _inside(self, pos):
+        return 0 <= pos[0] < self.board_size and 0 <= pos[1] < self.board_size
+
+    def _restore_cell(self, pos):
+        if self._inside(pos):
+            self.cells[pos] = self.background_cells[pos]
+
+    def _draw_cell(self, pos, color):
+        # 障碍物格子上不画 Navigator（撞上障碍物时仍显示为障碍物）
+        if self._inside(pos) and (color == DESTINATION_COLOR or not self.occupancy[pos]):
+            self.cells[pos] = color
+
+
+class ObservationWindow:
+    """
+    大棋盘上不再把整张棋盘作为观测：
+    "crop" 取以 Navigator 为中心的 view_size x view_size 局部窗口，窗口外的区域视为障碍物，
+    终点不在窗口内时夹到窗口边缘，指示终点的方向；
+    "downsample" 把整张棋盘按块求障碍物占比，缩小到 view_size x view_size。
+    每个回合只预处理一次障碍物，之后每一步的开销只与 view_size 有关，与 board_size 无关。
+    """
+
+    MODES = ("crop", "downsample")
+
+    def __init__(self, board_size, view_size, mode="crop"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown observation window mode: {mode}")
+        self.board_size = board_size
+        self.view_size = view_size
+        self.mode = mode
+        self.half = view_size // 2
+        # 撞墙后 Navigator 会在棋盘外一格，多补一圈
+        self.pad = self.half + 1
+        self.block = -(-board_size // view_size)
+
+        self.obstacles = np.zeros((view_size, view_size), dtype=np.float32)
+        self.padded = None
+        self.occupancy = None
+
+    def invalidate(self):
+        self.occupancy = None
+
+    def update(self, occupancy, navigator, destination):
+        """
+        返回 (obstacles, navigator_cell, destination_cell)。obstacles 为 (view_size, view_size) 的 float32，
+        取值 [0, 1]，是内部缓冲区；navigator_cell 在窗口外时为 None。
+        """
+        if occupancy is not self.occupancy:
+            self._prepare(occupancy)
+
+        row, col = navigator
+        if self.mode == "crop":
+            top, left = row - self.half + self.pad, col - self.half + self.pad
+            self.obstacles[:] = self.padded[top:top + self.view_size, left:left + self.view_size]
+            navigator_cell = (self.half, self.half)
+            destination_cell = (min(max(destination[0] - row + self.half, 0), self.view_size - 1),
+                                min(max(destination[1] - col + self.half, 0), self.view_size - 1))
+        else:
+            inside = 0 <= row < self.board_size and 0 <= col < self.board_size
+            navigator_cell = (row // self.block, col // self.block) if inside else None
+            destination_cell = (destination[0] // self.block, destination[1] // self.block)
+        return self.obstacles, navigator_cell, destination_cell
+
+    def mlp_observation(self, occupancy, navigator, destination):
+        # NavigateEnvMlp 的窗口观测：障碍物 -占比，Navigator 1，终点 100（新数组）
+        obstacles, navigator_cell, destination_cell = self.update(occupancy, navigator, destination)
+        obs = -obstacles
+        if navigator_cell is not None:
+            obs[navigator_cell] = 1.0
+        obs[destination_cell] = 100
+        return obs
+
+    def _prepare(self, occupancy):
+        self.occupancy = occupancy
+        if self.mode == "crop":
+            size = self.board_size + 2 * self.pad
+            if self.padded is None:
+                self.padded = np.ones((size, size), dtype=np.uint8)
+            self.padded[self.pad:-self.pad, self.pad:-self.pad] = occupancy
+        else:
+            size = self.block * self.view_size
+            padded = np.zeros((size, size), dtype=np.float32)
+            padded[:self.board_size, :self.board_size] = occupancy
+            self.obstacles[:] = padded.reshape(self.view_size, self.block, self.view_size, self.block).mean(axis=(1, 3))
+
+
+class WindowObservationRenderer:
+    """
+    把 ObservationWindow 的局部窗口或缩小视图渲染成放大 scale 倍的 RGB 图像，
+    障碍物颜色按占比缩放，大小为 (view_size * scale, view_size * scale, 3)，与 board_size 无关。
+    """
+
+    def __init__(self, board_size, view_size, mode="crop", scale=3):
+        self.window = ObservationWindow(board_size, view_size, mode)
+        self.scale = scale
+        self.colors = np.zeros((view_size, view_size, 3), dtype=np.uint8)
+        self.buffer = np.zeros((view_size * scale, view_size * scale, 3), dtype=np.uint8)
+        self.cells = self.buffer.reshape(view_size, scale, view_size, scale, 3).transpose(0, 2, 1, 3, 4)
+        self.obstacle_color = np.array(OBSTACLE_COLOR, dtype=np.float32)
+
+        self.view = self.buffer.view()
+        self.view.flags.writeable = False
+
+    def invalidate(self):
+        self.window.invalidate()
+
+    def render(self, occupancy, navigator, destination):
+        obstacles, navigator_cell, destination_cell = self.window.update(occupancy, navigator, destination)
+        np.multiply(obstacles[..., None], self.obstacle_color, out=self.colors, casting="unsafe")
+        if navigator_cell is not None and obstacles[navigator_cell] < 1:
+            self.colors[navigator_cell] = NAVIGATOR_COLOR
+        self.colors[destination_cell] = DESTINATION_COLOR
+        self.cells[:] = self.colors[:, :, None, None, :]
+        return self.view
+
+
+class EgocentricObservation:
+    """
+    以 Navigator 为中心的 view_size x view_size 局部观测，叠加最近 frames 帧，channel-first 的 uint8，
+    形状为 (frames * channels, view_size, view_size)。每一帧的通道依次是：
+    障碍物（棋盘外也是障碍物，255）、可选的距离场（到终点的步数，254 封顶，不可达和棋盘外为 255）、
+    终点（255，不在窗口内时夹到窗口边缘，指示终点的方向）。Navigator 总在窗口中心，不需要单独的通道。
+
+    可以同时处理一批环境（NavigateVecEnv），单个环境时 num_envs=1。
+    障碍物和距离场每个回合 / 每段路程只补边预处理一次（set_boards），之后每一步只从中切出窗口。
+    帧缓冲区是 (num_envs, 2 * frames, channels, view_size, view_size) 的环形缓冲区，每帧同时写到 slot 和
+    slot + frames 两个位置，[slot + 1, slot + frames] 总是按时间顺序排好的最近 frames 帧，
+    返回的是它的只读视图，不需要拼接，也不需要每一步移动历史帧。
+    """
+
+    def __init__(self, num_envs, board_size, view_size=13, frames=4, distance=True):
+        if view_size % 2 == 0:
+            raise ValueError(f"view_size must be odd so that the navigator is at the centre, got {view_size}")
+        self.num_envs = num_envs
+        self.board_size = board_size
+        self.view_size = view_size
+        self.frames = frames
+        # 预处理的静态平面：障碍物和距离场；终点通道每一步单独画
+        self.static_channels = 2 if distance else 1
+        self.channels = self.static_channels + 1
+        self.shape = (frames * self.channels, view_size, view_size)
+        if self.shape[0] > view_size:
+            # SB3 把最小的维度当作图像的通道，通道数大于窗口大小时会被误认为 channel-last 而转置
+            raise ValueError(f"frames * channels ({self.shape[0]}) must not exceed view_size ({view_size})")
+
+        self.half = view_size // 2
+        # 撞墙后 Navigator 会在棋盘外一格，多补一圈
+        self.pad = self.half + 1
+        size = board_size + 2 * self.pad
+        self.planes = np.full((num_envs, self.static_channels, size, size), 255, dtype=np.uint8)
+        self.inner = self.planes[:, :, self.pad:self.pad + board_size, self.pad:self.pad + board_size]
+        # (num_envs, static_channels, size - view_size + 1, size - view_size + 1, view_size, view_size) 的视图，
+        # windows[i, :, top, left] 就是第 i 个环境左上角在 (top, left) 的窗口
+        self.windows = np.lib.stride_tricks.sliding_window_view(self.planes, (view_size, view_size), axis=(2, 3))
+
+        self.buffer = np.zeros((num_envs, 2 * frames, self.channels, view_size, view_size), dtype=np.uint8)
+        self.slot = frames - 1
+        self.env_index = np.arange(num_envs)
+
+    def set_boards(self, envs, occupancy, distance=None):
+        """
+        envs 为环境下标，occupancy / distance 为对应的 (len(envs), H, W) 障碍物网格和距离场（单个环境时也可以是 (H, W)）。
+        回合开始、到达终点换了距离场、障碍物被修改时调用。
+        """
+        self.inner[envs, 0] = np.asarray(occupancy, dtype=bool) * np.uint8(255)
+        if self.static_channels > 1:
+            # 不可达的格子（包括障碍物）为 255，与棋盘外相同
+            distance = np.asarray(distance)
+            self.inner[envs, 1] = np.where(distance >= UNREACHABLE, 255, np.minimum(distance, 254))
+
+    def mark_cells(self, rows, cols, values, envs=None):
+        """
+        把所有环境障碍物通道上棋盘坐标为 (rows, cols) 的格子写成 values（标量或与 rows 等长的数组）；
+        给出 envs（与 rows 等长）时只写第 envs[i] 个环境的 (rows[i], cols[i])。
+        多智能体时用来标出其他 Navigator 的位置，之后再把原来的障碍物值写回去。
+        """
+        if envs is None:
+            self.inner[:, 0, rows, cols] = values
+        else:
+            self.inner[envs, 0, rows, cols] = values
+
+    def observe(self, navigator, destination):
+        """
+        navigator / destination 为 (num_envs, 2)。所有环境前进一帧，返回 (num_envs, frames * channels, V, V) 的只读视图，
+        下一次 observe 时内容会变化，需要保留时请复制。
+        """
+        self.slot = (self.slot + 1) % self.frames
+        frame = self.buffer[:, self.slot]
+        self._draw(frame, self.env_index, navigator, destination)
+        self.buffer[:, self.slot + self.frames] = frame
+        return self.stacked()
+
+    def restart(self, envs, navigator, destination):
+        """
+        环境 envs 开始新的回合：用当前帧填满这些环境的全部历史，不推进其他环境。
+        navigator / destination 为这些环境的 (len(envs), 2)。
+        """
+        envs = np.asarray(envs)
+        frame = self.buffer[envs, self.slot]
+        self._draw(frame, envs, navigator, destination)
+        self.buffer[envs] = frame[:, None]
+        return self.stacked()
+
+    def stacked(self):
+        start = self.slot + 1
+        view = self.buffer[:, start:start + self.frames].reshape((self.num_envs,) + self.shape)
+        view.flags.writeable = False
+        return view
+
+    def _draw(self, frame, envs, navigator, destination):
+        static = self.static_channels
+        if len(envs) == 1:
+            # 单个环境时用 Python 整数和基本索引直接取窗口，避免小数组上的 NumPy 开销
+            (row, col), (dest_row, dest_col) = navigator[0], destination[0]
+            frame[0, :static] = self.windows[envs[0], :, row - self.half + self.pad, col - self.half + self.pad]
+            target = frame[0, static]
+            target.fill(0)
+            last = self.view_size - 1
+            target[min(max(dest_row - row + self.half, 0), last), min(max(dest_col - col + self.half, 0), last)] = 255
+            return
+
+        navigator = np.asarray(navigator)
+        top = navigator[:, 0] - self.half + self.pad
+        left = navigator[:, 1] - self.half + self.pad
+        frame[:, :static] = self.windows[envs, :, top, left]
+        cell = np.clip(np.asarray(destination) - navigator + self.half, 0, self.view_size - 1)
+        target = frame[:, static]
+        target[:] = 0
+        target[np.arange(len(envs)), cell[:, 0], cell[:, 1]] = 255
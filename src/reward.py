@@ -0,0 +1,185 @@
+import math
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# 奖励项及默认权重，与最初 NavigateEnv.step 中写死的组合一致
+DEFAULT_REWARD_TERMS = {
+    # 普通移动：沿障碍物最短路的距离变化、相对起点距离的指数项、曼哈顿距离变化
+    "optimal_delta": 0.8,
+    "exp_distance": 0.1,
+    "manhattan_delta": 0.1,
+    # 到达终点：arrival_base ** (第几次到达 ** arrival_exponent)
+    "arrival_base": 10.0,
+    "arrival_exponent": 0.5,
+    # 撞墙 / 撞障碍物，超时
+    "collision": -4.0,
+    "timeout": 0.0,
+}
+
+
+class RewardFunction:
+    """
+    可配置的奖励函数。每一步按优先级 撞墙 > 超时 > 到达终点 > 普通移动 取一项：
+
+        collision                                           撞墙或撞障碍物
+        timeout                                             超过步数上限
+        arrival_base ** (already_achieve ** arrival_exponent) 到达终点
+        optimal_delta * (d - prev_d) + exp_distance * exp(-d / start_d) + manhattan_delta * (m - prev_m)
+
+    d / prev_d / start_d 是 Navigator、上一步位置、起点在当前终点距离场中的距离，m / prev_m 是曼哈顿距离。
+    batch() 对一批环境一次算完（装了 numba 时使用编译的循环，否则用 NumPy），single() 是单个环境的标量版本，两者结果一致。
+    """
+
+    def __init__(self, **terms):
+        unknown = set(terms) - set(DEFAULT_REWARD_TERMS)
+        if unknown:
+            raise ValueError(f"Unknown reward terms: {sorted(unknown)}")
+        self.terms = {**DEFAULT_REWARD_TERMS, **terms}
+        for name, value in self.terms.items():
+            setattr(self, name, float(value))
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        从 "optimal_delta=1.0,exp_distance=0" 这样的字符串构造，方便命令行做奖励 A/B 实验。
+        """
+        terms = {}
+        for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+            name, value = item.split("=")
+            terms[name.strip()] = float(value)
+        return cls(**terms)
+
+    def __repr__(self):
+        return "RewardFunction({})".format(", ".join(f"{name}={value}" for name, value in self.terms.items()))
+
+    def single(self, done, over_time, arrived, already_achieve, distance, prev_distance, start_distance,
+               manhattan, prev_manhattan):
+        if done:
+            return self.collision
+        if over_time:
+            return self.timeout
+        if arrived:
+            return self.arrival_base ** already_achieve ** self.arrival_exponent
+        # 与最初的 0.8 * a + 0.1 * b + 0.1 * c 保持相同的求和顺序，结果逐位一致
+        reward = self.optimal_delta * (distance - prev_distance)
+        if self.exp_distance:
+            reward += self.exp_distance * math.exp(-(distance / start_distance))
+        return reward + self.manhattan_delta * (manhattan - prev_manhattan)
+
+    def batch(self, done, over_time, arrived, already_achieve, distance, prev_distance, start_distance,
+              manhattan, prev_manhattan):
+        """
+        所有参数都是长度为环境数的数组，只有普通移动的环境需要有效的距离（其余位置的 start_distance 不能为 0）。
+        返回 float32 奖励。
+        """
+        if _batch_kernel is not None:
+            rewards = np.empty(len(done), dtype=np.float32)
+            _batch_kernel(done, over_time, arrived, already_achieve, distance, prev_distance, start_distance,
+                          manhattan, prev_manhattan, self.optimal_delta, self.exp_distance, self.manhattan_delta,
+                          self.arrival_base, self.arrival_exponent, self.collision, self.timeout, rewards)
+            return rewards
+
+        shaped = self.optimal_delta * (distance - prev_distance)
+        if self.exp_distance:
+            shaped += self.exp_distance * np.exp(-(distance / start_distance))
+        shaped += self.manhattan_delta * (manhattan - prev_manhattan)
+        arrival = self.arrival_base ** np.asarray(already_achieve, dtype=np.float64) ** self.arrival_exponent
+        rewards = np.where(arrived, arrival, shaped)
+        rewards = np.where(over_time, self.timeout, rewards)
+        rewards = np.where(done, self.collision, rewards)
+        return rewards.astype(np.float32)
+
+    def batch_step(self, game, terms, moving, done, over_time, arrived, already_achieve):
+        """
+        NavigateVecEnv 和 MultiAgentNavigateEnv 共用：从批量游戏对象（navigator / prev_navigator / start_pos /
+        destination / distance 都按第一维对齐）取出 moving 这些普通移动的下标的奖励项，写进 (5, N) 的 terms，
+        再调用 batch()。其余位置的奖励项为 0（start_distance 为 1），它们的奖励不看距离。
+        """
+        terms[:] = 0
+        terms[2] = 1
+        if len(moving) > 0:
+            navigator = game.navigator[moving]
+            prev_navigator = game.prev_navigator[moving]
+            start_pos = game.start_pos[moving]
+            destination = game.destination[moving]
+            distance = game.distance[moving]
+            rows = np.arange(len(moving))
+            terms[0, moving] = distance[rows, navigator[:, 0], navigator[:, 1]]
+            terms[1, moving] = distance[rows, prev_navigator[:, 0], prev_navigator[:, 1]]
+            terms[2, moving] = distance[rows, start_pos[:, 0], start_pos[:, 1]]
+            terms[3, moving] = np.abs(destination - navigator).sum(axis=1)
+            terms[4, moving] = np.abs(destination - prev_navigator).sum(axis=1)
+        return self.batch(done, over_time, arrived, already_achieve, *terms)
+
+
+def failure_causes(game, finished, over_time):
+    """
+    finished 中每个结束的下标对应的结束原因：超时为 "timeout"，否则看最后的位置，在棋盘外为 "wall"，在棋盘内为 "obstacle"。
+    """
+    finished = np.flatnonzero(finished)
+    navigator = game.navigator[finished]
+    out_of_board = ((navigator < 0) | (navigator >= game.board_size)).any(axis=1)
+    return ["timeout" if timeout else "wall" if wall else "obstacle"
+            for timeout, wall in zip(over_time[finished].tolist(), out_of_board.tolist())]
+
+
+def _batch_loop(done, over_time, arrived, already_achieve, distance, prev_distance, start_distance,
+                manhattan, prev_manhattan, optimal_delta, exp_distance, manhattan_delta,
+                arrival_base, arrival_exponent, collision, timeout, rewards):
+    for i in range(len(done)):
+        if done[i]:
+            rewards[i] = collision
+        elif over_time[i]:
+            rewards[i] = timeout
+        elif arrived[i]:
+            rewards[i] = arrival_base ** (float(already_achieve[i]) ** arrival_exponent)
+        else:
+            reward = optimal_delta * (distance[i] - prev_distance[i])
+            if exp_distance != 0:
+                reward += exp_distance * math.exp(-(distance[i] / start_distance[i]))
+            rewards[i] = reward + manhattan_delta * (manhattan[i] - prev_manhattan[i])
+
+
+# numba 是可选依赖，没有安装时 batch() 使用 NumPy 实现
+_batch_kernel = numba.njit(cache=True)(_batch_loop) if numba is not None else None
+
+
+if __name__ == "__main__":
+    import time
+
+    # 标量版本、NumPy 版本（以及 numba 版本）的一致性检查和耗时
+    rng = np.random.default_rng(0)
+    n = 4096
+    done = rng.random(n) < 0.05
+    over_time = rng.random(n) < 0.02
+    arrived = rng.random(n) < 0.1
+    already_achieve = rng.integers(1, 6, n)
+    distance = rng.integers(0, 30, n).astype(np.float64)
+    prev_distance = distance + rng.choice([-1, 1], n)
+    start_distance = rng.integers(1, 30, n).astype(np.float64)
+    manhattan = rng.integers(0, 30, n).astype(np.float64)
+    prev_manhattan = manhattan + rng.choice([-1, 1], n)
+    args = (done, over_time, arrived, already_achieve, distance, prev_distance, start_distance, manhattan,
+            prev_manhattan)
+
+    for reward_fn in (RewardFunction(), RewardFunction.parse("exp_distance=0,optimal_delta=1,timeout=-1")):
+        expected = np.array([reward_fn.single(*values) for values in zip(*args)], dtype=np.float32)
+        assert np.allclose(reward_fn.batch(*args), expected), reward_fn
+        kernel, _batch_kernel = _batch_kernel, None
+        assert np.allclose(reward_fn.batch(*args), expected), reward_fn
+        _batch_kernel = kernel
+
+        start_time = time.perf_counter()
+        for values in zip(*args):
+            reward_fn.single(*values)
+        scalar_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        reward_fn.batch(*args)
+        batch_time = time.perf_counter() - start_time
+        print(f"{reward_fn}: scalar {1e9 * scalar_time / n:.0f}ns/env, batch {1e9 * batch_time / n:.0f}ns/env")
+    print("numba:", "enabled" if _batch_kernel is not None else "not installed")
@@ -0,0 +1,103 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from batched_navigate_game import BatchedNavigateGame
+from distance_engine import UNREACHABLE
+
+
+def scenario_dtype(board_size):
+    """
+    一个场景的定长记录：按位打包的障碍物、起点和终点的格子下标、终点的距离场。
+    距离场用能容纳 grid_size 的最小无符号整数类型存储，最大值表示不可达。
+    """
+    grid_size = board_size * board_size
+    if grid_size < np.iinfo(np.uint8).max:
+        distance_dtype = np.uint8
+    elif grid_size < np.iinfo(np.uint16).max:
+        distance_dtype = np.uint16
+    else:
+        distance_dtype = np.uint32
+    return np.dtype([
+        ("obstacles", np.uint8, ((grid_size + 7) // 8,)),
+        ("start", np.uint32),
+        ("destination", np.uint32),
+        ("distance", distance_dtype, (grid_size,)),
+    ])
+
+
+def generate_scenario_bank(path, num_scenarios, board_size=12, seed=0, chunk_size=4096):
+    """
+    离线批量生成 num_scenarios 个棋盘，写入可内存映射的 .npy 文件。
+    """
+    dtype = scenario_dtype(board_size)
+    bank = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(num_scenarios,))
+    unreachable = np.iinfo(dtype["distance"].base).max
+
+    game = BatchedNavigateGame(min(chunk_size, num_scenarios), seed=seed, board_size=board_size)
+    for begin in range(0, num_scenarios, game.num_boards):
+        end = min(begin + game.num_boards, num_scenarios)
+        count = end - begin
+        if begin > 0:
+            game.reset()
+
+        records = bank[begin:end]
+        records["obstacles"] = np.packbits(game.obstacles[:count].reshape(count, -1), axis=1)
+        records["start"] = game.start_pos[:count, 0] * board_size + game.start_pos[:count, 1]
+        records["destination"] = game.destination[:count, 0] * board_size + game.destination[:count, 1]
+        distance = game.distance[:count].reshape(count, -1)
+        records["distance"] = np.where(distance >= UNREACHABLE, unreachable, distance)
+    bank.flush()
+    return bank
+
+
+class ScenarioBank:
+    """
+    只读、内存映射的场景库，NavigateGame 可以直接从中取出下一个场景，不需要生成和 BFS。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = np.load(path, mmap_mode="r")
+        self.grid_size = self.records.dtype["distance"].shape[0]
+        self.board_size = math.isqrt(self.grid_size)
+        self.unreachable = np.iinfo(self.records.dtype["distance"].base).max
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def scenario(self, index):
+        """
+        返回 (occupancy, start, destination, distance)，格式与 NavigateGame 中的字段一致。
+        """
+        record = self.records[index]
+        occupancy = np.unpackbits(record["obstacles"], count=self.grid_size).reshape(self.board_size, self.board_size)
+        start = divmod(int(record["start"]), self.board_size)
+        destination = divmod(int(record["destination"]), self.board_size)
+        distance = record["distance"].astype(np.int32).reshape(self.board_size, self.board_size)
+        distance[distance == self.unreachable] = UNREACHABLE
+        return occupancy, start, destination, distance
+
+    def next_index(self):
+        # 按顺序遍历，用于可复现的评估集
+        index = self.cursor
+        self.cursor = (self.cursor + 1) % len(self)
+        return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a memory-mapped bank of NavigateGame scenarios.")
+    parser.add_argument("path")
+    parser.add_argument("--num-scenarios", type=int, default=1000000)
+    parser.add_argument("--board-size", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    generate_scenario_bank(args.path, args.num_scenarios, board_size=args.board_size, seed=args.seed)
+    elapsed = time.perf_counter() - start_time
+    print(f"Wrote {args.num_scenarios} scenarios to {args.path} in {elapsed:.1f}s "
+          f"({scenario_dtype(args.board_size).itemsize} bytes each).")
@@ -0,0 +1,279 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv
+from stable_baselines3.common.vec_env.patch_gym import _patch_env
+
+
+# forkserver 预先导入的模块。Python 3.11 的 forkserver 不会预加载 __main__（preparation data 的键名不一致），
+# 每个 worker 启动时都会重新执行一遍主脚本的 import（torch / SB3，每个 worker 数秒）；
+# 这些模块在 forkserver 中导入一次后，worker 从它 fork 出来，重新执行主脚本时 import 都直接命中缓存
+WORKER_PRELOAD = ("__main__", "numpy", "torch", "gymnasium", "stable_baselines3", "sb3_contrib",
+                  "navigate_game_custom_wrapper_mlp", "navigate_game_custom_wrapper_cnn", "navigate_game_custom_wrapper_ego")
+
+
+def preload_worker_modules(modules=WORKER_PRELOAD):
+    """
+    在创建第一个 SubprocVecEnv / SharedMemoryVecEnv 之前调用（forkserver 启动后再设置无效）。
+    worker 的启动时间从秒级降到几十毫秒，64 个以上的 worker 时差别很明显。
+    """
+    if "forkserver" in mp.get_all_start_methods():
+        mp.set_forkserver_preload(list(modules))
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _worker(remote, parent_remote, env_fns_wrapper, buffer_specs, start):
+    """
+    一个 worker 进程负责一段连续的环境（start 开始）。
+    观测、奖励、done 和动作掩码直接写入共享内存，管道里只传命令和 info。
+    """
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    envs = [_patch_env(env_fn()) for env_fn in env_fns_wrapper.var]
+    handles = {}
+    buffers = {}
+    for key, (name, shape, dtype) in buffer_specs.items():
+        handles[key], buffers[key] = _attach(name, shape, dtype)
+    stop = start + len(envs)
+    actions = buffers["actions"][start:stop]
+    obs = buffers["obs"][start:stop]
+    terminal_obs = buffers["terminal_obs"][start:stop]
+    rewards = buffers["rewards"][start:stop]
+    terminated = buffers["terminated"][start:stop]
+    truncated = buffers["truncated"][start:stop]
+    masks = buffers["masks"][start:stop]
+
+    mask_fns = []
+    for env in envs:
+        try:
+            mask_fns.append(env.get_wrapper_attr("action_masks"))
+        except AttributeError:
+            mask_fns.append(None)
+
+    def write_mask(i):
+        if mask_fns[i] is not None:
+            masks[i] = np.reshape(mask_fns[i](), -1)
+
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                infos = []
+                for i, env in enumerate(envs):
+                    observation, reward, term, trunc, info = env.step(actions[i])
+                    rewards[i] = reward
+                    terminated[i] = term
+                    truncated[i] = trunc
+                    info["TimeLimit.truncated"] = trunc and not term
+                    if term or trunc:
+                        terminal_obs[i] = observation
+                        observation, _ = env.reset()
+                    obs[i] = observation
+                    write_mask(i)
+                    infos.append(info)
+                remote.send(infos)
+            elif cmd == "reset":
+                seeds, options = data
+                reset_infos = []
+                for i, env in enumerate(envs):
+                    maybe_options = {"options": options[i]} if options[i] else {}
+                    observation, reset_info = env.reset(seed=seeds[i], **maybe_options)
+                    obs[i] = observation
+                    write_mask(i)
+                    reset_infos.append(reset_info)
+                remote.send(reset_infos)
+            elif cmd == "env_method":
+                indices, method_name, args, kwargs = data
+                remote.send([envs[i].get_wrapper_attr(method_name)(*args, **kwargs) for i in indices])
+            elif cmd == "get_attr":
+                indices, attr_name = data
+                remote.send([envs[i].get_wrapper_attr(attr_name) for i in indices])
+            elif cmd == "has_attr":
+                try:
+                    for env in envs:
+                        env.get_wrapper_attr(data)
+                    remote.send(True)
+                except AttributeError:
+                    remote.send(False)
+            elif cmd == "set_attr":
+                indices, attr_name, value = data
+                for i in indices:
+                    setattr(envs[i], attr_name, value)
+                remote.send(None)
+            elif cmd == "is_wrapped":
+                indices, wrapper_class = data
+                remote.send([is_wrapped(envs[i], wrapper_class) for i in indices])
+            elif cmd == "get_spaces":
+                remote.send((envs[0].observation_space, envs[0].action_space, mask_fns[0] is not None))
+            elif cmd == "close":
+                for env in envs:
+                    env.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        # 先释放 ndarray 视图，否则共享内存无法关闭
+        del actions, obs, terminal_obs, rewards, terminated, truncated, masks
+        buffers.clear()
+        for shm in handles.values():
+            shm.close()
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    多进程 VecEnv：环境按分片放在 num_workers 个进程中，每个进程顺序推进自己的分片。
+    与 SubprocVecEnv 不同，观测、奖励、done 和动作掩码通过共享内存中的 NumPy 数组传递，不经过 pickle。
+    action_masks 直接从共享内存读取，不需要额外的进程间通信。
+    """
+
+    def __init__(self, env_fns, num_workers=None, start_method=None):
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+        if num_workers is None:
+            num_workers = min(n_envs, mp.cpu_count())
+
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+
+        # 先用第一个环境确定观测空间，再分配共享内存
+        probe = _patch_env(env_fns[0]())
+        observation_space, action_space = probe.observation_space, probe.action_space
+        probe.close()
+
+        specs = {
+            "actions": ((n_envs,) + action_space.shape, action_space.dtype),
+            "obs": ((n_envs,) + observation_space.shape, observation_space.dtype),
+            "terminal_obs": ((n_envs,) + observation_space.shape, observation_space.dtype),
+            "rewards": ((n_envs,), np.float32),
+            "terminated": ((n_envs,), np.bool_),
+            "truncated": ((n_envs,), np.bool_),
+            "masks": ((n_envs, int(getattr(action_space, "n", 1))), np.bool_),
+        }
+        self._shm = {}
+        self._buffers = {}
+        buffer_specs = {}
+        for key, (shape, dtype) in specs.items():
+            dtype = np.dtype(dtype)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+            self._shm[key] = shm
+            self._buffers[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            self._buffers[key][...] = 0
+            buffer_specs[key] = (shm.name, shape, dtype)
+
+        self.shards = np.array_split(np.arange(n_envs), num_workers)
+        self.shards = [shard for shard in self.shards if len(shard) > 0]
+        # 环境下标 -> (worker, worker 内的下标)
+        self._locations = [(w, i) for w, shard in enumerate(self.shards) for i in range(len(shard))]
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in self.shards])
+        self.processes = []
+        for work_remote, remote, shard in zip(self.work_remotes, self.remotes, self.shards):
+            args = (work_remote, remote, CloudpickleWrapper([env_fns[i] for i in shard]), buffer_specs,
+                    int(shard[0]))
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        _, _, self._has_masks = self.remotes[0].recv()
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def step_async(self, actions):
+        self._buffers["actions"][:] = np.reshape(actions, self._buffers["actions"].shape)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [info for remote in self.remotes for info in remote.recv()]
+        self.waiting = False
+        dones = self._buffers["terminated"] | self._buffers["truncated"]
+        for i in np.flatnonzero(dones):
+            infos[i]["terminal_observation"] = self._buffers["terminal_obs"][i].copy()
+        return self._buffers["obs"].copy(), self._buffers["rewards"].copy(), dones, infos
+
+    def reset(self):
+        for remote, shard in zip(self.remotes, self.shards):
+            remote.send(("reset", ([self._seeds[i] for i in shard], [self._options[i] for i in shard])))
+        self.reset_infos = [info for remote in self.remotes for info in remote.recv()]
+        self._reset_seeds()
+        self._reset_options()
+        return self._buffers["obs"].copy()
+
+    def action_masks(self):
+        return self._buffers["masks"].copy()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self._buffers.clear()
+        for shm in self._shm.values():
+            shm.close()
+            shm.unlink()
+        self.closed = True
+
+    def _group_by_worker(self, indices):
+        # worker -> [(结果中的位置, worker 内的下标)]
+        groups = {}
+        for position, index in enumerate(self._get_indices(indices)):
+            worker, local_index = self._locations[index]
+            groups.setdefault(worker, []).append((position, local_index))
+        return groups
+
+    def _call_workers(self, cmd, indices, *data):
+        groups = self._group_by_worker(indices)
+        for worker, entries in groups.items():
+            self.remotes[worker].send((cmd, ([local_index for _, local_index in entries],) + data))
+        results = [None] * sum(len(entries) for entries in groups.values())
+        for worker, entries in groups.items():
+            for (position, _), result in zip(entries, self.remotes[worker].recv()):
+                results[position] = result
+        return results
+
+    def has_attr(self, attr_name):
+        if attr_name == "action_masks":
+            return self._has_masks
+        for remote in self.remotes:
+            remote.send(("has_attr", attr_name))
+        return all([remote.recv() for remote in self.remotes])
+
+    def get_attr(self, attr_name, indices=None):
+        return self._call_workers("get_attr", indices, attr_name)
+
+    def set_attr(self, attr_name, value, indices=None):
+        groups = self._group_by_worker(indices)
+        for worker, entries in groups.items():
+            self.remotes[worker].send(("set_attr", ([local_index for _, local_index in entries], attr_name, value)))
+        for worker in groups:
+            self.remotes[worker].recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        if method_name == "action_masks" and self._has_masks:
+            # 掩码已经随每一步写在共享内存里
+            masks = self._buffers["masks"]
+            return [masks[i].copy() for i in self._get_indices(indices)]
+        return self._call_workers("env_method", indices, method_name, method_args, method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return self._call_workers("is_wrapped", indices, wrapper_class)
@@ -0,0 +1,116 @@
+class StepState:
+    """
+    NavigateGame 每一步的状态记录，由游戏预先分配、每一步原地更新，step_fast()/reset_fast() 直接返回它。
+    位置保存为扩充一圈后的棋盘 (board_size + 2) x (board_size + 2) 上的一维下标，
+    撞墙后停在棋盘外的位置也能唯一表示。
+    """
+
+    __slots__ = ("stride", "prev_navigator", "navigator", "start", "destination", "done", "destination_arrived")
+
+    def __init__(self, board_size):
+        self.stride = board_size + 2
+        self.prev_navigator = 0
+        self.navigator = 0
+        self.start = 0
+        self.destination = 0
+        self.done = False
+        self.destination_arrived = False
+
+    def index(self, pos):
+        return (pos[0] + 1) * self.stride + pos[1] + 1
+
+    def position(self, index):
+        row, col = divmod(index, self.stride)
+        return row - 1, col - 1
+
+    def pack(self):
+        # 当前这一步 info 需要的全部数据，一个元组，供 LazyInfo 在需要时再展开
+        return (self.stride, self.prev_navigator, self.navigator, self.start, self.destination,
+                self.destination_arrived)
+
+    def info(self):
+        return unpack_info(self.pack())
+
+
+def unpack_info(packed):
+    stride, prev_navigator, navigator, start, destination, destination_arrived = packed
+
+    def position(index):
+        row, col = divmod(index, stride)
+        return row - 1, col - 1
+
+    return {
+        "prev_navigator_pos": position(prev_navigator),
+        "navigator_pos": position(navigator),
+        "start_pos": position(start),
+        "destination_pos": position(destination),
+        "destination_arrived": destination_arrived
+    }
+
+
+# unpack_info 展开出的键
+PACKED_KEYS = frozenset(("prev_navigator_pos", "navigator_pos", "start_pos", "destination_pos", "destination_arrived"))
+
+
+class LazyInfo(dict):
+    """
+    gymnasium 的 info 字典，创建时只保存 StepState.pack() 的元组，读取这五个键、遍历或修改时才展开成普通的键值。
+    SB3 每一步都会 info.get("episode") / info.get("is_success")，这类不在 PACKED_KEYS 中的键的查询
+    （get / in / []）不展开，直接按空字典回答。
+    Monitor、ActionMasker 等只是往下传递 info 的层不会触发展开；序列化（SubprocVecEnv 的 pipe、pickle）时变成普通 dict。
+    json 的 C 编码器直接检查底层字典的大小，需要先 dict(info)。
+    """
+
+    __slots__ = ("_packed",)
+
+    def __init__(self, packed):
+        super().__init__()
+        self._packed = packed
+
+    def _materialize(self):
+        if self._packed is not None:
+            dict.update(self, unpack_info(self._packed))
+            self._packed = None
+        return self
+
+    def __reduce__(self):
+        return dict, (dict.copy(self._materialize()),)
+
+    # 还没展开时底层字典是空的（任何写入都会先展开），PACKED_KEYS 以外的键一定不存在；
+    # destination_arrived（课程学习、评估每一步都读）直接取元组的最后一项，也不展开
+    def get(self, key, default=None):
+        if self._packed is not None:
+            if key == "destination_arrived":
+                return self._packed[-1]
+            if key not in PACKED_KEYS:
+                return default
+        return dict.get(self._materialize(), key, default)
+
+    def __contains__(self, key):
+        if self._packed is not None and key not in PACKED_KEYS:
+            return False
+        return dict.__contains__(self._materialize(), key)
+
+    def __getitem__(self, key):
+        if self._packed is not None:
+            if key == "destination_arrived":
+                return self._packed[-1]
+            if key not in PACKED_KEYS:
+                raise KeyError(key)
+        return dict.__getitem__(self._materialize(), key)
+
+
+def _materializing(name):
+    method = getattr(dict, name)
+
+    def wrapper(self, *args, **kwargs):
+        return method(self._materialize(), *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in ("__setitem__", "__delitem__", "__iter__", "__reversed__", "__len__",
+              "__eq__", "__ne__", "__repr__", "__or__", "__ior__", "keys", "values", "items", "copy", "pop",
+              "popitem", "setdefault", "update", "clear"):
+    setattr(LazyInfo, _name, _materializing(_name))
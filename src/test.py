@@ -6,35 +6,63 @@ from sb3_contrib import QRDQN
 
 from navigate_game_custom_wrapper_cnn import NavigateEnvCnn
 from navigate_game_custom_wrapper_mlp import NavigateEnvMlp
+from navigate_game_custom_wrapper_ego import NavigateEnvEgo
+from checkpointing import CheckpointIndex, load_env_config, load_policy
+from trajectory import TrajectoryWriter
 
 NUM_EPISODE = 10
 
 RENDER = True
 FRAME_DELAY = 0.01  # 0.01 fast, 0.05 slow
 ROUND_DELAY = 0.5
+# 设置后把每个回合写进轨迹文件，之后用 `python trajectory.py <path> --episode N` 回放，不需要重新运行模型
+RECORD_PATH = None
+# None 加载训练结束时保存的完整模型；"best" / "latest" 从 index.json 中选择 checkpoint，只加载策略网络
+CHECKPOINT = None
 
 
 def test(model_type, policy_type, render):
     seed = random.randint(0, 1e9)
     print(f"Using seed = {seed} for testing.")
-    MODEL_PATH = r"../output/trained_models_{}/{}/{}_navigate_final".format(policy_type, model_type, model_type)
+    SAVE_DIR = r"../output/trained_models_{}/{}".format(policy_type, model_type)
+    MODEL_PATH = r"{}/{}_navigate_final".format(SAVE_DIR, model_type)
 
-    if policy_type == 'CnnPolicy':
-        env = NavigateEnvCnn(seed=seed, limit_step=False, silent_mode=render)
-    elif policy_type == 'MlpPolicy':
-        env = NavigateEnvMlp(seed=seed, limit_step=False, silent_mode=render)
-    else:
-        print("Policy Type Error")
-        return
     # Load the trained model
-    if model_type == 'QRDQN':
+    if CHECKPOINT:
+        index = CheckpointIndex(SAVE_DIR)
+        checkpoint_path = index.best() if CHECKPOINT == "best" else index.latest()
+        if checkpoint_path is None:
+            print(f"No checkpoints in {SAVE_DIR}")
+            return
+        print(f"Loading policy from {checkpoint_path}")
+        model = load_policy(checkpoint_path)
+    elif model_type == 'QRDQN':
+        checkpoint_path = MODEL_PATH
         model = QRDQN.load(MODEL_PATH)
     elif model_type == 'PPO':
+        checkpoint_path = MODEL_PATH
         model = MaskablePPO.load(MODEL_PATH)
     else:
         print("Model Type Error")
         return
 
+    # 按训练时的棋盘大小和观测方式重建环境（checkpointing.load_env_config）
+    env_config = load_env_config(model, checkpoint_path)
+    observation = env_config.get("observation", "full")
+    view_size = env_config.get("view_size")
+    kwargs = dict(seed=seed, limit_step=False, silent_mode=render, board_size=env_config.get("board_size", 12))
+    if observation == "ego":
+        env = NavigateEnvEgo(view_size=view_size or 13, **kwargs)
+    elif policy_type == 'CnnPolicy':
+        env = NavigateEnvCnn(observation=observation, view_size=view_size or 12, **kwargs)
+    elif policy_type == 'MlpPolicy':
+        env = NavigateEnvMlp(observation=observation, view_size=view_size or 12, **kwargs)
+    else:
+        print("Policy Type Error")
+        return
+
+    writer = TrajectoryWriter(RECORD_PATH, env.board_size) if RECORD_PATH else None
+
     total_reward = 0
     total_score = 0
     min_score = 1e9
@@ -42,6 +70,8 @@ def test(model_type, policy_type, render):
 
     for episode in range(NUM_EPISODE):
         obs, info = env.reset()
+        if writer:
+            writer.begin_episode(0, env.game)
         episode_reward = 0
         done = False
 
@@ -57,11 +87,10 @@ def test(model_type, policy_type, render):
         while not done:
             action, _ = model.predict(obs)
 
-            prev_mask = env.get_action_mask()
-            prev_direction = env.game.direction
-
             num_step += 1
             obs, reward, done, over_time, info = env.step(action)
+            if writer:
+                writer.record_step(0, action, reward, env.game)
 
             if done:
                 last_action = ["UP", "LEFT", "RIGHT", "DOWN"][action]
@@ -80,6 +109,8 @@ def test(model_type, policy_type, render):
                 time.sleep(FRAME_DELAY)
 
         episode_score = env.game.score
+        if writer:
+            writer.end_episode(0, episode_score)
         if episode_score < min_score:
             min_score = episode_score
         if episode_score > max_score:
@@ -93,6 +124,8 @@ def test(model_type, policy_type, render):
             time.sleep(ROUND_DELAY)
 
     env.close()
+    if writer:
+        writer.close()
     print(f"=================== Summary ==================")
     print(
         f"Average Score: {total_score / NUM_EPISODE}, Min Score: {min_score}, Max Score: {max_score}, Average reward: {total_reward / NUM_EPISODE}")
@@ -3,38 +3,111 @@ import random
 import sys
 
 from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.callbacks import CheckpointCallback
-from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecMonitor
 from sb3_contrib import QRDQN, MaskablePPO, RecurrentPPO
 from sb3_contrib.common.wrappers import ActionMasker
 
 from navigate_game_custom_wrapper_mlp import NavigateEnvMlp
 from navigate_game_custom_wrapper_cnn import NavigateEnvCnn
+from navigate_game_custom_wrapper_ego import NavigateEnvEgo
+from checkpointing import AsyncCheckpointCallback, save_env_config
+from curriculum import CurriculumCallback, CurriculumScheduler
+from ego_cnn import EgoCnn
+from expert import DATASET_FILES, behavior_cloning, generate_dataset
+from game_random import spawn_seeds
+from instrumentation import InstrumentationCallback, install_sampling_profiler, disable as disable_instrumentation
+from navigate_vec_env import NavigateVecEnv
+from reward import RewardFunction
+from scenario_bank import ScenarioBank
+from shared_memory_vec_env import SharedMemoryVecEnv, preload_worker_modules
 
 NUM_ENV = 8
+NUM_BATCHED_ENV = 256
 LOG_DIR = "../output/logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
 
-def make_env(policy_type="MlpPolicy", seed=0, silent=True):
+def make_env(policy_type="MlpPolicy", seed=0, silent=True, scenario_bank_path=None, board_size=12,
+             observation="full", view_size=None, reward_fn=None, frames=4):
     def _init():
-        if policy_type == "CnnPolicy":
-            env = NavigateEnvCnn(seed=seed, silent_mode=silent)
+        # 场景库在每个环境（进程）中各自以只读方式内存映射
+        scenario_bank = ScenarioBank(scenario_bank_path) if scenario_bank_path else None
+        # 大棋盘上用 observation="crop" / "downsample"，观测大小固定为 view_size（默认 12）；
+        # observation="ego" 为 NavigateEnvEgo 的局部窗口 + 距离场 + 多帧叠加（默认 13x13，4 帧），与 policy_type 无关
+        kwargs = dict(seed=seed, silent_mode=silent, scenario_bank=scenario_bank, board_size=board_size,
+                      reward_fn=reward_fn)
+        if observation == "ego":
+            env = NavigateEnvEgo(view_size=view_size or 13, frames=frames, **kwargs)
+            env = ActionMasker(env, NavigateEnvEgo.get_action_mask)
+        elif policy_type == "CnnPolicy":
+            kwargs.update(observation=observation, view_size=view_size or 12)
+            env = NavigateEnvCnn(**kwargs)
             env = ActionMasker(env, NavigateEnvCnn.get_action_mask)
         else:
-            env = NavigateEnvMlp(seed=seed, silent_mode=silent)
+            kwargs.update(observation=observation, view_size=view_size or 12)
+            env = NavigateEnvMlp(**kwargs)
             env = ActionMasker(env, NavigateEnvMlp.get_action_mask)
         env = Monitor(env)
-        env.seed(seed)
+        env.unwrapped.seed(seed)
         return env
 
     return _init
 
 
-def train(model_type: str, policy_type: str, devices: str = 'cpu', total_steps: int = 10000000):
-    env = make_vec_env(make_env(policy_type), n_envs=NUM_ENV,seed=random.randint(0, int(1e9)))
+def make_batched_env(policy_type="MlpPolicy", num_envs=NUM_BATCHED_ENV, seed=0, board_size=12, reward_fn=None,
+                     observation="full", view_size=None):
+    # 所有环境在同一个 BatchedNavigateGame 中向量化推进，VecMonitor 代替每个环境的 Monitor
+    return VecMonitor(NavigateVecEnv(num_envs, policy_type=policy_type, seed=seed, board_size=board_size,
+                                     reward_fn=reward_fn, observation=observation, view_size=view_size))
+
+
+def train(model_type: str, policy_type: str, devices: str = 'cpu', total_steps: int = 10000000,
+          vec_backend: str = "dummy", scenario_bank_path: str = None, instrument: bool = False,
+          reward: str = None, pretrain_dataset: str = None, pretrain_epochs: int = 3, curriculum: bool = False,
+          observation: str = "full", profile: bool = False, board_size: int = 12, view_size: int = None):
+    # vec_backend: "dummy" 单进程顺序执行，"subproc" 每个环境一个进程，
+    # "shared_memory" 多进程分片 + 共享内存传输，"batched" 单进程向量化
+    # scenario_bank_path: scenario_bank.py 生成的场景库，reset 时直接取场景（batched 后端不使用）
+    # reward: 奖励配置，如 "optimal_delta=1.0,exp_distance=0"，见 reward.RewardFunction；默认使用原来的权重
+    # pretrain_dataset: 专家数据目录（expert.py），在强化学习之前先做 pretrain_epochs 轮行为克隆；目录不存在时先生成
+    # board_size: 棋盘大小，传给每一层（游戏、环境、观测、专家数据）；大棋盘上配合 observation="crop" / "downsample"，
+    # 观测大小固定为 view_size（默认 12，"ego" 默认 13），与 board_size 无关（batched 后端只支持 "full" / "ego"）
+    # observation: "ego" 使用以 Navigator 为中心的局部窗口 + 距离场 + 4 帧叠加（NavigateEnvEgo），
+    # CnnPolicy 配合 ego_cnn.EgoCnn，输入比默认的 36x36x3 图像小，rollout 和训练都更快
+    # curriculum: 按最近的成功率调整出题区域大小和障碍物密度（curriculum.DEFAULT_LEVELS），统计写入 curriculum/*
+    # instrument: 给游戏/环境/SB3 各层加计时器，统计写入 LOG_DIR 下的 TensorBoard 日志
+    # profile: 注册采样分析器，之后可以用 `python instrumentation.py attach <pid>` 对训练进程采样，结果写到 LOG_DIR；
+    # 没有注册时 SIGUSR1 会直接结束进程，attach 之前必须打开
+    if profile:
+        install_sampling_profiler(output_dir=LOG_DIR)
+    reward_fn = RewardFunction.parse(reward)
+    # 每个环境的随机数流都从同一个根种子派生，batched 后端的第 i 个棋盘与其他后端的第 i 个环境逐位一致
+    root_seed = random.randint(0, int(1e9))
+    env_fns = [make_env(policy_type, seed=seed, scenario_bank_path=scenario_bank_path, board_size=board_size,
+                        observation=observation, view_size=view_size, reward_fn=reward_fn)
+               for seed in spawn_seeds(root_seed, NUM_ENV)]
+    if vec_backend in ("subproc", "shared_memory"):
+        # worker 从预先导入好 torch / SB3 / 环境模块的 forkserver fork 出来，不再各自重新导入
+        preload_worker_modules()
+    if vec_backend == "batched":
+        env = make_batched_env(policy_type, seed=root_seed, board_size=board_size, reward_fn=reward_fn,
+                               observation=observation, view_size=view_size)
+    elif vec_backend == "shared_memory":
+        env = SharedMemoryVecEnv(env_fns)
+    elif vec_backend == "subproc":
+        env = SubprocVecEnv(env_fns)
+    else:
+        env = DummyVecEnv(env_fns)
+    scheduler = None
+    if curriculum:
+        # 第一级难度在 learn() 第一次 reset 之前推给环境
+        scheduler = CurriculumScheduler(env.num_envs, board_size=board_size)
+        scheduler.apply(env)
     # env = NavigateEnvCnn(seed=0, silent_mode=False)
     # env = ActionMasker(env, NavigateEnvMlp.get_action_mask)
+    policy_kwargs = None
+    if observation == "ego" and policy_type == "CnnPolicy":
+        policy_kwargs = dict(features_extractor_class=EgoCnn)
     if model_type == "QRDQN":
         model = QRDQN(
             policy=policy_type,
@@ -42,6 +115,7 @@ def train(model_type: str, policy_type: str, devices: str = 'cpu', total_steps:
             device=devices,
             verbose=10,
             gamma=0.94,
+            policy_kwargs=policy_kwargs,
             tensorboard_log=LOG_DIR + "/{}".format(model_type),
         )
     elif model_type == "PPO":
@@ -51,6 +125,7 @@ def train(model_type: str, policy_type: str, devices: str = 'cpu', total_steps:
             device=devices,
             verbose=10,
             gamma=0.95,
+            policy_kwargs=policy_kwargs,
             # learning_rate=0.2,
             # batch_size=128,
             tensorboard_log=LOG_DIR + "/{}".format(model_type),
@@ -58,13 +133,25 @@ def train(model_type: str, policy_type: str, devices: str = 'cpu', total_steps:
     else:
         print("Model Type Error")
         return
+    if pretrain_dataset:
+        if not os.path.exists(os.path.join(pretrain_dataset, DATASET_FILES[-1])):
+            generate_dataset(pretrain_dataset, policy_type=policy_type, observation=observation,
+                             board_size=board_size, view_size=view_size)
+        behavior_cloning(model, pretrain_dataset, epochs=pretrain_epochs)
+
     # Set the save directory
     save_dir = "../output/trained_models_{}/{}".format(policy_type, model_type)
     os.makedirs(save_dir, exist_ok=True)
 
+    # 评估、回放时按这份配置重建环境（见 checkpointing.load_env_config）
+    env_config = {"board_size": board_size, "observation": observation, "view_size": view_size}
+    save_env_config(save_dir, env_config)
+
     checkpoint_interval = 100000  # checkpoint_interval * num_envs = total_steps_per_checkpoint
-    checkpoint_callback = CheckpointCallback(save_freq=checkpoint_interval, save_path=save_dir,
-                                             name_prefix="{}_navigate".format(model_type))
+    # 只保存策略网络，在后台线程写盘；save_dir/index.json 记录各 checkpoint 的指标，保留最好的 3 个和最新的一个
+    checkpoint_callback = AsyncCheckpointCallback(save_freq=checkpoint_interval, save_path=save_dir,
+                                                  name_prefix="{}_navigate".format(model_type), keep_top_k=3,
+                                                  env_config=env_config)
 
     # Writing the training logs from stdout to a file
     # original_stdout = sys.stdout
@@ -72,10 +159,21 @@ def train(model_type: str, policy_type: str, devices: str = 'cpu', total_steps:
     # with open(log_file_path, 'w') as log_file:
     #     sys.stdout = log_file
 
-    model.learn(
-        total_timesteps=total_steps,
-        callback=[checkpoint_callback],
-    )
+    callbacks = [checkpoint_callback]
+    if curriculum:
+        callbacks.append(CurriculumCallback(scheduler, verbose=1))
+    if instrument:
+        callbacks.append(InstrumentationCallback())
+
+    try:
+        model.learn(
+            total_timesteps=total_steps,
+            callback=callbacks,
+        )
+    finally:
+        # 计时器包装留在进程级单例上，训练结束（或中断）后关掉，避免影响之后在同一进程里的评估
+        if instrument:
+            disable_instrumentation()
     env.close()
 
     # Restore stdout
@@ -0,0 +1,324 @@
+"""
+轨迹文件格式（小端）：
+
+    文件头     MAGIC, VERSION (uint32), board_size (uint32)
+    回合块 *   CHUNK_DTYPE 记录头
+               obstacles   按位打包的障碍物，(board_size ** 2 + 7) // 8 字节
+               actions     每个动作 2 bit，一个字节 4 个动作
+               rewards     float32 * num_steps
+               events      EVENT_DTYPE * num_events，每次到达终点后新终点出现的步数和位置
+    索引       INDEX_DTYPE * num_episodes，每个回合块的偏移
+    文件尾     index_offset (uint64), num_episodes (uint64), END_MAGIC
+
+Navigator 每一步必然按动作方向移动一格，所以位置用 2 bit 的方向增量（即动作本身）编码，回放时对增量求前缀和。
+多个环境可以同时写同一个文件：每个环境的当前回合先缓存在内存里，回合结束时整块追加，索引在 close() 时写入。
+close() 时还没结束的回合也会写入，标记为 truncated（与超时截断的回合相同）。
+"""
+import argparse
+import struct
+import time
+from array import array
+
+import gymnasium as gym
+import numpy as np
+
+from legal_moves import legal_move_table
+
+MAGIC = b"NAVTRAJ\0"
+END_MAGIC = b"NAVTEND\0"
+VERSION = 2
+HEADER = struct.Struct("<8sII")
+TRAILER = struct.Struct("<QQ8s")
+
+CHUNK_DTYPE = np.dtype([
+    ("episode", "<u8"),
+    ("env_id", "<u4"),
+    ("seed", "<i8"),
+    ("num_steps", "<u4"),
+    ("num_events", "<u4"),
+    ("start", "<u4"),
+    ("destination", "<u4"),
+    ("score", "<i4"),
+    ("truncated", "u1"),
+])
+EVENT_DTYPE = np.dtype([("step", "<u4"), ("destination", "<u4")])
+INDEX_DTYPE = np.dtype([
+    ("episode", "<u8"),
+    ("env_id", "<u4"),
+    ("offset", "<u8"),
+    ("num_steps", "<u4"),
+    ("score", "<i4"),
+    ("truncated", "u1"),
+])
+
+# 环境动作 0-3 对应的 (行, 列) 增量：UP, DOWN, LEFT, RIGHT
+ACTION_DELTAS = np.array([(-1, 0), (1, 0), (0, -1), (0, 1)], dtype=np.int64)
+
+
+def pack_actions(actions):
+    actions = np.asarray(actions, dtype=np.uint8)
+    padded = np.zeros(-(-len(actions) // 4) * 4, dtype=np.uint8)
+    padded[:len(actions)] = actions
+    return padded[0::4] | padded[1::4] << 2 | padded[2::4] << 4 | padded[3::4] << 6
+
+
+def unpack_actions(packed, num_steps):
+    packed = np.asarray(packed, dtype=np.uint8)
+    return np.stack([packed & 3, packed >> 2 & 3, packed >> 4 & 3, packed >> 6], axis=1).ravel()[:num_steps]
+
+
+class _EpisodeBuffer:
+    __slots__ = ("seed", "occupancy", "start", "destination", "actions", "rewards", "events")
+
+    def __init__(self, seed, occupancy, start, destination):
+        self.seed = seed
+        self.occupancy = np.packbits(occupancy.reshape(-1))
+        self.start = start
+        self.destination = destination
+        self.actions = bytearray()
+        self.rewards = array("f")
+        self.events = array("I")
+
+
+class TrajectoryWriter:
+    """
+    流式写轨迹。典型用法：
+
+        writer.begin_episode(env_id, env.game)                      # reset 之后
+        writer.record_step(env_id, action, reward, env.game)       # 每一步之后
+        writer.end_episode(env_id)                                 # 回合结束
+    """
+
+    def __init__(self, path, board_size=12):
+        self.path = path
+        self.board_size = board_size
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, board_size))
+        self.buffers = {}
+        self.index = []
+        self.num_steps = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def begin_episode(self, env_id, game):
+        # seed 记录的是回合种子（game.episode_seed），NavigateGame.reset(episode_seed=seed) 会重新生成同一个棋盘
+        board_size = self.board_size
+        self.buffers[env_id] = _EpisodeBuffer(
+            game.episode_seed, game.occupancy,
+            game.navigator[0] * board_size + game.navigator[1],
+            game.destination[0] * board_size + game.destination[1])
+
+    def record_step(self, env_id, action, reward, game):
+        buffer = self.buffers[env_id]
+        buffer.actions.append(int(action))
+        buffer.rewards.append(reward)
+        destination = game.destination[0] * self.board_size + game.destination[1]
+        if destination != (buffer.events[-1] if buffer.events else buffer.destination):
+            # 到达终点后游戏已经换了新终点，记下这是第几步以及新终点的位置
+            buffer.events.append(len(buffer.actions))
+            buffer.events.append(destination)
+
+    def end_episode(self, env_id, score=None, truncated=False):
+        # truncated: 回合不是因为撞墙 / 撞障碍物结束的（超时，或者 close() 时还在进行中）
+        buffer = self.buffers.pop(env_id)
+        num_steps = len(buffer.actions)
+        num_events = len(buffer.events) // 2
+        if score is None:
+            score = 10 * num_events
+
+        header = np.zeros(1, dtype=CHUNK_DTYPE)
+        header[0] = (len(self.index), env_id, buffer.seed, num_steps, num_events, buffer.start, buffer.destination,
+                     score, truncated)
+        offset = self.file.tell()
+        self.file.write(header.tobytes())
+        self.file.write(buffer.occupancy.tobytes())
+        self.file.write(pack_actions(np.frombuffer(buffer.actions, dtype=np.uint8)).tobytes())
+        self.file.write(buffer.rewards.tobytes())
+        self.file.write(buffer.events.tobytes())
+        self.index.append((len(self.index), env_id, offset, num_steps, score, truncated))
+        self.num_steps += num_steps
+
+    def close(self):
+        if self.file.closed:
+            return
+        # 还在进行中的回合作为截断的回合写入
+        for env_id in list(self.buffers):
+            self.end_episode(env_id, truncated=True)
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        self.file.write(TRAILER.pack(index_offset, len(self.index), END_MAGIC))
+        self.file.close()
+
+
+class TrajectoryRecorder(gym.Wrapper):
+    """
+    把 NavigateEnv 的每个回合写进共享的 TrajectoryWriter。同一进程中的多个环境用不同的 env_id 共用一个 writer。
+    """
+
+    def __init__(self, env, writer, env_id=0):
+        super().__init__(env)
+        self.writer = writer
+        self.env_id = env_id
+        self.recording = False
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        if self.recording:
+            # 回合没有结束就被 reset，按截断处理
+            self.writer.end_episode(self.env_id, self.env.unwrapped.game.score, truncated=True)
+        self.writer.begin_episode(self.env_id, self.env.unwrapped.game)
+        self.recording = True
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        game = self.env.unwrapped.game
+        self.writer.record_step(self.env_id, action, reward, game)
+        if terminated or truncated:
+            self.writer.end_episode(self.env_id, game.score, truncated=not terminated)
+            self.recording = False
+        return obs, reward, terminated, truncated, info
+
+
+class TrajectoryReader:
+    """
+    内存映射读取轨迹文件，按 (回合, 步) 随机访问任意一帧，不需要重新运行策略。
+    第 0 步是 reset 之后的状态，第 t 步是执行完 t 个动作之后的状态。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, self.board_size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} trajectory file")
+        index_offset, num_episodes, end_magic = TRAILER.unpack_from(self.data, len(self.data) - TRAILER.size)
+        if end_magic != END_MAGIC:
+            raise ValueError(f"{path} was not closed properly (missing index)")
+        self.index = np.frombuffer(self.data, dtype=INDEX_DTYPE, count=num_episodes, offset=index_offset)
+        # 每个回合第一步在所有步中的全局编号，用于按全局步数定位
+        self.step_offsets = np.concatenate(([0], np.cumsum(self.index["num_steps"].astype(np.int64))))
+        self.obstacle_bytes = (self.board_size * self.board_size + 7) // 8
+
+        self._episode = None
+        self._game = None
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def num_steps(self):
+        return int(self.step_offsets[-1])
+
+    def locate(self, global_step):
+        # 全局步数 -> (回合, 回合内的步数)
+        episode = int(np.searchsorted(self.step_offsets, global_step, side="right")) - 1
+        return episode, int(global_step - self.step_offsets[episode])
+
+    def episode(self, episode):
+        """
+        解码一个回合：障碍物、每一帧的位置、终点和分数。最近一次解码的回合会被缓存，在同一回合内来回拖动不需要重新解码。
+        """
+        if self._episode is not None and self._episode["episode"] == episode:
+            return self._episode
+
+        offset = int(self.index[episode]["offset"])
+        header = np.frombuffer(self.data, dtype=CHUNK_DTYPE, count=1, offset=offset)[0]
+        num_steps, num_events = int(header["num_steps"]), int(header["num_events"])
+        offset += CHUNK_DTYPE.itemsize
+        grid_size = self.board_size * self.board_size
+        occupancy = np.unpackbits(self.data[offset:offset + self.obstacle_bytes], count=grid_size)
+        offset += self.obstacle_bytes
+        action_bytes = -(-num_steps // 4)
+        actions = unpack_actions(self.data[offset:offset + action_bytes], num_steps)
+        offset += action_bytes
+        rewards = np.frombuffer(self.data, dtype="<f4", count=num_steps, offset=offset)
+        offset += 4 * num_steps
+        events = np.frombuffer(self.data, dtype=EVENT_DTYPE, count=num_events, offset=offset)
+
+        start = np.array(divmod(int(header["start"]), self.board_size))
+        positions = np.empty((num_steps + 1, 2), dtype=np.int64)
+        positions[0] = start
+        np.cumsum(ACTION_DELTAS[actions], axis=0, out=positions[1:])
+        positions[1:] += start
+
+        self._episode = {
+            "episode": episode,
+            "env_id": int(header["env_id"]),
+            "seed": int(header["seed"]),
+            "score": int(header["score"]),
+            "truncated": bool(header["truncated"]),
+            "occupancy": occupancy.reshape(self.board_size, self.board_size),
+            "actions": actions,
+            "rewards": rewards,
+            "positions": positions,
+            # 第 0 步的终点，以及之后每次换终点的步数和新终点
+            "event_steps": events["step"].astype(np.int64),
+            "destinations": np.concatenate(([header["destination"]], events["destination"])).astype(np.int64),
+        }
+        return self._episode
+
+    def frame(self, episode, step):
+        data = self.episode(episode)
+        step = min(max(step, 0), len(data["actions"]))
+        arrivals = int(np.searchsorted(data["event_steps"], step, side="right"))
+        return {
+            "navigator": tuple(int(v) for v in data["positions"][step]),
+            "destination": divmod(int(data["destinations"][arrivals]), self.board_size),
+            "score": 10 * arrivals,
+            "action": int(data["actions"][step - 1]) if step > 0 else None,
+            "reward": float(data["rewards"][step - 1]) if step > 0 else None,
+            "occupancy": data["occupancy"],
+        }
+
+    def load_into(self, game, episode, step):
+        """
+        把第 episode 回合第 step 步的状态写进 NavigateGame（棋盘大小需一致），之后可以直接 render()。
+        """
+        frame = self.frame(episode, step)
+        if game.occupancy is not frame["occupancy"]:
+            # 同一回合内共用同一个 occupancy 数组，渲染器只在换回合时重画静态棋盘
+            game.occupancy = frame["occupancy"]
+            game.legal_moves = legal_move_table(game.occupancy)
+            game.distance_fields.set_obstacles(game.occupancy)
+        game.navigator = frame["navigator"]
+        game.prev_navigator = tuple(int(v) for v in self.episode(episode)["positions"][max(step - 1, 0)])
+        game.destination = frame["destination"]
+        game.score = frame["score"]
+        game.distance = game.calculate_distance()
+        return frame
+
+    def render(self, episode, step):
+        # 在无显示器的 NavigateGame 上渲染一帧，返回 (H, W, 3) 的 uint8 画面（内部缓冲区）
+        if self._game is None:
+            from navigate_game import NavigateGame
+
+            self._game = NavigateGame(board_size=self.board_size)
+        self.load_into(self._game, episode, step)
+        return self._game.render()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or play back a recorded trajectory file.")
+    parser.add_argument("path")
+    parser.add_argument("--episode", type=int, default=None, help="play this episode in a window")
+    parser.add_argument("--fps", type=float, default=20)
+    args = parser.parse_args()
+
+    reader = TrajectoryReader(args.path)
+    print(f"{len(reader)} episodes ({int(reader.index['truncated'].sum())} truncated), {reader.num_steps} steps, "
+          f"board {reader.board_size}x{reader.board_size}")
+    if args.episode is not None:
+        from navigate_game import NavigateGame
+
+        # 非静默模式：第一次 render() 时打开窗口
+        game = NavigateGame(board_size=reader.board_size, silent_mode=False)
+        for step in range(int(reader.index[args.episode]["num_steps"]) + 1):
+            frame = reader.load_into(game, args.episode, step)
+            game.render()
+            print(f"step {step:5d} action {frame['action']} reward {frame['reward']} score {frame['score']}")
+            time.sleep(1 / args.fps)